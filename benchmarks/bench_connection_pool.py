@@ -0,0 +1,54 @@
+"""
+Per-request latency of make_request with a fresh connection per call versus the
+pooled keep-alive session owned by the EMDB client.
+
+Runs against a local stand-in server, so the numbers only include the TCP
+handshake saved by pooling; against www.ebi.ac.uk the TLS handshake and network
+round trips make the difference considerably larger.
+
+    python benchmarks/bench_connection_pool.py [n_requests]
+"""
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tests.standin_server import StandInServer  # noqa: E402
+from emdb.client import EMDB  # noqa: E402
+from emdb.utils import make_request  # noqa: E402
+
+
+def _time_calls(call, n: int):
+    timings = []
+    for i in range(n):
+        start = time.perf_counter()
+        call(f"/entry/EMD-{1000 + i}")
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _report(label: str, timings):
+    timings_ms = [t * 1000 for t in timings]
+    print(f"{label:<28} mean {statistics.mean(timings_ms):7.3f} ms   "
+          f"median {statistics.median(timings_ms):7.3f} ms   "
+          f"p95 {sorted(timings_ms)[int(len(timings_ms) * 0.95) - 1]:7.3f} ms")
+
+
+def main(n: int = 500):
+    with StandInServer() as server:
+        unpooled = _time_calls(lambda endpoint: make_request(endpoint, base_url=server.api_url), n)
+        with EMDB(base_url=server.api_url) as client:
+            # Bypass the client's rate limiter; only the transport is compared
+            pooled = _time_calls(lambda endpoint: make_request(endpoint, session=client.session,
+                                                               base_url=server.api_url), n)
+        print(f"{n} requests, {server.request_count} served")
+
+    _report("new connection per request", unpooled)
+    _report("pooled keep-alive session", pooled)
+    print(f"speed-up (median): {statistics.median(unpooled) / statistics.median(pooled):.2f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,74 @@
+"""
+Wall time of a batch of downloads under each DownloadScheduler policy.
+
+The batch mimics mirroring a few entries: mostly small files, with each entry's large
+map submitted last. Every connection of the stand-in server is capped at the same
+bandwidth, so the total time depends only on how well the policy keeps workers busy.
+The fair policy aims at entries progressing side by side rather than at wall time.
+
+    python benchmarks/bench_download_scheduling.py [workers]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tests.standin_server import StandInServer  # noqa: E402
+from emdb.models.files import FigureFile  # noqa: E402
+from emdb.scheduler import POLICIES, DownloadScheduler  # noqa: E402
+
+BLOCK = 64 * 1024
+BYTES_PER_SECOND = 16 * 1024 * 1024
+# 40 files of 1 MiB, then 3 of 24 MiB, spread over 3 entries
+SIZES_KBYTES = [1024] * 40 + [24 * 1024] * 3
+ENTRIES = 3
+
+
+def sized_file_route(handler, match):
+    """
+    Stand-in route serving a file of the size in KiB given by its name, at BYTES_PER_SECOND.
+    """
+    size = int(match.group(1)) * 1024
+    handler.send_response(200)
+    handler.send_header("Content-Length", str(size))
+    handler.end_headers()
+    began = time.perf_counter()
+    sent = 0
+    block = bytes(BLOCK)
+    while sent < size:
+        handler.wfile.write(block[:min(BLOCK, size - sent)])
+        sent += min(BLOCK, size - sent)
+        ahead = sent / BYTES_PER_SECOND - (time.perf_counter() - began)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+def make_files(base_url: str):
+    files = []
+    for i, size_kbytes in enumerate(SIZES_KBYTES):
+        file = FigureFile(filename=f"{size_kbytes}_{i}.bin", size_kbytes=size_kbytes)
+        file._emdb_id = f"EMD-{1000 + i % ENTRIES}"
+        file._BASE_FIGURES_URL = f"{base_url}/files"
+        files.append(file)
+    return files
+
+
+def main(workers: int = 4):
+    total_mib = sum(SIZES_KBYTES) / 1024
+    print(f"{len(SIZES_KBYTES)} files, {total_mib:.0f} MiB, {workers} workers, "
+          f"{BYTES_PER_SECOND / 2 ** 20:.0f} MiB/s per connection")
+    with StandInServer(routes={r"/files/[^/]+/(\d+)_\d+\.bin": sized_file_route}) as server:
+        for policy in POLICIES:
+            with tempfile.TemporaryDirectory() as directory, \
+                    DownloadScheduler(max_workers=workers, max_per_host=workers, policy=policy) as scheduler:
+                start = time.perf_counter()
+                results = scheduler.download(make_files(server.url), directory)
+                elapsed = time.perf_counter() - start
+            assert all(result.ok for result in results)
+            print(f"{policy:<15} {elapsed:6.2f} s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 4)
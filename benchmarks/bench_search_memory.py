@@ -0,0 +1,73 @@
+"""
+Memory footprint and construction time of EMDBSearchResults for a synthetic
+search response, compared with the previous storage of one LazyEMDBEntry per hit
+in a pydantic list field.
+
+    python benchmarks/bench_search_memory.py [n_hits]
+"""
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import List
+
+from pydantic import BaseModel
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from emdb.models.lazy_entry import LazyEMDBEntry  # noqa: E402
+from emdb.models.search import EMDBSearchResults  # noqa: E402
+
+
+class ListBackedResults(BaseModel):
+    """The search results model as it was before hits were stored as an array."""
+    entries: List[LazyEMDBEntry]
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @classmethod
+    def from_api(cls, data: str, client) -> "ListBackedResults":
+        emdb_ids = data.strip().split("\n")[1:]
+        return cls(entries=[LazyEMDBEntry(emdb_id, client) for emdb_id in emdb_ids])
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def _measure(build, data: str, repeat: int = 5):
+    # Time without tracing, which slows down every allocation
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        build(data, None)
+        elapsed.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    results = build(data, None)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(results) > 0
+    return min(elapsed), retained, peak
+
+
+def _report(label: str, elapsed: float, retained: int, peak: int):
+    print(f"{label:<22} build {elapsed * 1000:8.1f} ms   "
+          f"retained {retained / 2 ** 20:7.2f} MiB   peak {peak / 2 ** 20:7.2f} MiB")
+
+
+def main(n: int = 100000):
+    data = "emdb_id\n" + "\n".join(f"EMD-{1000 + i}" for i in range(n)) + "\n"
+    print(f"{n} hits, {len(data) / 2 ** 20:.2f} MiB CSV body")
+
+    list_backed = _measure(ListBackedResults.from_api, data)
+    array_backed = _measure(EMDBSearchResults.from_api, data)
+
+    _report("list of LazyEMDBEntry", *list_backed)
+    _report("accession number array", *array_backed)
+    print(f"retained memory: {list_backed[1] / array_backed[1]:.0f}x smaller, "
+          f"build time: {list_backed[0] / array_backed[0]:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,82 @@
+"""
+Download time of a large file as a single stream versus concurrent byte-range segments.
+
+The stand-in server caps each connection at a fixed bandwidth, like a long-distance TCP
+stream limited by its window, so the gain from segments is roughly the segment count
+until the link or disk is saturated.
+
+    python benchmarks/bench_segmented_download.py [size_mib] [mib_per_second_per_connection]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tests.standin_server import StandInServer  # noqa: E402
+from emdb.client import EMDB  # noqa: E402
+from emdb.models.files import FigureFile  # noqa: E402
+
+BLOCK = 64 * 1024
+
+
+def throttled_file_route(size: int, bytes_per_second: float):
+    """
+    Stand-in route serving ``size`` bytes, honoring ranges, at ``bytes_per_second`` per connection.
+    """
+    data = bytes(range(256)) * (BLOCK // 256)
+
+    def route(handler, match):
+        start, end = 0, size - 1
+        requested = handler.headers.get("Range")
+        if handler.command == "GET" and requested:
+            first, _, last = requested[len("bytes="):].partition("-")
+            start, end = int(first), min(end, int(last)) if last else end
+            handler.send_response(206)
+            handler.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            handler.send_response(200)
+        handler.send_header("Accept-Ranges", "bytes")
+        handler.send_header("Content-Length", str(end + 1 - start))
+        handler.end_headers()
+        if handler.command == "HEAD":
+            return
+        began = time.perf_counter()
+        sent = 0
+        while sent < end + 1 - start:
+            block = data[:min(BLOCK, end + 1 - start - sent)]
+            handler.wfile.write(block)
+            sent += len(block)
+            ahead = sent / bytes_per_second - (time.perf_counter() - began)
+            if ahead > 0:
+                time.sleep(ahead)
+    return {r"/files/(.+)": route}
+
+
+def _time_download(server, client, directory, **kwargs) -> float:
+    figure = FigureFile(filename="400_1234.gif")
+    figure._emdb_id = "EMD-1234"
+    figure._client = client
+    figure._BASE_FIGURES_URL = f"{server.url}/files"
+    start = time.perf_counter()
+    figure.download(f"{directory}/", **kwargs)
+    return time.perf_counter() - start
+
+
+def main(size_mib: int = 128, mib_per_second: float = 32.0):
+    size = size_mib * 1024 * 1024
+    with StandInServer(routes=throttled_file_route(size, mib_per_second * 1024 * 1024)) as server, \
+            EMDB() as client, tempfile.TemporaryDirectory() as directory:
+        single = _time_download(server, client, directory)
+        print(f"{size_mib} MiB at {mib_per_second:g} MiB/s per connection")
+        print(f"{'single stream':<14} {single:6.2f} s   {size_mib / single:7.1f} MiB/s")
+        for segments in (2, 4, 8):
+            elapsed = _time_download(server, client, directory, segmented=True, segments=segments)
+            print(f"{f'{segments} segments':<14} {elapsed:6.2f} s   {size_mib / elapsed:7.1f} MiB/s   "
+                  f"speed-up {single / elapsed:.2f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 128,
+         float(sys.argv[2]) if len(sys.argv) > 2 else 32.0)
@@ -0,0 +1,375 @@
+import asyncio
+import os
+import time
+from io import StringIO
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+
+import pandas
+
+from emdb.client import EMDB
+from emdb.download import part_path
+from emdb.exceptions import (
+    EMDBInvalidIDError, EMDBNotFoundError, EMDBAPIError, EMDBRateLimitError, EMDBNetworkError,
+    EMDBFileNotFoundError
+)
+from emdb.models.annotations import EMDBAnnotations
+from emdb.models.entry import EMDBEntry
+from emdb.models.facets import EMDBFacets, DEFAULT_FACET_FIELDS, DEFAULT_FACET_RANGES
+from emdb.models.files import BaseFile
+from emdb.models.search import EMDBSearchResults, SEARCH_FIELD_DTYPES, search_fields
+from emdb.models.validation import EMDBValidation
+from emdb.ratelimit import TokenBucketRateLimiter
+from emdb.retry import RetryPolicy
+from emdb.utils import API_BASE_URL, DEFAULT_TIMEOUT
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - exercised only without the optional dependency
+    httpx = None
+
+
+class AsyncEMDB:
+    """
+    Asyncio-native EMDB API client mirroring :class:`emdb.client.EMDB`.
+
+    Requests share one pooled ``httpx.AsyncClient``. API calls wait on a token-bucket rate
+    limiter without blocking the event loop, and a semaphore bounds the number of requests
+    in flight, so hundreds of concurrent tasks can share a single event loop.
+
+    The returned models are the same as those of the blocking client. Their helper methods
+    (for example ``EMDBEntry.get_validation`` or attribute access on search results) are bound
+    to a blocking :class:`EMDB` sibling, so inside a running event loop prefer the awaitable
+    methods of this class.
+
+    Usage:
+        async with AsyncEMDB() as client:
+            entries = await asyncio.gather(*(client.get_entry(i) for i in ids))
+    """
+
+    def __init__(self, base_url: str = API_BASE_URL, timeout=DEFAULT_TIMEOUT, max_connections: int = 10,
+                 max_keepalive_connections: int = 10, max_concurrency: int = 100, rate_limit: float = 2.5,
+                 burst: int = 1, rate_limiter: TokenBucketRateLimiter = None,
+                 retry_policy: RetryPolicy = None, http_client: "httpx.AsyncClient" = None):
+        """
+        :param base_url: Base URL of the EMDB API.
+        :param timeout: Request timeout in seconds.
+        :param max_connections: Maximum number of open connections.
+        :param max_keepalive_connections: Maximum number of idle connections kept alive.
+        :param max_concurrency: Maximum number of requests in flight at once.
+        :param rate_limit: Sustained number of API requests per second.
+        :param burst: Number of API requests allowed back to back after an idle period.
+        :param rate_limiter: An existing rate limiter to share with other clients, blocking
+            or async. Overrides ``rate_limit`` and ``burst``.
+        :param retry_policy: Retry policy for API calls and file downloads. Defaults to
+            ``RetryPolicy()``.
+        :param http_client: An existing httpx.AsyncClient to use instead of creating one.
+        """
+        if httpx is None:
+            raise ImportError("AsyncEMDB requires httpx. Install it with: pip install emdb[async]")
+        self.base_url = base_url
+        self.timeout = timeout
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.max_concurrency = max_concurrency
+        self._http = http_client if http_client is not None else httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections),
+            follow_redirects=True,
+        )
+        self._rate_limiter = rate_limiter if rate_limiter is not None else TokenBucketRateLimiter(rate_limit, burst)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._sync_client: Optional[EMDB] = None
+
+    @property
+    def sync_client(self) -> EMDB:
+        """
+        Blocking client the returned models use for lazy loading and file downloads.
+        It shares this client's rate limiter and retry policy.
+        """
+        if self._sync_client is None:
+            self._sync_client = EMDB(base_url=self.base_url, timeout=self.timeout, rate_limiter=self._rate_limiter,
+                                     retry_policy=self.retry_policy)
+        return self._sync_client
+
+    @property
+    def rate_limiter(self) -> TokenBucketRateLimiter:
+        """
+        The rate limiter shared by all API calls of this client.
+        """
+        return self._rate_limiter
+
+    def _slots(self) -> asyncio.Semaphore:
+        # Created on first use so it binds to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def aclose(self) -> None:
+        """
+        Close the HTTP client and release all pooled connections.
+        """
+        await self._http.aclose()
+        if self._sync_client is not None:
+            self._sync_client.close()
+
+    async def __aenter__(self) -> "AsyncEMDB":
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, tb) -> None:
+        await self.aclose()
+
+    async def _send(self, url: str, method: str = "GET", rate_limited: bool = True, stream: bool = False,
+                    **kwargs) -> "httpx.Response":
+        """
+        Send a request, retrying network errors and retryable status codes as
+        ``EMDB`` does (see :func:`emdb.utils.send_with_retry`).
+        """
+        policy = self.retry_policy
+        start = time.monotonic()
+        attempt = 0
+
+        while True:
+            attempt += 1
+            if rate_limited:
+                await self._rate_limiter.acquire_async()
+
+            retry_after = None
+            try:
+                async with self._slots():
+                    request = self._http.build_request(method, url, **kwargs)
+                    response = await self._http.send(request, stream=stream)
+            except httpx.TimeoutException:
+                error = EMDBNetworkError(f"Request timed out while accessing {url}")
+                response = None
+            except httpx.HTTPError as e:
+                error = EMDBNetworkError(f"Network error while accessing {url}: {e}")
+                response = None
+            else:
+                if not policy.is_retryable_status(response.status_code):
+                    return response
+                retry_after = policy.parse_retry_after(response.headers.get("Retry-After"))
+
+            delay = policy.delay(attempt, retry_after)
+            if not policy.should_retry(method, attempt, time.monotonic() - start, delay):
+                if response is None:
+                    raise error
+                return response
+
+            if response is not None:
+                await response.aclose()
+            if response is not None and response.status_code == 429 and rate_limited:
+                self._rate_limiter.penalize(delay)
+            else:
+                await asyncio.sleep(delay)
+
+    async def _request(self, endpoint: str, params=None, restype: str = "json"):
+        url = f"{self.base_url}{endpoint}"
+        response = await self._send(url, params=params)
+
+        if response.status_code == 404:
+            raise EMDBNotFoundError("Entry not found", 404, url)
+        elif response.status_code == 429:
+            raise EMDBRateLimitError("Rate limit exceeded", 429, url)
+        elif response.status_code >= 500:
+            raise EMDBAPIError("Server error", response.status_code, url)
+
+        try:
+            response.raise_for_status()
+            if restype == "csv":
+                return response.text.strip()
+            else:
+                return response.json()
+        except Exception as e:
+            raise EMDBAPIError(f"An unexpected error occurred: {str(e)}", response.status_code, url)
+
+    async def get_entry(self, emdb_id: str) -> EMDBEntry:
+        """
+        Retrieve an EMDB entry by its ID.
+
+        :param emdb_id: The EMDB ID of the entry to retrieve.
+        :return: An EMDBEntry object.
+        :raises EMDBNotFoundError: If the entry is not found.
+        :raises EMDBInvalidIDError: If the provided EMDB ID is invalid.
+        :raises EMDBAPIError: For other API-related errors.
+        """
+        if not emdb_id.startswith("EMD-"):
+            raise EMDBInvalidIDError(emdb_id)
+
+        endpoint = f"/entry/{emdb_id}"
+        try:
+            data = await self._request(endpoint)
+            return EMDBEntry.from_api(data, client=self.sync_client)
+        except EMDBNotFoundError as e:
+            raise e
+        except Exception as e:
+            raise EMDBAPIError(f"Failed to retrieve entry {emdb_id}: {str(e)}")
+
+    async def get_validation(self, emdb_id: str) -> EMDBValidation:
+        """
+        Retrieve the validation data for a given EMDB entry.
+
+        :param emdb_id: The EMDB ID of the entry to retrieve validation data for.
+        :return: An EMDBValidation object containing the validation data.
+        :raises EMDBNotFoundError: If the entry is not found.
+        :raises EMDBAPIError: For API-related errors.
+        """
+        endpoint = f"/analysis/{emdb_id}"
+        params = {"information": "all"}
+        try:
+            data = await self._request(endpoint, params=params)
+            return EMDBValidation.from_api(emdb_id, data, self.sync_client)
+        except EMDBNotFoundError as e:
+            raise e
+        except Exception as e:
+            raise EMDBAPIError(f"Failed to retrieve validation for {emdb_id}: {str(e)}")
+
+    async def get_annotations(self, emdb_id: str) -> EMDBAnnotations:
+        """
+        Retrieve annotations for a given EMDB entry.
+
+        :param emdb_id: The EMDB ID of the entry to retrieve annotations for.
+        :return: An EMDBAnnotations object.
+        :raises EMDBNotFoundError: If the entry is not found.
+        :raises EMDBAPIError: For API-related errors.
+        """
+        endpoint = f"/annotations/{emdb_id}"
+        try:
+            data = await self._request(endpoint)
+            return EMDBAnnotations.from_api(data, self.sync_client)
+        except EMDBNotFoundError as e:
+            raise e
+        except Exception as e:
+            raise EMDBAPIError(f"Failed to retrieve annotations for {emdb_id}: {str(e)}")
+
+    async def search(self, query: str, fields: Union[str, Iterable[str], None] = None) -> EMDBSearchResults:
+        """
+        Search for EMDB entries using a query string.
+
+        :param query: The search query string.
+        :param fields: Search fields to return with the hits, readable from the lazy entries
+            without fetching them.
+        :return: An EMDBSearchResults object containing the search results.
+        :raises EMDBAPIError: For API-related errors.
+        """
+        endpoint = f"/search/{query}"
+        params = {
+            "rows": 1000000,
+            "fl": search_fields(fields),
+            "wt": "csv",
+            "download": "false"
+        }
+        try:
+            data = await self._request(endpoint, params=params, restype="csv")
+            return EMDBSearchResults.from_api(data, self.sync_client)
+        except Exception as e:
+            raise EMDBAPIError(f"Search failed: {str(e)}")
+
+    async def count(self, query: str) -> int:
+        """
+        Count the hits of a search without downloading them.
+
+        :param query: The search query string.
+        :return: The number of matching entries.
+        :raises EMDBAPIError: For API-related errors.
+        """
+        endpoint = f"/search/{query}"
+        try:
+            data = await self._request(endpoint, params={"rows": 0, "wt": "json"})
+            return int(data["response"]["numFound"])
+        except Exception as e:
+            raise EMDBAPIError(f"Count failed: {str(e)}")
+
+    async def facets(self, query: str, fields: Iterable[str] = DEFAULT_FACET_FIELDS,
+                     ranges: Optional[Dict[str, Tuple[Any, Any, Any]]] = DEFAULT_FACET_RANGES,
+                     limit: int = 100) -> EMDBFacets:
+        """
+        Count the hits of a search per value of some fields, without downloading them.
+
+        :param query: The search query string.
+        :param fields: Fields to count the distinct values of.
+        :param ranges: ``{field: (start, end, gap)}`` of numeric or date fields to count in bins.
+        :param limit: Maximum number of values returned per field; -1 for all of them.
+        :return: An EMDBFacets object with the number of hits and the counts.
+        :raises EMDBAPIError: For API-related errors.
+        """
+        endpoint = f"/search/{query}"
+        params = EMDBFacets.request_params(fields, ranges, limit)
+        try:
+            data = await self._request(endpoint, params=params)
+            return EMDBFacets.from_api(data)
+        except Exception as e:
+            raise EMDBAPIError(f"Facet search failed: {str(e)}")
+
+    async def csv_search(self, query: str, fields: str = "emdb_id,structure_determination_method,resolution") -> "pandas.DataFrame":
+        """
+        Perform a search returning the results in a CSV table (Pandas dataframe).
+
+        :param query: The search query string.
+        :param fields: Comma-separated list of fields to return.
+        :return: A DataFrame containing the search results.
+        :raises EMDBAPIError: For API-related errors.
+        """
+        endpoint = f"/search/{query}"
+        params = {
+            "rows": 1000000,
+            "wt": "csv",
+            "download": "false"
+        }
+        if fields:
+            params["fl"] = fields
+
+        try:
+            data = await self._request(endpoint, params=params, restype="csv")
+            return pandas.read_csv(StringIO(data), dtype=SEARCH_FIELD_DTYPES)
+        except Exception as e:
+            raise EMDBAPIError(f"Raw search failed: {str(e)}")
+
+    async def download_file(self, file: BaseFile, output_path: str, chunk_size: int = 1024 * 1024) -> str:
+        """
+        Download a file of an EMDB entry, streaming it to disk in chunks.
+
+        The file is written to ``<output_path>.part``, off the event loop, and renamed once
+        complete; a failed or cancelled download leaves no file at ``output_path``.
+
+        :param file: The file object to download (e.g. ``entry.primary_map``).
+        :param output_path: The local path where the file should be saved. If it ends
+            with ``/`` the file name is appended.
+        :param chunk_size: Number of bytes written per chunk.
+        :return: The path of the downloaded file.
+        :raises EMDBFileNotFoundError: If the file is not available.
+        :raises EMDBNetworkError: For network-related errors.
+        """
+        if output_path.endswith('/'):
+            output_path += file.filename
+
+        temp_path = part_path(output_path)
+        loop = asyncio.get_running_loop()
+        response = await self._send(file.source_path, rate_limited=False, stream=True)
+        try:
+            if response.status_code != 200:
+                raise EMDBFileNotFoundError(file._emdb_id, file.filename)
+            async with self._slots():
+                with open(temp_path, "wb") as f:
+                    async for chunk in response.aiter_bytes(chunk_size):
+                        await loop.run_in_executor(None, f.write, chunk)
+            os.replace(temp_path, output_path)
+        except BaseException as e:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            if isinstance(e, httpx.HTTPError):
+                raise EMDBNetworkError(f"Network error while downloading {file.source_path}: {e}")
+            raise
+        finally:
+            await response.aclose()
+        return output_path
+
+    async def download_all_files(self, entry: EMDBEntry, directory: str) -> list:
+        """
+        Concurrently download all files associated with an EMDB entry.
+
+        :param entry: The EMDB entry whose files should be downloaded.
+        :param directory: The directory where files will be downloaded.
+        :return: The paths of the downloaded files.
+        """
+        if not directory.endswith('/'):
+            directory += '/'
+        return list(await asyncio.gather(*(self.download_file(file, directory) for file in entry.deposited_files)))
@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from typing import Callable, Generic, Iterable, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class BulkResult(Generic[T]):
+    """
+    Outcome of fetching one ID in a bulk call: either a value or the error raised for it.
+    """
+    emdb_id: str
+    index: int
+    value: Optional[T] = None
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        """
+        True if the ID was fetched successfully.
+        """
+        return self.error is None
+
+    def __str__(self):
+        outcome = self.value if self.ok else f"error={self.error!r}"
+        return f"<BulkResult {self.emdb_id} {outcome}>"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def _run_one(func: Callable[[str], T], emdb_id: str, index: int) -> BulkResult:
+    try:
+        return BulkResult(emdb_id, index, value=func(emdb_id))
+    except Exception as e:
+        return BulkResult(emdb_id, index, error=e)
+
+
+def iter_bulk(func: Callable[[str], T], ids: Iterable[str], max_workers: int = 4) -> Iterator[BulkResult]:
+    """
+    Call ``func`` for every ID on a pool of worker threads, yielding results as they complete.
+
+    At most ``2 * max_workers`` calls are queued at any time, so ``ids`` may be a
+    lazy iterable and finished results do not pile up in memory.
+
+    :param func: Function fetching one ID, e.g. ``client.get_entry``.
+    :param ids: The IDs to fetch.
+    :param max_workers: Number of worker threads.
+    :return: An iterator of BulkResult in completion order; ``BulkResult.index`` gives the input position.
+    """
+    ids = enumerate(ids)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for index, emdb_id in ids:
+            pending.add(executor.submit(_run_one, func, emdb_id, index))
+            if len(pending) >= 2 * max_workers:
+                break
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = next(ids, None)
+                if item is not None:
+                    pending.add(executor.submit(_run_one, func, item[1], item[0]))
+                yield future.result()
+
+
+def run_bulk(func: Callable[[str], T], ids: Iterable[str], max_workers: int = 4) -> List[BulkResult]:
+    """
+    Call ``func`` for every ID on a pool of worker threads.
+
+    :param func: Function fetching one ID, e.g. ``client.get_entry``.
+    :param ids: The IDs to fetch.
+    :param max_workers: Number of worker threads.
+    :return: A list of BulkResult in input order.
+    """
+    return sorted(iter_bulk(func, ids, max_workers), key=lambda result: result.index)
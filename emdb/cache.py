@@ -0,0 +1,379 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Hashable, Optional
+from urllib.parse import urlencode
+
+
+@dataclass
+class CacheStats:
+    """
+    Counters describing the effectiveness of a cache.
+    """
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    revalidations: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+
+def approximate_size(data: Any) -> int:
+    """
+    Approximate the memory cost of an API payload by the size of its JSON encoding.
+    """
+    if isinstance(data, (str, bytes)):
+        return len(data)
+    try:
+        return len(json.dumps(data, separators=(",", ":")))
+    except (TypeError, ValueError):
+        return 0
+
+
+class MemoryCache:
+    """
+    Bounded in-process LRU cache with per-endpoint time-to-live.
+
+    Items are keyed by endpoint (``"entry"``, ``"validation"``, ``"annotations"``, ...) and ID.
+    The cache holds at most ``max_entries`` items and roughly ``max_bytes`` of payload; the
+    least recently used items are evicted first. Cached objects are returned as is, so callers
+    share them.
+
+    Usage:
+        client = EMDB(cache=MemoryCache(max_entries=500, ttl={"entry": 600}))
+        client.get_entry("EMD-1234")  # network
+        client.get_entry("EMD-1234")  # cache hit, no rate limit wait
+        print(client.cache.stats)
+    """
+
+    DEFAULT_TTL = {
+        "entry": 3600.0,
+        "validation": 3600.0,
+        "annotations": 3600.0,
+    }
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 256 * 1024 * 1024,
+                 ttl: Optional[Dict[str, float]] = None, default_ttl: float = 3600.0):
+        """
+        :param max_entries: Maximum number of cached items.
+        :param max_bytes: Approximate upper bound of the cached payload size, in bytes.
+        :param ttl: Time-to-live in seconds per endpoint, merged over ``DEFAULT_TTL``.
+        :param default_ttl: Time-to-live in seconds for endpoints without an explicit one.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = {**self.DEFAULT_TTL, **(ttl or {})}
+        self.default_ttl = default_ttl
+        self._items: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+
+    def get(self, endpoint: str, key: Hashable) -> Optional[Any]:
+        """
+        Look up a cached item.
+
+        :param endpoint: The endpoint the item was fetched from.
+        :param key: The item ID, e.g. ``"EMD-1234"``.
+        :return: The cached object, or None on a miss or if it has expired.
+        """
+        with self._lock:
+            item = self._items.get((endpoint, key))
+            if item is None:
+                self._stats.misses += 1
+                return None
+            value, size, expires_at = item
+            if expires_at <= time.monotonic():
+                self._remove((endpoint, key))
+                self._stats.expirations += 1
+                self._stats.misses += 1
+                return None
+            self._items.move_to_end((endpoint, key))
+            self._stats.hits += 1
+            return value
+
+    def set(self, endpoint: str, key: Hashable, value: Any, size: int = 0) -> None:
+        """
+        Store an item, evicting the least recently used ones if the cache is full.
+
+        :param endpoint: The endpoint the item was fetched from.
+        :param key: The item ID, e.g. ``"EMD-1234"``.
+        :param value: The object to cache.
+        :param size: Approximate size of the item in bytes.
+        """
+        ttl = self.ttl.get(endpoint, self.default_ttl)
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if (endpoint, key) in self._items:
+                self._remove((endpoint, key))
+            self._items[(endpoint, key)] = (value, size, time.monotonic() + ttl)
+            self._bytes += size
+            while len(self._items) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._items))
+                self._remove(oldest)
+                self._stats.evictions += 1
+
+    def _remove(self, cache_key: tuple) -> None:
+        # Must be called with the lock held
+        _, size, _ = self._items.pop(cache_key)
+        self._bytes -= size
+
+    def invalidate(self, key: Hashable, endpoint: Optional[str] = None) -> None:
+        """
+        Drop an item from the cache.
+
+        :param key: The item ID, e.g. ``"EMD-1234"``.
+        :param endpoint: Only drop the item cached for this endpoint. By default the
+            item is dropped for all endpoints.
+        """
+        with self._lock:
+            for cache_key in [k for k in self._items if k[1] == key and (endpoint is None or k[0] == endpoint)]:
+                self._remove(cache_key)
+
+    def clear(self) -> None:
+        """
+        Drop all cached items. Counters are kept.
+        """
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    @property
+    def stats(self) -> CacheStats:
+        """
+        A snapshot of the cache counters.
+        """
+        with self._lock:
+            return replace(self._stats, entries=len(self._items), bytes=self._bytes)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __str__(self):
+        return f"<MemoryCache entries={len(self._items)}/{self.max_entries} bytes={self._bytes}/{self.max_bytes}>"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+@dataclass
+class CachedResponse:
+    """
+    A raw API response stored in a :class:`SQLiteResponseCache`.
+    """
+    body: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fresh: bool
+
+    @property
+    def validators(self) -> Dict[str, str]:
+        """
+        Conditional request headers to revalidate this response with the server.
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class _SQLiteDatabase:
+    """
+    Base of classes keeping their data in an SQLite file: one WAL-mode connection per thread,
+    closed together, and ``CacheStats`` completed with the number and size of stored items.
+    """
+    # Returns the number and total size in bytes of the stored items
+    _SIZE_QUERY: str
+
+    def _open_database(self, path: str) -> None:
+        self._db_path = path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared between threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._db_path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @property
+    def stats(self) -> CacheStats:
+        """
+        Counters of this process, plus the number and size of the items stored in the database.
+        """
+        entries, size = self._connection().execute(self._SIZE_QUERY).fetchone()
+        with self._lock:
+            return replace(self._stats, entries=entries, bytes=size)
+
+    def close(self) -> None:
+        """
+        Close all database connections opened by this object.
+        """
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+class SQLiteResponseCache(_SQLiteDatabase):
+    """
+    Persistent cache of raw API responses in a single SQLite file.
+
+    Payloads are stored zlib-compressed together with their ``ETag`` and ``Last-Modified``
+    headers. Fresh responses are served without touching the network; stale ones are
+    revalidated with a conditional request and reused if the server answers 304 Not Modified.
+    The database runs in WAL mode, so several processes can read it while one writes.
+
+    Usage:
+        client = EMDB(response_cache=SQLiteResponseCache("~/.cache/emdb.sqlite"))
+    """
+
+    DEFAULT_TTL = {
+        "entry": 86400.0,
+        "analysis": 86400.0,
+        "annotations": 86400.0,
+        "search": 0.0,
+    }
+    # Stored responses are counted at their compressed size
+    _SIZE_QUERY = "SELECT COUNT(*), COALESCE(SUM(LENGTH(body)), 0) FROM responses"
+
+    def __init__(self, path: str, ttl: Optional[Dict[str, float]] = None, default_ttl: float = 86400.0,
+                 compress_level: int = 6):
+        """
+        :param path: Path of the SQLite database file. Created if it does not exist.
+        :param ttl: Time-to-live in seconds per endpoint (``"entry"``, ``"analysis"``, ``"annotations"``,
+            ``"search"``), merged over ``DEFAULT_TTL``. Endpoints with a TTL of 0 are not cached.
+        :param default_ttl: Time-to-live in seconds for endpoints without an explicit one.
+        :param compress_level: zlib compression level of stored payloads.
+        """
+        self.path = os.path.expanduser(path)
+        self.ttl = {**self.DEFAULT_TTL, **(ttl or {})}
+        self.default_ttl = default_ttl
+        self.compress_level = compress_level
+        self._open_database(self.path)
+
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, endpoint TEXT NOT NULL, body BLOB NOT NULL, "
+                "etag TEXT, last_modified TEXT, fetched_at REAL NOT NULL)"
+            )
+
+    @staticmethod
+    def cache_key(url: str, params: Optional[dict] = None) -> str:
+        """
+        Build the cache key of a request from its URL and query parameters.
+        """
+        if not params:
+            return url
+        return f"{url}?{urlencode(sorted(params.items()), doseq=True)}"
+
+    def ttl_for(self, endpoint: str) -> float:
+        """
+        Time-to-live for an endpoint path such as ``/entry/EMD-1234``.
+        """
+        kind = endpoint.strip("/").split("/", 1)[0]
+        return self.ttl.get(kind, self.default_ttl)
+
+    def lookup(self, endpoint: str, url: str, params: Optional[dict] = None) -> Optional[CachedResponse]:
+        """
+        Look up a stored response.
+
+        :param endpoint: The API endpoint path, e.g. ``/entry/EMD-1234``.
+        :param url: The full request URL.
+        :param params: The query parameters of the request.
+        :return: The stored response, flagged fresh or stale, or None on a miss.
+        """
+        ttl = self.ttl_for(endpoint)
+        if ttl <= 0:
+            return None
+        row = self._connection().execute(
+            "SELECT body, etag, last_modified, fetched_at FROM responses WHERE key = ?",
+            (self.cache_key(url, params),)
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self._stats.misses += 1
+                return None
+            body, etag, last_modified, fetched_at = row
+            fresh = time.time() - fetched_at < ttl
+            if fresh:
+                self._stats.hits += 1
+            elif not (etag or last_modified):
+                self._stats.misses += 1
+                self._stats.expirations += 1
+                return None
+        return CachedResponse(zlib.decompress(body), etag, last_modified, fresh)
+
+    def store(self, endpoint: str, url: str, params: Optional[dict], body: bytes,
+              etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        """
+        Store a raw response body.
+
+        :param endpoint: The API endpoint path, e.g. ``/entry/EMD-1234``.
+        :param url: The full request URL.
+        :param params: The query parameters of the request.
+        :param body: The raw response body.
+        :param etag: The ``ETag`` response header, if any.
+        :param last_modified: The ``Last-Modified`` response header, if any.
+        """
+        if self.ttl_for(endpoint) <= 0:
+            return
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, endpoint, body, etag, last_modified, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self.cache_key(url, params), endpoint, zlib.compress(body, self.compress_level),
+                 etag, last_modified, time.time())
+            )
+
+    def touch(self, url: str, params: Optional[dict] = None) -> None:
+        """
+        Mark a stored response as fresh again after the server confirmed it is unchanged.
+        """
+        with self._connection() as conn:
+            conn.execute("UPDATE responses SET fetched_at = ? WHERE key = ?",
+                         (time.time(), self.cache_key(url, params)))
+        with self._lock:
+            self._stats.revalidations += 1
+
+    def invalidate(self, emdb_id: str) -> int:
+        """
+        Drop every stored response for an entry (entry, validation and annotations).
+
+        :param emdb_id: The EMDB ID, e.g. ``"EMD-1234"``.
+        :return: The number of responses dropped.
+        """
+        with self._connection() as conn:
+            return conn.execute("DELETE FROM responses WHERE endpoint LIKE ?", (f"%/{emdb_id}",)).rowcount
+
+    def clear(self) -> None:
+        """
+        Drop all stored responses.
+        """
+        with self._connection() as conn:
+            conn.execute("DELETE FROM responses")
+
+    def __str__(self):
+        return f"<SQLiteResponseCache path={self.path}>"
+
+    def __repr__(self):
+        return self.__str__()
@@ -1,26 +1,150 @@
+import csv
 import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
 import pandas
+import requests
 
-from io import StringIO
 
+from emdb.bulk import BulkResult, iter_bulk, run_bulk
+from emdb.cache import MemoryCache, SQLiteResponseCache, approximate_size
 from emdb.exceptions import EMDBInvalidIDError, EMDBNotFoundError, EMDBAPIError
 from emdb.models.annotations import EMDBAnnotations
 from emdb.models.entry import EMDBEntry
-from emdb.models.search import EMDBSearchResults
+from emdb.models.facets import EMDBFacets, DEFAULT_FACET_FIELDS, DEFAULT_FACET_RANGES
+from emdb.models.search import EMDBSearchResults, SEARCH_FIELD_DTYPES, search_fields
 from emdb.models.validation import EMDBValidation
-from emdb.utils import make_request, fixed_sleep_rate_limit
+from emdb.ratelimit import TokenBucketRateLimiter
+from emdb.retry import RetryPolicy
+from emdb.utils import make_request, create_session, SingleFlight, API_BASE_URL, DEFAULT_TIMEOUT
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - exercised only without the parquet extra
+    pyarrow = None
 
 
 class EMDB:
     """
     High-level EMDB API client.
 
+    All API calls and file downloads made through the client share one pooled,
+    keep-alive HTTP session, so repeated requests to the same host reuse open
+    connections instead of paying a new TCP/TLS handshake each time. API calls
+    also share one token-bucket rate limiter and one retry policy, owned by the client.
+    Identical calls made concurrently from several threads are coalesced into one
+    HTTP request and one parse, and all callers receive the same object.
+
     Usage:
         client = EMDB()
         entry = client.get_entry("EMD-1234")
+
+        # Or, to release pooled connections when done:
+        with EMDB(pool_maxsize=20) as client:
+            entry = client.get_entry("EMD-1234")
     """
 
-    @fixed_sleep_rate_limit(0.4)
+    def __init__(self, base_url: str = API_BASE_URL, timeout=DEFAULT_TIMEOUT, pool_connections: int = 10,
+                 pool_maxsize: int = 10, pool_block: bool = False, keep_alive: bool = True,
+                 session: requests.Session = None, rate_limit: float = 2.5, burst: int = 1,
+                 rate_limiter: TokenBucketRateLimiter = None, retry_policy: RetryPolicy = None,
+                 cache: MemoryCache = None, response_cache: SQLiteResponseCache = None):
+        """
+        :param base_url: Base URL of the EMDB API.
+        :param timeout: Request timeout in seconds, or a (connect, read) tuple.
+        :param pool_connections: Number of hosts to keep a connection pool for.
+        :param pool_maxsize: Maximum number of connections kept open per host.
+        :param pool_block: If True, wait for a free connection when a host pool is exhausted.
+        :param keep_alive: If False, connections are closed after every response.
+        :param session: An existing requests.Session to use instead of creating one.
+        :param rate_limit: Sustained number of API requests per second.
+        :param burst: Number of API requests allowed back to back after an idle period.
+        :param rate_limiter: An existing rate limiter to share with other clients. Overrides
+            ``rate_limit`` and ``burst``.
+        :param retry_policy: Retry policy for API calls and file downloads. Defaults to
+            ``RetryPolicy()``.
+        :param cache: Optional in-memory cache for entries, validations and annotations.
+            Cache hits skip the rate limiter, the network and parsing.
+        :param response_cache: Optional persistent cache of raw API responses, shared between
+            processes and restarts. Consulted before going to the network.
+        """
+        self.base_url = base_url
+        self.timeout = timeout
+        self._session = session if session is not None else create_session(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            keep_alive=keep_alive,
+        )
+        self._rate_limiter = rate_limiter if rate_limiter is not None else TokenBucketRateLimiter(rate_limit, burst)
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.cache = cache
+        self.response_cache = response_cache
+        self._flights = SingleFlight()
+
+    @property
+    def rate_limiter(self) -> TokenBucketRateLimiter:
+        """
+        The rate limiter shared by all API calls of this client. Its ``stats`` report
+        the time spent waiting for it.
+        """
+        return self._rate_limiter
+
+    @property
+    def session(self) -> requests.Session:
+        """
+        The pooled HTTP session used for API calls and file downloads.
+        """
+        return self._session
+
+    def close(self) -> None:
+        """
+        Close the HTTP session and release all pooled connections.
+        """
+        self._session.close()
+
+    def __enter__(self) -> "EMDB":
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb) -> None:
+        self.close()
+
+    @staticmethod
+    def _flight_key(*parts, params=None) -> tuple:
+        # Repeated parameters (e.g. facet.field) are given as lists, which are not hashable
+        items = ((key, tuple(value) if isinstance(value, list) else value) for key, value in (params or {}).items())
+        return parts + (tuple(sorted(items)),)
+
+    def _request(self, endpoint: str, params=None, restype: str = "json"):
+        return self._flights.do(
+            self._flight_key("request", endpoint, restype, params=params),
+            lambda: make_request(endpoint, params=params, restype=restype, session=self._session,
+                                 timeout=self.timeout, base_url=self.base_url, rate_limiter=self._rate_limiter,
+                                 retry_policy=self.retry_policy, response_cache=self.response_cache)
+        )
+
+    def _fetch(self, kind: str, emdb_id: str, endpoint: str, parse, params=None):
+        """
+        Fetch and parse an object, going through the cache when one is configured.
+        Concurrent identical fetches share one request and one parse.
+        """
+        if self.cache is not None:
+            cached = self.cache.get(kind, emdb_id)
+            if cached is not None:
+                return cached
+
+        def fetch():
+            data = self._request(endpoint, params=params)
+            obj = parse(data)
+            if self.cache is not None:
+                self.cache.set(kind, emdb_id, obj, size=approximate_size(data))
+            return obj
+
+        return self._flights.do(self._flight_key("fetch", endpoint, params=params), fetch)
+
     def get_entry(self, emdb_id: str) -> EMDBEntry:
         """
         Retrieve an EMDB entry by its ID.
@@ -36,14 +160,12 @@ class EMDB:
 
         endpoint = f"/entry/{emdb_id}"
         try:
-            data = make_request(endpoint)
-            return EMDBEntry.from_api(data, client=self)
+            return self._fetch("entry", emdb_id, endpoint, lambda data: EMDBEntry.from_api(data, client=self))
         except EMDBNotFoundError as e:
             raise e
         except Exception as e:
             raise EMDBAPIError(f"Failed to retrieve entry {emdb_id}: {str(e)}")
 
-    @fixed_sleep_rate_limit(0.4)
     def get_validation(self, emdb_id: str) -> "EMDBValidation":
         """
         Retrieve the validation data for a given EMDB entry.
@@ -56,14 +178,13 @@ class EMDB:
         endpoint = f"/analysis/{emdb_id}"
         params = {"information": "all"}
         try:
-            data = make_request(endpoint, params=params)
-            return EMDBValidation.from_api(emdb_id, data, self)
+            return self._fetch("validation", emdb_id, endpoint, lambda data: EMDBValidation.from_api(emdb_id, data, self),
+                               params=params)
         except EMDBNotFoundError as e:
             raise e
         except Exception as e:
             raise EMDBAPIError(f"Failed to retrieve validation for {emdb_id}: {str(e)}")
 
-    @fixed_sleep_rate_limit(0.5)
     def get_annotations(self, emdb_id: str) -> EMDBAnnotations:
         """
         Retrieve annotations for a given EMDB entry.
@@ -75,45 +196,219 @@ class EMDB:
         """
         endpoint = f"/annotations/{emdb_id}"
         try:
-            data = make_request(endpoint)
-            return EMDBAnnotations.from_api(data, self)
+            return self._fetch("annotations", emdb_id, endpoint, lambda data: EMDBAnnotations.from_api(data, self))
         except EMDBNotFoundError as e:
             raise e
         except Exception as e:
             raise EMDBAPIError(f"Failed to retrieve annotations for {emdb_id}: {str(e)}")
 
-    def search(self, query: str) -> "EMDBSearchResults":
+    def get_entries(self, emdb_ids: Iterable[str], max_workers: int = 4) -> List[BulkResult]:
+        """
+        Retrieve many EMDB entries concurrently under the client's rate limit.
+
+        :param emdb_ids: The EMDB IDs of the entries to retrieve.
+        :param max_workers: Number of requests made in parallel.
+        :return: A list of BulkResult in input order. Failed IDs carry the exception in
+            ``error`` instead of raising.
+        """
+        return run_bulk(self.get_entry, emdb_ids, max_workers)
+
+    def iter_entries(self, emdb_ids: Iterable[str], max_workers: int = 4) -> Iterator[BulkResult]:
+        """
+        Retrieve many EMDB entries concurrently, yielding each result as soon as it completes.
+
+        :param emdb_ids: The EMDB IDs of the entries to retrieve.
+        :param max_workers: Number of requests made in parallel.
+        :return: An iterator of BulkResult in completion order.
+        """
+        return iter_bulk(self.get_entry, emdb_ids, max_workers)
+
+    def get_validations(self, emdb_ids: Iterable[str], max_workers: int = 4) -> List[BulkResult]:
+        """
+        Retrieve validation data for many EMDB entries concurrently under the client's rate limit.
+
+        :param emdb_ids: The EMDB IDs of the entries to retrieve validation data for.
+        :param max_workers: Number of requests made in parallel.
+        :return: A list of BulkResult in input order.
+        """
+        return run_bulk(self.get_validation, emdb_ids, max_workers)
+
+    def iter_validations(self, emdb_ids: Iterable[str], max_workers: int = 4) -> Iterator[BulkResult]:
+        """
+        Retrieve validation data for many EMDB entries, yielding each result as soon as it completes.
+
+        :param emdb_ids: The EMDB IDs of the entries to retrieve validation data for.
+        :param max_workers: Number of requests made in parallel.
+        :return: An iterator of BulkResult in completion order.
+        """
+        return iter_bulk(self.get_validation, emdb_ids, max_workers)
+
+    def get_annotations_many(self, emdb_ids: Iterable[str], max_workers: int = 4) -> List[BulkResult]:
+        """
+        Retrieve annotations for many EMDB entries concurrently under the client's rate limit.
+
+        :param emdb_ids: The EMDB IDs of the entries to retrieve annotations for.
+        :param max_workers: Number of requests made in parallel.
+        :return: A list of BulkResult in input order.
+        """
+        return run_bulk(self.get_annotations, emdb_ids, max_workers)
+
+    def iter_annotations(self, emdb_ids: Iterable[str], max_workers: int = 4) -> Iterator[BulkResult]:
+        """
+        Retrieve annotations for many EMDB entries, yielding each result as soon as it completes.
+
+        :param emdb_ids: The EMDB IDs of the entries to retrieve annotations for.
+        :param max_workers: Number of requests made in parallel.
+        :return: An iterator of BulkResult in completion order.
+        """
+        return iter_bulk(self.get_annotations, emdb_ids, max_workers)
+
+    def search(self, query: str, page_size: Optional[int] = None,
+               fields: Union[str, Iterable[str], None] = None) -> "EMDBSearchResults":
         """
         Search for EMDB entries using a query string.
 
+        Fields requested with ``fields`` come back in the same response and are stored with
+        the hits: reading them from a lazy entry does not fetch the entry. For example,
+        ``fields=["structure_determination_method", "resolution"]`` makes ``entry.method``
+        and ``entry.resolution`` available without one ``get_entry`` call per hit.
+
         :param query: The search query string.
+        :param page_size: If given, walk the results in pages of this many hits
+            (see :meth:`iter_search`) instead of requesting them all in one response.
+        :param fields: Search fields to return with the hits, as a list or a comma-separated string.
         :return: An EMDBSearchResults object containing the search results.
         :raises EMDBAPIError: For API-related errors.
         """
+        fl = search_fields(fields)
+        if page_size:
+            return EMDBSearchResults.from_rows(self.iter_search(query, fields=fl, page_size=page_size), self)
+
         endpoint = f"/search/{query}"
         params = {
             "rows": 1000000,
-            "fl": "emdb_id",
+            "fl": fl,
             "wt": "csv",
             "download": "false"
         }
         try:
-            data = make_request(endpoint, params=params, restype="csv")
+            data = self._request(endpoint, params=params, restype="csv")
             return EMDBSearchResults.from_api(data, self)
         except Exception as e:
             raise EMDBAPIError(f"Search failed: {str(e)}")
 
-    @fixed_sleep_rate_limit(0.5)
-    def csv_search(self, query: str, fields: str = "emdb_id,structure_determination_method,resolution") -> "pandas.DataFrame":
+    def iter_search(self, query: str, fields: str = "emdb_id", page_size: int = 1000,
+                    prefetch: int = 2) -> Iterator[Dict[str, str]]:
         """
-        Perform a search returning the results in a CSV table (Pandas dataframe).
+        Stream search hits page by page instead of downloading them in one response.
+
+        The result set is walked with Solr ``start``/``rows`` paging. Up to ``prefetch`` pages
+        are requested in parallel ahead of the caller, so memory use is bounded by
+        ``prefetch * page_size`` rows whatever the number of hits. Every page is one API
+        call and goes through the client's rate limiter.
+
+        Usage:
+            for row in client.iter_search("HIV", fields="emdb_id,resolution"):
+                print(row["emdb_id"], row["resolution"])
 
         :param query: The search query string.
         :param fields: Comma-separated list of fields to return.
-        :return: A DataFrame containing the search results.
+        :param page_size: Number of hits per request.
+        :param prefetch: Number of pages requested concurrently.
+        :return: An iterator of rows, as dictionaries of field name to string value.
+        :raises EMDBAPIError: For API-related errors.
+        """
+        endpoint = f"/search/{query}"
+
+        def fetch_page(start: int) -> List[Dict[str, str]]:
+            params = {
+                "rows": page_size,
+                "start": start,
+                "fl": fields,
+                "wt": "csv",
+                "download": "false"
+            }
+            try:
+                data = self._request(endpoint, params=params, restype="csv")
+                return list(csv.DictReader(data.splitlines()))
+            except Exception as e:
+                raise EMDBAPIError(f"Search failed at offset {start}: {str(e)}")
+
+        pending = deque()
+        next_start = 0
+        executor = ThreadPoolExecutor(max_workers=prefetch)
+
+        def submit_next() -> None:
+            nonlocal next_start
+            pending.append(executor.submit(fetch_page, next_start))
+            next_start += page_size
+
+        try:
+            for _ in range(prefetch):
+                submit_next()
+            while pending:
+                rows = pending.popleft().result()
+                if len(rows) < page_size:
+                    # Last page; anything still in flight is past the end
+                    yield from rows
+                    return
+                submit_next()
+                yield from rows
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def count(self, query: str) -> int:
+        """
+        Count the hits of a search without downloading them.
+
+        :param query: The search query string.
+        :return: The number of matching entries.
         :raises EMDBAPIError: For API-related errors.
         """
         endpoint = f"/search/{query}"
+        try:
+            data = self._request(endpoint, params={"rows": 0, "wt": "json"})
+            return int(data["response"]["numFound"])
+        except Exception as e:
+            raise EMDBAPIError(f"Count failed: {str(e)}")
+
+    def facets(self, query: str, fields: Iterable[str] = DEFAULT_FACET_FIELDS,
+               ranges: Optional[Dict[str, Tuple[Any, Any, Any]]] = DEFAULT_FACET_RANGES,
+               limit: int = 100) -> EMDBFacets:
+        """
+        Count the hits of a search per value of some fields, without downloading them.
+
+        Usage:
+            facets = client.facets("HIV", fields=["structure_determination_method"],
+                                   ranges={"resolution": (0, 10, 0.5)})
+            facets.counts("structure_determination_method")
+
+        :param query: The search query string.
+        :param fields: Fields to count the distinct values of.
+        :param ranges: ``{field: (start, end, gap)}`` of numeric or date fields to count in bins.
+            Defaults to 1 Å resolution bins and release years.
+        :param limit: Maximum number of values returned per field; -1 for all of them.
+        :return: An EMDBFacets object with the number of hits and the counts.
+        :raises EMDBAPIError: For API-related errors.
+        """
+        endpoint = f"/search/{query}"
+        params = EMDBFacets.request_params(fields, ranges, limit)
+        try:
+            data = self._request(endpoint, params=params)
+            return EMDBFacets.from_api(data)
+        except Exception as e:
+            raise EMDBAPIError(f"Facet search failed: {str(e)}")
+
+    def _stream(self, endpoint: str, params=None) -> requests.Response:
+        # Open response whose body is read by the caller; not coalesced or cached
+        return make_request(endpoint, params=params, restype="stream", session=self._session,
+                            timeout=self.timeout, base_url=self.base_url, rate_limiter=self._rate_limiter,
+                            retry_policy=self.retry_policy)
+
+    @staticmethod
+    def _csv_params(fields: Optional[str]) -> dict:
         params = {
             "rows": 1000000,
             "wt": "csv",
@@ -121,11 +416,91 @@ class EMDB:
         }
         if fields:
             params["fl"] = fields
+        return params
+
+    def csv_search(self, query: str, fields: str = "emdb_id,structure_determination_method,resolution",
+                   chunksize: Optional[int] = None, dtype: Optional[Dict[str, Any]] = None,
+                   engine: Optional[str] = None) -> Union["pandas.DataFrame", Iterator["pandas.DataFrame"]]:
+        """
+        Perform a search returning the results in a CSV table (Pandas dataframe).
+
+        The response body is parsed while it is downloaded, without first being held in memory
+        as a string. Known fields get explicit column types instead of inferred ones: ``emdb_id``
+        is a string, ``structure_determination_method`` a categorical and ``resolution`` a float32.
+
+        Usage:
+            for chunk in client.csv_search("*", chunksize=100000):
+                process(chunk)
+
+        :param query: The search query string.
+        :param fields: Comma-separated list of fields to return.
+        :param chunksize: If given, return an iterator of DataFrames of this many rows instead
+            of one DataFrame.
+        :param dtype: Column types merged over the defaults for known fields.
+        :param engine: The ``pandas.read_csv`` parser engine, e.g. ``"pyarrow"`` (requires pyarrow,
+            and does not support ``chunksize``).
+        :return: A DataFrame containing the search results, or an iterator of DataFrames.
+        :raises EMDBAPIError: For API-related errors.
+        """
+        endpoint = f"/search/{query}"
+        read_options = {"dtype": {**SEARCH_FIELD_DTYPES, **(dtype or {})}}
+        if engine:
+            read_options["engine"] = engine
+
+        if chunksize:
+            return self._iter_csv_search(endpoint, fields, chunksize, read_options)
+        try:
+            with self._stream(endpoint, params=self._csv_params(fields)) as response:
+                return pandas.read_csv(response.raw, **read_options)
+        except Exception as e:
+            raise EMDBAPIError(f"Raw search failed: {str(e)}")
 
+    def _iter_csv_search(self, endpoint: str, fields: Optional[str], chunksize: int,
+                         read_options: dict) -> Iterator["pandas.DataFrame"]:
         try:
-            data = make_request(endpoint, params=params, restype="csv")
-            return pandas.read_csv(StringIO(data))
+            with self._stream(endpoint, params=self._csv_params(fields)) as response:
+                with pandas.read_csv(response.raw, chunksize=chunksize, **read_options) as reader:
+                    yield from reader
         except Exception as e:
             raise EMDBAPIError(f"Raw search failed: {str(e)}")
 
+    def csv_search_to_parquet(self, query: str, path: str,
+                              fields: str = "emdb_id,structure_determination_method,resolution",
+                              chunksize: int = 100000, dtype: Optional[Dict[str, Any]] = None,
+                              compression: str = "snappy") -> int:
+        """
+        Stream the results of a search into a Parquet file, one row group per chunk, without
+        holding the whole table in memory.
+
+        Requires pyarrow (``pip install emdb[parquet]``).
+
+        :param query: The search query string.
+        :param path: The local path of the Parquet file to write.
+        :param fields: Comma-separated list of fields to return.
+        :param chunksize: Number of rows parsed and written at a time.
+        :param dtype: Column types merged over the defaults for known fields.
+        :param compression: Parquet compression codec.
+        :return: The number of rows written.
+        :raises EMDBAPIError: For API-related errors.
+        """
+        if pyarrow is None:
+            raise ImportError("csv_search_to_parquet requires pyarrow. Install it with: pip install emdb[parquet]")
+
+        rows = 0
+        writer = None
+        try:
+            for chunk in self.csv_search(query, fields=fields, chunksize=chunksize, dtype=dtype):
+                if writer is None:
+                    table = pyarrow.Table.from_pandas(chunk, preserve_index=False)
+                    writer = pyarrow.parquet.ParquetWriter(path, table.schema, compression=compression)
+                else:
+                    # Cast to the first chunk's schema, e.g. for columns that are all empty in this chunk
+                    table = pyarrow.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+                writer.write_table(table)
+                rows += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows
+
 
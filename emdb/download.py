@@ -0,0 +1,738 @@
+"""
+Streaming, resumable file downloads.
+
+Response bodies are written to disk chunk by chunk, so memory use does not depend on
+the file size, and go to a ``.part`` file next to the destination that is renamed
+into place once complete. Readers never see a truncated file at the final path.
+
+A ``.part.json`` sidecar records how many bytes of the ``.part`` file are known to be
+good, together with the server's ``ETag``/``Last-Modified`` and the total size. An
+interrupted download continues from there with a ``Range`` request, both within one
+call (as long as bytes keep arriving) and in a later call.
+
+Large files can also be downloaded in segments: byte ranges fetched concurrently over
+pooled connections and written at their offsets into a preallocated ``.part`` file.
+
+Finally, a single pass over the response can decompress a ``.gz`` file into the output
+and compute its MD5 and SHA-256 digests for comparison with the published checksums.
+"""
+import errno
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TYPE_CHECKING
+
+import requests
+import urllib3
+
+from emdb.exceptions import EMDBChecksumError, EMDBFileNotFoundError, EMDBNetworkError
+from emdb.retry import RetryPolicy
+from emdb.utils import DEFAULT_TIMEOUT, send_with_retry
+
+if TYPE_CHECKING:
+    from emdb.models.files import BaseFile
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+PART_SUFFIX = ".part"
+META_SUFFIX = ".part.json"
+# The sidecar offset is saved at least every this many bytes
+CHECKPOINT_BYTES = 16 * 1024 * 1024
+# size_kbytes is rounded by the API; partial files this much larger are considered stale
+SIZE_TOLERANCE = 0.05
+# Segmented downloads use one segment per MIN_SEGMENT_SIZE bytes, up to MAX_SEGMENTS;
+# smaller files are downloaded as a single stream
+MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+MAX_SEGMENTS = 8
+
+# Called with the number of bytes written so far and the expected total, if known. Downloads
+# report their starting offset, e.g. the size of a resumed .part file, before the first chunk.
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+# Digest algorithms computed by single-pass downloads, by the length of their hex digest
+DIGEST_ALGORITHMS = {32: "md5", 64: "sha256"}
+
+_CONTENT_RANGE = re.compile(r"bytes\s+(?:(\d+)-(\d+)|\*)/(\d+|\*)")
+
+
+def part_path(output_path: str) -> str:
+    """
+    Path of the temporary file a download is written to before being renamed to ``output_path``.
+    """
+    return output_path + PART_SUFFIX
+
+
+def content_length(response: requests.Response) -> Optional[int]:
+    """
+    The ``Content-Length`` of a response, or None if it is missing or invalid.
+    """
+    try:
+        return int(response.headers["Content-Length"])
+    except (KeyError, ValueError):
+        return None
+
+
+def preallocate(f, size: int) -> bool:
+    """
+    Reserve disk blocks for the first ``size`` bytes of an open file, where the platform supports it.
+
+    A full disk then fails the download when it starts rather than part way through, and the
+    file is less fragmented. The file size becomes at least ``size``.
+
+    :param f: A file opened for writing.
+    :param size: The number of bytes to reserve.
+    :return: True if the space was reserved, False if the platform or file system cannot.
+    :raises OSError: If the disk is full.
+    """
+    if not hasattr(os, "posix_fallocate"):
+        return False
+    try:
+        os.posix_fallocate(f.fileno(), 0, size)
+    except OSError as e:
+        if e.errno in (errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS):
+            return False
+        raise
+    return True
+
+
+def parse_content_range(value: Optional[str]) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+    """
+    Parse a ``Content-Range`` header such as ``bytes 100-199/1000`` or ``bytes */1000``.
+
+    :return: The first and last byte positions and the total size; None for missing parts.
+    """
+    match = _CONTENT_RANGE.fullmatch((value or "").strip())
+    if match is None:
+        return None, None, None
+    first, last, total = match.groups()
+    return (int(first) if first else None, int(last) if last else None,
+            int(total) if total and total != "*" else None)
+
+
+def open_download(http, url: str, timeout=DEFAULT_TIMEOUT, retry_policy: Optional[RetryPolicy] = None,
+                  headers: Optional[dict] = None) -> requests.Response:
+    """
+    Send a streaming GET for a file, retrying transient failures.
+
+    :param http: A requests.Session, or the requests module.
+    :param url: The URL of the file.
+    :param timeout: Request timeout in seconds, or a (connect, read) tuple.
+    :param retry_policy: The retry policy. Defaults to ``RetryPolicy()``.
+    :param headers: Extra request headers, e.g. ``Range``.
+    :return: The response, with its body not read yet. The caller must close it.
+    :raises EMDBNetworkError: If the request failed with a network error.
+    """
+    return send_with_retry(http, url, timeout=timeout, retry_policy=retry_policy, headers=headers, stream=True)
+
+
+class PartialDownload:
+    """
+    The ``.part`` file of a download and its sidecar.
+
+    The sidecar offset only ever counts bytes that were written and flushed, so after a
+    crash the ``.part`` file may be longer than the offset but never shorter; the extra
+    bytes are overwritten when the download resumes.
+    """
+
+    def __init__(self, output_path: str, url: str, persistent: bool = True):
+        """
+        :param output_path: The final path of the file.
+        :param url: The URL being downloaded; a sidecar written for another URL is ignored.
+        :param persistent: Keep the ``.part`` file and sidecar after a failure so the download
+            can resume. If False, they are removed.
+        """
+        self.output_path = output_path
+        self.path = part_path(output_path)
+        self.meta_path = output_path + META_SUFFIX
+        self.url = url
+        self.persistent = persistent
+        self.offset = 0
+        self.total: Optional[int] = None
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+
+    def load(self, expected_size: Optional[int] = None) -> int:
+        """
+        Pick up a previous attempt from the sidecar, if it is usable.
+
+        :param expected_size: Approximate size of the file in bytes (from ``size_kbytes``).
+        :return: The offset to resume from; 0 if there is nothing to resume.
+        """
+        if not self.persistent:
+            self.reset()
+            return 0
+        try:
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            size = os.path.getsize(self.path)
+        except (OSError, ValueError):
+            self.reset()
+            return 0
+        offset = meta.get("offset", 0)
+        too_large = expected_size is not None and offset > expected_size * (1 + SIZE_TOLERANCE) + 1024
+        if meta.get("url") != self.url or not 0 <= offset <= size or too_large:
+            self.reset()
+            return 0
+        self.offset = offset
+        self.total = meta.get("total")
+        self.etag = meta.get("etag")
+        self.last_modified = meta.get("last_modified")
+        return offset
+
+    def save(self) -> None:
+        """
+        Write the sidecar. The ``.part`` file must have been flushed up to ``offset``.
+        """
+        if not self.persistent:
+            return
+        temp_path = self.meta_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"url": self.url, "offset": self.offset, "total": self.total,
+                       "etag": self.etag, "last_modified": self.last_modified}, f)
+        os.replace(temp_path, self.meta_path)
+
+    def reset(self) -> None:
+        """
+        Forget any previous attempt and start from byte zero.
+        """
+        self.offset = 0
+        self.total = None
+        self.etag = None
+        self.last_modified = None
+        self.discard()
+
+    def discard(self) -> None:
+        """
+        Remove the ``.part`` file and the sidecar.
+        """
+        for path in (self.path, self.meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def range_headers(self) -> Optional[dict]:
+        """
+        Headers asking for the rest of the file, only if it has not changed since the first attempt.
+        """
+        if not self.offset:
+            return None
+        headers = {"Range": f"bytes={self.offset}-"}
+        # If-Range only accepts a strong ETag or a date
+        if self.etag and not self.etag.startswith("W/"):
+            headers["If-Range"] = self.etag
+        elif self.last_modified:
+            headers["If-Range"] = self.last_modified
+        return headers
+
+    def begin(self, response: requests.Response, total: Optional[int]) -> None:
+        """
+        Record the validators and size of the response the body will be read from.
+        """
+        self.etag = response.headers.get("ETag")
+        self.last_modified = response.headers.get("Last-Modified")
+        self.total = total
+        self.save()
+
+    def write(self, response: requests.Response, chunk_size: int = DEFAULT_CHUNK_SIZE,
+              progress: Optional[ProgressCallback] = None, allocate: bool = False) -> int:
+        """
+        Write a response body to the ``.part`` file from ``offset`` on.
+
+        The body is written as received, without undoing any ``Content-Encoding``, so a
+        ``.gz`` file is saved compressed. Bytes beyond ``offset`` left by an earlier attempt
+        are overwritten, and cut off by ``finish``.
+
+        :param allocate: Reserve ``total`` bytes on disk when starting a new ``.part`` file.
+        :return: The number of bytes received from this response.
+        :raises EMDBNetworkError: If the transfer failed; ``offset`` counts the bytes kept.
+        """
+        received = 0
+        mode = "r+b" if self.offset and os.path.exists(self.path) else "wb"
+        with open(self.path, mode) as f:
+            if mode == "wb" and allocate and self.total:
+                preallocate(f, self.total)
+            f.seek(self.offset)
+            checkpoint = self.offset + CHECKPOINT_BYTES
+            try:
+                for chunk in response.raw.stream(chunk_size, decode_content=False):
+                    f.write(chunk)
+                    self.offset += len(chunk)
+                    received += len(chunk)
+                    if progress is not None:
+                        progress(self.offset, self.total)
+                    if self.offset >= checkpoint:
+                        f.flush()
+                        self.save()
+                        checkpoint = self.offset + CHECKPOINT_BYTES
+            except (requests.RequestException, urllib3.exceptions.HTTPError) as e:
+                f.flush()
+                self.save()
+                raise EMDBNetworkError(f"Network error while downloading {self.url}: {e}")
+        return received
+
+    def finish(self) -> None:
+        """
+        Move the complete ``.part`` file to the output path and remove the sidecar.
+        """
+        if os.path.getsize(self.path) != self.offset:
+            os.truncate(self.path, self.offset)
+        os.replace(self.path, self.output_path)
+        if os.path.exists(self.meta_path):
+            os.remove(self.meta_path)
+
+
+def download_file(file: "BaseFile", output_path: str, http=requests, timeout=DEFAULT_TIMEOUT,
+                  retry_policy: Optional[RetryPolicy] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                  progress: Optional[ProgressCallback] = None, resume: bool = True,
+                  allocate: bool = False) -> int:
+    """
+    Download an EMDB file to ``output_path`` through a ``.part`` file, resuming earlier attempts.
+
+    When the connection drops mid-transfer, the download continues with a ``Range`` request
+    from the last byte written, guarded by ``If-Range`` so that a file changed on the server is
+    downloaded again from the start. Interruptions are retried as long as bytes keep arriving;
+    otherwise ``retry_policy`` decides. A server that ignores ranges (200 instead of 206) makes
+    the download restart from byte zero.
+
+    :param file: The file to download.
+    :param output_path: The local path of the file.
+    :param http: A requests.Session, or the requests module.
+    :param timeout: Request timeout in seconds, or a (connect, read) tuple.
+    :param retry_policy: The retry policy. Defaults to ``RetryPolicy()``.
+    :param chunk_size: Number of bytes read and written at a time.
+    :param progress: Optional callback receiving ``(bytes_written, total_bytes)``.
+    :param resume: Keep partial data after a failure and resume from it. If False, a failed
+        download leaves nothing behind.
+    :param allocate: Reserve the file's size on disk (see :func:`preallocate`) before writing.
+    :return: The size of the downloaded file in bytes.
+    :raises EMDBFileNotFoundError: If the file is not available.
+    :raises EMDBNetworkError: If the transfer failed for good. With ``resume`` the partial
+        data is kept for the next call.
+    :raises OSError: If the disk is full.
+    """
+    policy = retry_policy if retry_policy is not None else RetryPolicy()
+    url = file.source_path
+    expected_size = int(file.size_kbytes * 1024) if file.size_kbytes else None
+    partial = PartialDownload(output_path, url, persistent=resume)
+    partial.load(expected_size)
+
+    # Interruptions mid-transfer are retried here; failures to connect were already
+    # retried by open_download and are final
+    attempt = 0
+    start = time.monotonic()
+    furthest = partial.offset
+    try:
+        while True:
+            with open_download(http, url, timeout=timeout, retry_policy=policy,
+                               headers=partial.range_headers()) as response:
+                status = response.status_code
+                if status == 416 and partial.offset:
+                    _, _, total = parse_content_range(response.headers.get("Content-Range"))
+                    if total is not None and total == partial.offset:
+                        # The previous attempt had received everything
+                        if progress is not None:
+                            progress(partial.offset, total)
+                        partial.finish()
+                        return partial.offset
+                    partial.reset()
+                    continue
+                if status == 206:
+                    first, _, total = parse_content_range(response.headers.get("Content-Range"))
+                    if first != partial.offset or (partial.total is not None and total != partial.total):
+                        partial.reset()
+                        continue
+                elif status == 200:
+                    # Ranges not supported, or the file changed since the first attempt
+                    partial.reset()
+                    total = content_length(response)
+                else:
+                    raise EMDBFileNotFoundError(file._emdb_id, file.filename)
+                partial.begin(response, total)
+                if progress is not None:
+                    progress(partial.offset, partial.total)
+                try:
+                    partial.write(response, chunk_size, progress, allocate)
+                    if partial.total is not None and partial.offset != partial.total:
+                        partial.save()
+                        raise EMDBNetworkError(
+                            f"Download of {url} ended after {partial.offset} of {partial.total} bytes")
+                except EMDBNetworkError:
+                    if not resume:
+                        raise
+                    if partial.offset > furthest:
+                        # Further than ever before: count attempts from here
+                        furthest = partial.offset
+                        attempt = 0
+                        start = time.monotonic()
+                    attempt += 1
+                    delay = policy.backoff(attempt)
+                    if not policy.should_retry("GET", attempt, time.monotonic() - start, delay):
+                        raise
+                    time.sleep(delay)
+                    continue
+            partial.finish()
+            return partial.offset
+    except BaseException:
+        if not resume:
+            partial.discard()
+        raise
+
+
+class RangesNotHonoredError(Exception):
+    """
+    A segment request was answered without the requested byte range.
+    """
+
+
+def auto_segments(size: Optional[int]) -> int:
+    """
+    Number of segments to download a file of ``size`` bytes in.
+
+    :param size: The file size in bytes, or None if unknown.
+    :return: One segment per ``MIN_SEGMENT_SIZE`` bytes, between 1 and ``MAX_SEGMENTS``.
+    """
+    if not size:
+        return 1
+    return max(1, min(MAX_SEGMENTS, size // MIN_SEGMENT_SIZE))
+
+
+def segment_bounds(size: int, segments: int) -> List[Tuple[int, int]]:
+    """
+    Split ``size`` bytes into ``segments`` contiguous ``(first, last)`` byte ranges, both inclusive.
+    """
+    length = math.ceil(size / segments)
+    return [(first, min(size, first + length) - 1) for first in range(0, size, length)]
+
+
+def _validator(response: requests.Response) -> Optional[str]:
+    # If-Range only accepts a strong ETag or a date
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return response.headers.get("Last-Modified")
+
+
+def _fetch_segment(http, url: str, path: str, first: int, last: int, validator: Optional[str], timeout,
+                   policy: RetryPolicy, chunk_size: int, report: Callable[[int], None],
+                   cancelled: threading.Event, file: "BaseFile") -> None:
+    """
+    Download bytes ``first`` to ``last`` of ``url`` into ``path`` at the same offsets.
+
+    An interrupted segment continues from its last byte written, as long as bytes keep arriving
+    or ``policy`` allows another attempt.
+    """
+    position = first
+    furthest = first
+    attempt = 0
+    start = time.monotonic()
+    with open(path, "r+b") as f:
+        while position <= last and not cancelled.is_set():
+            headers = {"Range": f"bytes={position}-{last}"}
+            if validator:
+                headers["If-Range"] = validator
+            with open_download(http, url, timeout=timeout, retry_policy=policy, headers=headers) as response:
+                if response.status_code in (200, 416):
+                    raise RangesNotHonoredError(f"{url} answered {response.status_code} to a range request")
+                if response.status_code != 206:
+                    raise EMDBFileNotFoundError(file._emdb_id, file.filename)
+                got_first, got_last, _ = parse_content_range(response.headers.get("Content-Range"))
+                if got_first != position or got_last != last:
+                    raise RangesNotHonoredError(f"{url} answered a different range than bytes {position}-{last}")
+                f.seek(position)
+                try:
+                    for chunk in response.raw.stream(chunk_size, decode_content=False):
+                        if cancelled.is_set():
+                            return
+                        chunk = chunk[:last + 1 - position]
+                        f.write(chunk)
+                        position += len(chunk)
+                        report(len(chunk))
+                    if position <= last:
+                        raise EMDBNetworkError(f"Segment {first}-{last} of {url} ended at byte {position}")
+                except (requests.RequestException, urllib3.exceptions.HTTPError, EMDBNetworkError) as e:
+                    if position > furthest:
+                        furthest = position
+                        attempt = 0
+                        start = time.monotonic()
+                    attempt += 1
+                    delay = policy.backoff(attempt)
+                    if not policy.should_retry("GET", attempt, time.monotonic() - start, delay):
+                        if isinstance(e, EMDBNetworkError):
+                            raise
+                        raise EMDBNetworkError(f"Network error while downloading {url}: {e}")
+                    time.sleep(delay)
+
+
+def download_segmented(file: "BaseFile", output_path: str, http=requests, timeout=DEFAULT_TIMEOUT,
+                       retry_policy: Optional[RetryPolicy] = None, segments: Optional[int] = None,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE, progress: Optional[ProgressCallback] = None,
+                       resume: bool = True, allocate: bool = False) -> int:
+    """
+    Download an EMDB file as concurrent byte ranges written into a preallocated ``.part`` file.
+
+    A ``HEAD`` request gives the size and whether the server accepts ranges. Each segment is
+    then fetched on its own pooled connection, with ``If-Range`` so that a file changing on the
+    server mid-download is detected. Small files, servers without range support or refusing
+    the ``HEAD``, and files that change fall back to :func:`download_file`.
+
+    :param file: The file to download.
+    :param output_path: The local path of the file.
+    :param http: A requests.Session, or the requests module. A session should keep at least
+        ``segments`` connections per host.
+    :param timeout: Request timeout in seconds, or a (connect, read) tuple.
+    :param retry_policy: The retry policy. Defaults to ``RetryPolicy()``.
+    :param segments: Number of concurrent ranges. Defaults to :func:`auto_segments` of the size,
+        and files whose ``size_kbytes`` gives a single segment are downloaded without the ``HEAD``.
+    :param chunk_size: Number of bytes read and written at a time by each segment.
+    :param progress: Optional callback receiving ``(bytes_written, total_bytes)`` across all segments.
+    :param resume: Passed to :func:`download_file` when falling back to a single stream. Segmented
+        downloads themselves always start over.
+    :param allocate: Reserve the file's size on disk (see :func:`preallocate`) instead of creating
+        a sparse file.
+    :return: The size of the downloaded file in bytes.
+    :raises EMDBFileNotFoundError: If the file is not available.
+    :raises EMDBNetworkError: If a segment failed for good.
+    """
+    policy = retry_policy if retry_policy is not None else RetryPolicy()
+    url = file.source_path
+
+    def single_stream():
+        return download_file(file, output_path, http=http, timeout=timeout, retry_policy=policy,
+                             chunk_size=chunk_size, progress=progress, resume=resume, allocate=allocate)
+
+    if segments is None and file.size_kbytes and auto_segments(int(file.size_kbytes * 1024)) < 2:
+        return single_stream()
+
+    head = send_with_retry(http, url, method="HEAD", retry_policy=policy, timeout=timeout, allow_redirects=True)
+    head.close()
+    if head.status_code == 404:
+        raise EMDBFileNotFoundError(file._emdb_id, file.filename)
+    if head.status_code != 200:
+        # Servers refusing HEAD (405, 403...) may still serve the file to a plain GET
+        return single_stream()
+    total = content_length(head)
+    count = auto_segments(total) if segments is None else min(segments, total or 0)
+    if head.headers.get("Accept-Ranges", "").lower() != "bytes" or count < 2:
+        return single_stream()
+
+    partial = PartialDownload(output_path, url, persistent=False)
+    partial.discard()
+
+    lock = threading.Lock()
+    written = [0]
+    cancelled = threading.Event()
+
+    def report(n: int) -> None:
+        with lock:
+            written[0] += n
+            if progress is not None:
+                progress(written[0], total)
+
+    if progress is not None:
+        progress(0, total)
+    try:
+        with open(partial.path, "wb") as f:
+            if not (allocate and preallocate(f, total)):
+                f.truncate(total)
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            futures = [
+                executor.submit(_fetch_segment, http, url, partial.path, first, last, _validator(head), timeout,
+                                policy, chunk_size, report, cancelled, file)
+                for first, last in segment_bounds(total, count)
+            ]
+            wait(futures, return_when=FIRST_EXCEPTION)
+            # Stop the other segments as soon as one has failed
+            cancelled.set()
+        for future in futures:
+            future.result()
+        partial.offset = total
+        partial.finish()
+        return total
+    except RangesNotHonoredError:
+        partial.discard()
+        return single_stream()
+    except BaseException:
+        partial.discard()
+        raise
+
+
+class GzipStreamDecoder:
+    """
+    Incremental gzip decompression with bounded output per step.
+
+    Each ``feed`` yields pieces of at most ``limit`` bytes, so a highly compressible map
+    (large areas of zeros) does not expand a chunk in memory all at once. Files made of
+    several concatenated gzip members are decoded like ``gunzip`` does.
+    """
+
+    def __init__(self, limit: int = DEFAULT_CHUNK_SIZE):
+        """
+        :param limit: Maximum number of decompressed bytes produced at a time.
+        """
+        self.limit = limit
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._in_member = False
+
+    def feed(self, data: bytes) -> Iterator[bytes]:
+        """
+        Decompress the next compressed bytes.
+
+        :return: An iterator of decompressed pieces.
+        :raises zlib.error: If the data is not valid gzip.
+        """
+        while True:
+            if not self._in_member:
+                if not data.strip(b"\0"):
+                    # Nothing left, or zero padding after the last member, ignored like gunzip does
+                    return
+                self._in_member = True
+            out = self._decompressor.decompress(data, self.limit)
+            if out:
+                yield out
+            if self._decompressor.eof:
+                data = self._decompressor.unused_data
+                self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                self._in_member = False
+                continue
+            data = self._decompressor.unconsumed_tail
+            if not data and not out:
+                # Input consumed and no output held back by the limit
+                return
+
+    def close(self) -> None:
+        """
+        Check that the stream ended at the end of a gzip member.
+
+        :raises EOFError: If the last member is incomplete.
+        """
+        if self._in_member:
+            raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+
+
+def parse_checksums(text: str) -> Dict[str, str]:
+    """
+    Parse a checksum listing in the format of ``md5sum`` or ``sha256sum``.
+
+    Lines look like ``<hex digest>  <path>``, optionally with ``*`` before the path for
+    binary mode. Blank lines and ``#`` comments are skipped.
+
+    :param text: The listing.
+    :return: ``{filename: hex digest}``, keyed by the last component of each path.
+    """
+    checksums = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        parts = line.split(None, 1)
+        if len(parts) != 2 or len(parts[0]) not in DIGEST_ALGORITHMS:
+            continue
+        digest, path = parts
+        checksums[path.lstrip("*").strip().rsplit("/", 1)[-1]] = digest.lower()
+    return checksums
+
+
+def fetch_checksums(url: str, http=requests, timeout=DEFAULT_TIMEOUT,
+                    retry_policy: Optional[RetryPolicy] = None) -> Dict[str, str]:
+    """
+    Download and parse a checksum listing.
+
+    :param url: The URL of the listing.
+    :param http: A requests.Session, or the requests module.
+    :param timeout: Request timeout in seconds, or a (connect, read) tuple.
+    :param retry_policy: The retry policy. Defaults to ``RetryPolicy()``.
+    :return: ``{filename: hex digest}``; see :func:`parse_checksums`.
+    :raises EMDBNetworkError: If the listing could not be downloaded.
+    """
+    response = send_with_retry(http, url, retry_policy=retry_policy, timeout=timeout)
+    if response.status_code != 200:
+        raise EMDBNetworkError(f"Could not download checksum listing {url}: status {response.status_code}")
+    return parse_checksums(response.text)
+
+
+def download_single_pass(file: "BaseFile", output_path: str, http=requests, timeout=DEFAULT_TIMEOUT,
+                         retry_policy: Optional[RetryPolicy] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                         progress: Optional[ProgressCallback] = None, decompress: bool = False,
+                         checksum: Optional[str] = None, algorithms: Iterable[str] = ("md5", "sha256")
+                         ) -> Dict[str, str]:
+    """
+    Download an EMDB file in one pass, decompressing it and computing its digests on the fly.
+
+    Each chunk received is fed to the digests and, with ``decompress``, through a streaming
+    gzip decoder into the ``.part`` file, so the file is never read back from disk and memory
+    use stays constant. The digests are of the file as published, i.e. of the compressed bytes.
+    The output only appears at ``output_path`` once the transfer is complete and verified.
+
+    Decompressed downloads cannot be resumed, so this mode always starts from byte zero and
+    does not use segments.
+
+    :param file: The file to download.
+    :param output_path: The local path of the (decompressed) file.
+    :param http: A requests.Session, or the requests module.
+    :param timeout: Request timeout in seconds, or a (connect, read) tuple.
+    :param retry_policy: The retry policy. Defaults to ``RetryPolicy()``.
+    :param chunk_size: Number of bytes read, and at most written, at a time.
+    :param progress: Optional callback receiving ``(bytes_received, total_bytes)``, counted in
+        bytes of the file as published.
+    :param decompress: Gunzip the file while it is received, if it is a ``.gz`` file.
+    :param checksum: Optional expected MD5 or SHA-256 hex digest of the published file.
+    :param algorithms: Digests to compute.
+    :return: ``{algorithm: hex digest}`` of the published file.
+    :raises EMDBFileNotFoundError: If the file is not available.
+    :raises EMDBNetworkError: If the transfer failed or the gzip stream is corrupt.
+    :raises EMDBChecksumError: If the file does not match ``checksum``.
+    """
+    url = file.source_path
+    hashes = {name: hashlib.new(name) for name in algorithms}
+    if checksum is not None:
+        algorithm = DIGEST_ALGORITHMS.get(len(checksum))
+        if algorithm is None:
+            raise ValueError(f"Not an MD5 or SHA-256 hex digest: {checksum}")
+        hashes.setdefault(algorithm, hashlib.new(algorithm))
+    decoder = GzipStreamDecoder(chunk_size) if decompress and file.filename.endswith(".gz") else None
+    partial = PartialDownload(output_path, url, persistent=False)
+    partial.discard()
+    try:
+        with open_download(http, url, timeout=timeout, retry_policy=retry_policy) as response:
+            if response.status_code != 200:
+                raise EMDBFileNotFoundError(file._emdb_id, file.filename)
+            total = content_length(response)
+            received = 0
+            if progress is not None:
+                progress(received, total)
+            with open(partial.path, "wb") as f:
+                try:
+                    for chunk in response.raw.stream(chunk_size, decode_content=False):
+                        received += len(chunk)
+                        for digest in hashes.values():
+                            digest.update(chunk)
+                        if decoder is None:
+                            f.write(chunk)
+                        else:
+                            for piece in decoder.feed(chunk):
+                                f.write(piece)
+                        if progress is not None:
+                            progress(received, total)
+                    if decoder is not None:
+                        decoder.close()
+                except (requests.RequestException, urllib3.exceptions.HTTPError) as e:
+                    raise EMDBNetworkError(f"Network error while downloading {url}: {e}")
+                except (zlib.error, EOFError) as e:
+                    raise EMDBNetworkError(f"Corrupt gzip data while downloading {url}: {e}")
+                partial.offset = f.tell()
+            if total is not None and received != total:
+                raise EMDBNetworkError(f"Download of {url} ended after {received} of {total} bytes")
+        digests = {name: digest.hexdigest() for name, digest in hashes.items()}
+        if checksum is not None:
+            algorithm = DIGEST_ALGORITHMS[len(checksum)]
+            if digests[algorithm] != checksum.lower():
+                raise EMDBChecksumError(file.filename, algorithm, checksum.lower(), digests[algorithm])
+        partial.finish()
+        return digests
+    except BaseException:
+        partial.discard()
+        raise
@@ -44,3 +44,40 @@ class EMDBFileNotFoundError(EMDBError):
         super().__init__(f"File '{filename}' not found in EMDB entry {emdb_id}.")
         self.emdb_id = emdb_id
         self.filename = filename
+
+
+class EMDBInsufficientSpaceError(EMDBError):
+    """Raised when the files to download do not fit in the free space of the target directory."""
+    def __init__(self, directory: str, required: int, available: int):
+        super().__init__(f"Downloading needs {required} bytes but only {available} are free in {directory}.")
+        self.directory = directory
+        self.required = required
+        self.available = available
+
+
+class EMDBChecksumError(EMDBError):
+    """Raised when a downloaded file does not match its published checksum."""
+    def __init__(self, filename: str, algorithm: str, expected: str, actual: str):
+        super().__init__(f"{algorithm} checksum of '{filename}' is {actual}, expected {expected}.")
+        self.filename = filename
+        self.algorithm = algorithm
+        self.expected = expected
+        self.actual = actual
+
+
+class EMDBInvalidMapError(EMDBError):
+    """Raised when a file is not a map in a supported MRC/CCP4 format."""
+    def __init__(self, filename: str, reason: str):
+        super().__init__(f"'{filename}' is not a readable MRC map: {reason}.")
+        self.filename = filename
+        self.reason = reason
+
+
+class EMDBMapMismatchError(EMDBError):
+    """Raised when the header of a map file disagrees with the map's metadata in the API."""
+    def __init__(self, filename: str, field: str, expected, actual):
+        super().__init__(f"{field} of '{filename}' is {actual} in the file header, expected {expected}.")
+        self.filename = filename
+        self.field = field
+        self.expected = expected
+        self.actual = actual
@@ -0,0 +1,371 @@
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple, TYPE_CHECKING
+
+from emdb.bulk import BulkResult, run_bulk
+from emdb.exceptions import EMDBFileNotFoundError, EMDBNotFoundError
+from emdb.scheduler import DownloadScheduler
+from emdb.utils import send_with_retry
+
+if TYPE_CHECKING:
+    from emdb.client import EMDB
+    from emdb.models.entry import EMDBEntry
+    from emdb.models.files import BaseFile
+
+MANIFEST_NAME = ".emdb-mirror.json"
+MANIFEST_VERSION = 1
+
+
+@dataclass
+class MirrorRecord:
+    """
+    What the manifest knows about one mirrored file.
+
+    ``size``, ``last_modified`` and ``etag`` describe the remote file when it was last
+    checked; ``local_size`` and ``local_mtime_ns`` the local copy written at that time.
+    """
+    emdb_id: str
+    url: str
+    size: Optional[int] = None
+    last_modified: Optional[str] = None
+    etag: Optional[str] = None
+    local_size: Optional[int] = None
+    local_mtime_ns: Optional[int] = None
+    checked: float = 0.0
+
+    def matches_local(self, path: str) -> bool:
+        """
+        Whether the file at ``path`` is still the copy this record was written for.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return stat.st_size == self.local_size and stat.st_mtime_ns == self.local_mtime_ns
+
+    def matches_remote(self, size: Optional[int], last_modified: Optional[str], etag: Optional[str]) -> bool:
+        """
+        Whether the remote file described by a ``HEAD`` response is the one this record was written for.
+        """
+        if etag and self.etag:
+            return etag == self.etag
+        return size == self.size and last_modified == self.last_modified
+
+
+class MirrorManifest:
+    """
+    The JSON file recording the mirrored entries and files, relative to the mirror root.
+
+    Entries map to the time their files were last checked (``checked``), the time their file
+    list was last fetched from the API (``listed``) and the relative paths of their files;
+    files map to a ``MirrorRecord``.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: The manifest file. It is created on ``save`` if missing.
+        """
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        self.files: Dict[str, MirrorRecord] = {}
+        self.load()
+
+    def load(self) -> None:
+        """
+        Read the manifest from disk; a missing or unreadable manifest starts empty.
+        """
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != MANIFEST_VERSION:
+            return
+        self.entries = data.get("entries", {})
+        self.files = {path: MirrorRecord(**record) for path, record in data.get("files", {}).items()}
+
+    def save(self) -> None:
+        """
+        Write the manifest atomically.
+        """
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({
+                "version": MANIFEST_VERSION,
+                "entries": self.entries,
+                "files": {path: asdict(record) for path, record in self.files.items()},
+            }, f)
+        os.replace(temp_path, self.path)
+
+    def __len__(self):
+        return len(self.files)
+
+    def __str__(self):
+        return f"<MirrorManifest {len(self.entries)} entries, {len(self.files)} files>"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+@dataclass
+class SyncReport:
+    """
+    Outcome of a mirror sync, as paths relative to the mirror root.
+    """
+    downloaded: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    errors: Dict[str, Exception] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        """
+        True if every entry and file was synced without errors.
+        """
+        return not self.errors
+
+    def __str__(self):
+        return (f"<SyncReport downloaded={len(self.downloaded)}, unchanged={len(self.unchanged)}, "
+                f"removed={len(self.removed)}, errors={len(self.errors)}>")
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class EMDBMirror:
+    """
+    Keeps a local directory in sync with the files of selected EMDB entries.
+
+    Each entry's deposited and metadata files are kept under ``<root>/<EMDB ID>/``. A sync
+    compares the remote size and ``Last-Modified`` (or ``ETag``), from concurrent ``HEAD``
+    requests, with a manifest of what was downloaded, and only downloads new or changed
+    files through a ``DownloadScheduler``. Local files that were modified or deleted are
+    downloaded again.
+
+    The API is only asked for an entry's file list (through the client's rate limiter) when
+    the entry is new to the mirror, when one of its files changed or disappeared, or when its
+    list is older than ``refresh_age``. Other entries are checked with ``HEAD`` requests on
+    the files recorded in the manifest, so a no-op sync of thousands of entries takes seconds.
+    Entries checked less than ``max_age`` seconds ago are trusted without contacting the
+    server at all, so repeated syncs only cost a ``stat`` per file.
+
+    Usage:
+        mirror = EMDBMirror("/data/emdb", client)
+        report = mirror.sync(["EMD-8117", "EMD-1234"], prune=True)
+        report = mirror.sync(ids, max_age=24 * 3600)  # skip entries checked within a day
+    """
+
+    def __init__(self, root: str, client: "EMDB", scheduler: Optional[DownloadScheduler] = None,
+                 max_workers: int = 4, head_workers: int = 16, metadata_files: bool = True):
+        """
+        :param root: The mirror directory; created if missing.
+        :param client: The client used to fetch entries and files.
+        :param scheduler: Optional scheduler to download on. Defaults to a new one for each sync.
+        :param max_workers: Number of files downloaded at once by the default scheduler.
+        :param head_workers: Number of concurrent ``HEAD`` requests when checking remote files.
+        :param metadata_files: Mirror the header XML/CIF files as well as the deposited files.
+        """
+        self.root = root
+        self.client = client
+        self.scheduler = scheduler
+        self.max_workers = max_workers
+        self.head_workers = head_workers
+        self.metadata_files = metadata_files
+        os.makedirs(root, exist_ok=True)
+        self.manifest = MirrorManifest(os.path.join(root, MANIFEST_NAME))
+
+    def local_path(self, relative_path: str) -> str:
+        """
+        Absolute path of a mirrored file given its path relative to the root.
+        """
+        return os.path.join(self.root, relative_path)
+
+    def entry_files(self, entry: "EMDBEntry") -> Dict[str, "BaseFile"]:
+        """
+        The files of an entry that are mirrored, by path relative to the root. With a decompressing
+        scheduler, ``.gz`` files are kept without the ``.gz`` suffix.
+        """
+        files = list(entry.deposited_files)
+        if self.metadata_files:
+            files += entry.metadata_files
+        decompress = self.scheduler is not None and self.scheduler.decompress
+        return {f"{entry.id}/{file.local_filename(decompress)}": file for file in files if file.filename}
+
+    def sync(self, emdb_ids: Iterable[str], prune: bool = False, max_age: float = 0.0,
+             refresh_age: float = 7 * 24 * 3600) -> SyncReport:
+        """
+        Bring the mirror of some entries up to date.
+
+        :param emdb_ids: The entries to sync.
+        :param prune: Delete local files withdrawn from their entry, and every file of entries
+            that no longer exist.
+        :param max_age: Trust entries whose files were all checked less than this many seconds ago
+            and are unmodified locally, without any request.
+        :param refresh_age: Fetch an entry's file list from the API again when it is older than this
+            many seconds, even if none of its files changed. Defaults to a week; files added to an
+            entry usually come with an updated header XML, which triggers a refresh sooner.
+        :return: A SyncReport. Errors for single entries or files are collected in it.
+        """
+        start = time.monotonic()
+        now = time.time()
+        report = SyncReport()
+        emdb_ids = list(dict.fromkeys(emdb_ids))
+
+        # Entries checked recently and intact on disk need no request at all
+        stale = []
+        for emdb_id in emdb_ids:
+            known = self.manifest.entries.get(emdb_id)
+            if known is not None and now - known["checked"] < max_age and all(
+                    path in self.manifest.files and self.manifest.files[path].matches_local(self.local_path(path))
+                    for path in known["files"]):
+                report.unchanged.extend(known["files"])
+            else:
+                stale.append(emdb_id)
+
+        # Entries listed recently are checked from the manifest; the others need their JSON
+        listed, refetch = [], []
+        for emdb_id in stale:
+            known = self.manifest.entries.get(emdb_id)
+            if known is not None and now - known.get("listed", 0.0) < refresh_age and all(
+                    path in self.manifest.files for path in known["files"]):
+                listed.append(emdb_id)
+            else:
+                refetch.append(emdb_id)
+        refetch += self._check_listed(listed, now, report)
+
+        files: Dict[str, "BaseFile"] = {}
+        for result in self.client.get_entries(refetch, max_workers=self.head_workers):
+            if result.ok:
+                entry_files = self.entry_files(result.value)
+                files.update(entry_files)
+                if prune:
+                    report.removed += self._remove(set(self.manifest.entries.get(result.emdb_id, {}).get("files", []))
+                                                   - set(entry_files))
+                self.manifest.entries[result.emdb_id] = {"checked": now, "listed": now,
+                                                         "files": sorted(entry_files)}
+            elif isinstance(result.error, EMDBNotFoundError) and prune:
+                report.removed += self._remove(self.manifest.entries.pop(result.emdb_id, {}).get("files", []))
+            else:
+                report.errors[result.emdb_id] = result.error
+
+        to_download = self._check_remote(files, now, report)
+        self._download(to_download, files, now, report)
+        self.manifest.save()
+        report.elapsed = time.monotonic() - start
+        return report
+
+    def _head(self, emdb_id: str, url: str) -> Tuple[Optional[int], Optional[str], Optional[str]]:
+        response = send_with_retry(self.client.session, url, method="HEAD", retry_policy=self.client.retry_policy,
+                                   timeout=self.client.timeout, allow_redirects=True)
+        response.close()
+        if response.status_code != 200:
+            raise EMDBFileNotFoundError(emdb_id, url.rsplit("/", 1)[-1])
+        try:
+            size = int(response.headers["Content-Length"])
+        except (KeyError, ValueError):
+            size = None
+        return size, response.headers.get("Last-Modified"), response.headers.get("ETag")
+
+    def _check_listed(self, emdb_ids: List[str], now: float, report: SyncReport) -> List[str]:
+        """
+        ``HEAD`` the recorded files of known entries and return the entries to fetch again from the
+        API, because one of their files changed remotely or locally, or is gone.
+        """
+        paths = [path for emdb_id in emdb_ids for path in self.manifest.entries[emdb_id]["files"]]
+        records = self.manifest.files
+        heads = {result.emdb_id: result for result in
+                 run_bulk(lambda path: self._head(records[path].emdb_id, records[path].url), paths, self.head_workers)}
+        refetch = []
+        for emdb_id in emdb_ids:
+            results = [(path, heads[path]) for path in self.manifest.entries[emdb_id]["files"]]
+            if any(self._changed(path, result) for path, result in results):
+                refetch.append(emdb_id)
+                continue
+            for path, result in results:
+                if result.ok:
+                    self.manifest.files[path].checked = now
+                    report.unchanged.append(path)
+                else:
+                    report.errors[path] = result.error
+            if all(result.ok for _, result in results):
+                self.manifest.entries[emdb_id]["checked"] = now
+        return refetch
+
+    def _changed(self, path: str, result: BulkResult) -> bool:
+        if not result.ok:
+            # A file gone from the server was withdrawn or renamed; other errors are reported as they are
+            return isinstance(result.error, EMDBFileNotFoundError)
+        record = self.manifest.files[path]
+        return not (record.matches_remote(*result.value) and record.matches_local(self.local_path(path)))
+
+    def _check_remote(self, files: Dict[str, "BaseFile"], now: float,
+                      report: SyncReport) -> Dict[str, Tuple[Optional[int], Optional[str], Optional[str]]]:
+        """
+        ``HEAD`` every file and return the ones to download, with their remote size, Last-Modified and ETag.
+        """
+        to_download = {}
+        paths = list(files)
+        for result in run_bulk(lambda path: self._head(files[path]._emdb_id, files[path].source_path), paths,
+                               self.head_workers):
+            path = result.emdb_id
+            if not result.ok:
+                report.errors[path] = result.error
+                continue
+            record = self.manifest.files.get(path)
+            if (record is not None and record.matches_remote(*result.value)
+                    and record.matches_local(self.local_path(path))):
+                record.checked = now
+                report.unchanged.append(path)
+            else:
+                to_download[path] = result.value
+        return to_download
+
+    def _download(self, to_download: Dict[str, Tuple[Optional[int], Optional[str], Optional[str]]],
+                  files: Dict[str, "BaseFile"], now: float, report: SyncReport) -> None:
+        if not to_download:
+            return
+        scheduler = self.scheduler or DownloadScheduler(max_workers=self.max_workers)
+        try:
+            for path in to_download:
+                os.makedirs(os.path.dirname(self.local_path(path)), exist_ok=True)
+            if scheduler.check_space:
+                scheduler.preflight([files[path] for path in to_download], self.root)
+            futures = {path: scheduler.submit(files[path], self.local_path(path)) for path in to_download}
+            for path, future in futures.items():
+                result = future.result()
+                if not result.ok:
+                    report.errors[path] = result.error
+                    continue
+                size, last_modified, etag = to_download[path]
+                stat = os.stat(result.output_path)
+                self.manifest.files[path] = MirrorRecord(
+                    emdb_id=path.split("/", 1)[0], url=files[path].source_path, size=size,
+                    last_modified=last_modified, etag=etag, local_size=stat.st_size,
+                    local_mtime_ns=stat.st_mtime_ns, checked=now,
+                )
+                report.downloaded.append(path)
+        finally:
+            if self.scheduler is None:
+                scheduler.close()
+
+    def _remove(self, paths: Iterable[str]) -> List[str]:
+        removed = []
+        for path in sorted(paths):
+            local_path = self.local_path(path)
+            if os.path.exists(local_path):
+                os.remove(local_path)
+            self.manifest.files.pop(path, None)
+            removed.append(path)
+            directory = os.path.dirname(local_path)
+            if os.path.isdir(directory) and not os.listdir(directory):
+                os.rmdir(directory)
+        return removed
+
+    def __str__(self):
+        return f"<EMDBMirror {self.root} {len(self.manifest.entries)} entries>"
+
+    def __repr__(self):
+        return self.__str__()
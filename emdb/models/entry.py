@@ -4,6 +4,7 @@ from pydantic import BaseModel, PrivateAttr
 
 from emdb.models.files import PrimaryMapFile, HalfMapFile, AdditionalMapFile, MaskFile, FigureFile, \
     ModelCifFile, EMDBMetadataXMLFile, EMDBMetadataCIFFile
+from emdb.scheduler import AggregateProgressCallback, DownloadResult, DownloadScheduler
 
 if TYPE_CHECKING:
     from emdb.client import EMDB
@@ -139,6 +140,8 @@ class EMDBEntry(BaseModel):
             figure=figure,
         )
         obj._client = client
+        for file in obj.deposited_files + obj.metadata_files:
+            file._client = client
         return obj
 
     def get_validation(self) -> Optional["EMDBValidation"]:
@@ -182,15 +185,27 @@ class EMDBEntry(BaseModel):
             files.extend(self.pdb_models)
         return files
 
-    def download_all_files(self, directory: str) -> None:
+    def download_all_files(self, directory: str, scheduler: Optional[DownloadScheduler] = None,
+                           max_workers: int = 4, progress: Optional[AggregateProgressCallback] = None
+                           ) -> List[DownloadResult]:
         """
         Download all files associated with this EMDB entry to the specified directory.
 
-        :param directory: The directory where files will be downloaded.
+        Files are downloaded concurrently by a ``DownloadScheduler``. Pass a shared scheduler to
+        apply its worker pool, per-host limits and bandwidth cap across several calls.
+
+        :param directory: The directory where files will be downloaded; created if missing.
+        :param scheduler: Optional scheduler to run the downloads on. Defaults to a new one.
+        :param max_workers: Number of files downloaded at once by the default scheduler.
+        :param progress: Optional callback receiving the aggregate ``DownloadProgress`` of the
+            default scheduler.
+        :return: A list of DownloadResult in the order of ``deposited_files``, with per-file errors.
+        :raises EMDBInsufficientSpaceError: If the files do not fit in the free disk space.
         """
-        for file in self.deposited_files:
-            print(f"Downloading file: {file.filename}")
-            file.download(directory)
+        if scheduler is not None:
+            return scheduler.download(self.deposited_files, directory)
+        with DownloadScheduler(max_workers=max_workers, progress=progress) as scheduler:
+            return scheduler.download(self.deposited_files, directory)
 
     def __str__(self):
         return f"<EMDBEntry id={self.id}, method={self.method}, resolution={self.resolution}>"
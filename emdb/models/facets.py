@@ -0,0 +1,121 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from pydantic import BaseModel
+
+# Default facet fields and ranges of EMDB.facets: method, resolution bins and release year
+DEFAULT_FACET_FIELDS = ("structure_determination_method",)
+DEFAULT_FACET_RANGES = {
+    "resolution": (0, 20, 1),
+    "release_date": ("NOW/YEAR-20YEARS", "NOW/YEAR+1YEAR", "+1YEAR"),
+}
+
+
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+    def __str__(self):
+        return f"<FacetCount {self.value}: {self.count}>"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class FacetRange(BaseModel):
+    start: Union[float, str]
+    end: Union[float, str]
+    gap: Union[float, str]
+    counts: List[FacetCount]
+    before: Optional[int] = None
+    after: Optional[int] = None
+
+
+class EMDBFacets(BaseModel):
+    """
+    Number of hits of a search and their distribution over some fields, without the hits themselves.
+
+    Usage:
+        facets = client.facets("HIV")
+        facets.num_found
+        facets.counts("structure_determination_method")  # {"singleParticle": 1234, ...}
+        facets.ranges["resolution"].counts
+    """
+    num_found: int
+    fields: Dict[str, List[FacetCount]] = {}
+    ranges: Dict[str, FacetRange] = {}
+
+    @staticmethod
+    def request_params(fields: Iterable[str] = DEFAULT_FACET_FIELDS,
+                       ranges: Optional[Dict[str, Tuple[Any, Any, Any]]] = None,
+                       limit: int = 100, min_count: int = 1) -> Dict[str, Any]:
+        """
+        Solr parameters asking for facet counts and no hits.
+
+        :param fields: Fields to count the distinct values of.
+        :param ranges: ``{field: (start, end, gap)}`` of fields to count in bins.
+        :param limit: Maximum number of values returned per field; -1 for all of them.
+        :param min_count: Leave out values with fewer hits.
+        :return: The query parameters of the search request.
+        """
+        params = {
+            "rows": 0,
+            "wt": "json",
+            "facet": "true",
+            "facet.limit": limit,
+            "facet.mincount": min_count,
+        }
+        fields = list(fields)
+        if fields:
+            params["facet.field"] = fields
+        if ranges:
+            params["facet.range"] = list(ranges)
+            for field, (start, end, gap) in ranges.items():
+                params[f"f.{field}.facet.range.start"] = start
+                params[f"f.{field}.facet.range.end"] = end
+                params[f"f.{field}.facet.range.gap"] = gap
+                params[f"f.{field}.facet.range.other"] = ["before", "after"]
+        return params
+
+    @staticmethod
+    def _counts(flat: List[Any]) -> List[FacetCount]:
+        # Solr returns facet counts as a flat [value, count, value, count, ...] list
+        return [FacetCount(value=str(value), count=count) for value, count in zip(flat[::2], flat[1::2])]
+
+    @classmethod
+    def from_api(cls, data: dict) -> "EMDBFacets":
+        facet_counts = data.get("facet_counts", {})
+        ranges = {}
+        for field, facet in facet_counts.get("facet_ranges", {}).items():
+            ranges[field] = FacetRange(
+                start=facet["start"],
+                end=facet["end"],
+                gap=facet["gap"],
+                counts=cls._counts(facet.get("counts", [])),
+                before=facet.get("before"),
+                after=facet.get("after"),
+            )
+        return cls(
+            num_found=data["response"]["numFound"],
+            fields={field: cls._counts(flat) for field, flat in facet_counts.get("facet_fields", {}).items()},
+            ranges=ranges,
+        )
+
+    def counts(self, field: str) -> Dict[str, int]:
+        """
+        Counts of a field or range facet as a ``{value: count}`` dictionary.
+
+        :param field: The facet field.
+        :return: The number of hits per value, or per bin start for range facets.
+        :raises KeyError: If the field was not faceted.
+        """
+        if field in self.fields:
+            counts = self.fields[field]
+        else:
+            counts = self.ranges[field].counts
+        return {facet.value: facet.count for facet in counts}
+
+    def __str__(self):
+        return f"<EMDBFacets num_found={self.num_found} fields={list(self.fields) + list(self.ranges)}>"
+
+    def __repr__(self):
+        return self.__str__()
@@ -1,10 +1,21 @@
+import os
 from abc import abstractmethod, ABC
-from typing import Optional, Dict
+from typing import BinaryIO, Optional, Dict, TYPE_CHECKING
 
 import requests
 from pydantic import BaseModel, PrivateAttr
 
-from emdb.exceptions import EMDBFileNotFoundError
+from emdb.download import DEFAULT_CHUNK_SIZE, ProgressCallback, download_file, download_segmented, \
+    download_single_pass, fetch_checksums
+from emdb.exceptions import EMDBError
+from emdb.mrc import MRCMap, map_file_size, open_map
+from emdb.remote import DEFAULT_BUFFER_SIZE, open_remote
+from emdb.retry import RetryPolicy
+from emdb.utils import DEFAULT_TIMEOUT
+
+if TYPE_CHECKING:
+    from emdb.client import EMDB
+    from emdb.store import BlobStore
 
 
 class BaseFile(BaseModel, ABC):
@@ -16,10 +27,13 @@ class BaseFile(BaseModel, ABC):
     size_kbytes: Optional[float] = None
 
     _emdb_id: Optional[str] = PrivateAttr(default=None)
+    _client: Optional["EMDB"] = PrivateAttr(default=None)
 
     _BASE_FTP_URL: str = PrivateAttr("https://ftp.ebi.ac.uk/pub/databases/emdb/structures")
     _BASE_PDB_URL: str = PrivateAttr("https://www.ebi.ac.uk/pdbe/entry-files/download")
     _BASE_FIGURES_URL: str = PrivateAttr("https://www.ebi.ac.uk/emdb/images/entry")
+    # Name of the md5sum-format checksum listing in an entry's FTP directory
+    _CHECKSUM_LISTING: str = PrivateAttr("md5sum.txt")
 
     @property
     @abstractmethod
@@ -44,24 +58,208 @@ class BaseFile(BaseModel, ABC):
             format= data.get("format", None)
         )
 
-    def download(self, output_path: str):
+    def _http(self, session: Optional[requests.Session] = None):
+        """
+        Pick the HTTP session used to fetch this file: an explicit session first,
+        then the pooled session of the owning client, then a one-off connection.
+        """
+        if session is not None:
+            return session
+        if self._client is not None:
+            return self._client.session
+        return requests
+
+    @property
+    def checksum_listing_url(self) -> Optional[str]:
+        """
+        URL of the checksum listing, in ``md5sum`` format, of the entry's FTP directory, or None
+        for files served from elsewhere, such as figures and PDBe models.
+        """
+        entry_directory = f"{self._BASE_FTP_URL}/{self._emdb_id}/"
+        if not self.source_path.startswith(entry_directory):
+            return None
+        return entry_directory + self._CHECKSUM_LISTING
+
+    def local_filename(self, decompress: bool = False) -> str:
+        """
+        Name of the file once downloaded: ``filename``, without ``.gz`` if it is decompressed.
+        """
+        if decompress and self.filename.endswith(".gz"):
+            return self.filename[:-len(".gz")]
+        return self.filename
+
+    def disk_size(self, decompress: bool = False) -> Optional[int]:
+        """
+        Number of bytes the file takes once downloaded, from ``size_kbytes``.
+
+        :param decompress: Whether the file is gunzipped while downloading. Only maps can tell
+            their decompressed size; other ``.gz`` files give their compressed size.
+        :return: The size in bytes, or None if unknown.
+        """
+        return int(self.size_kbytes * 1024) if self.size_kbytes else None
+
+    def expected_checksum(self, checksum_url: Optional[str] = None, session: Optional[requests.Session] = None,
+                          retry_policy: Optional[RetryPolicy] = None, missing_ok: bool = False) -> Optional[str]:
+        """
+        Look up the published checksum of this file.
+
+        :param checksum_url: URL of the checksum listing. Defaults to ``checksum_listing_url``.
+        :param session: Optional requests.Session. Defaults to the pooled session of the client.
+        :param retry_policy: Optional retry policy. Defaults to the policy of the client.
+        :param missing_ok: Return None, instead of raising, for files without a listing or not in it.
+        :return: The MD5 or SHA-256 hex digest listed for ``filename``.
+        :raises EMDBNetworkError: If the listing could not be downloaded.
+        :raises EMDBError: If there is no listing for this file, or it has no checksum for it.
+        """
+        url = checksum_url or self.checksum_listing_url
+        if url is None:
+            if missing_ok:
+                return None
+            raise EMDBError(f"No checksum listing for '{self.filename}', served from {self.source_path}")
+        timeout = self._client.timeout if self._client is not None else DEFAULT_TIMEOUT
+        if retry_policy is None and self._client is not None:
+            retry_policy = self._client.retry_policy
+        checksums = fetch_checksums(url, http=self._http(session), timeout=timeout, retry_policy=retry_policy)
+        if self.filename not in checksums and missing_ok:
+            return None
+        try:
+            return checksums[self.filename]
+        except KeyError:
+            raise EMDBError(f"No checksum for '{self.filename}' in {url}")
+
+    def download(self, output_path: str, session: Optional[requests.Session] = None,
+                 retry_policy: Optional[RetryPolicy] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 progress: Optional[ProgressCallback] = None, resume: bool = True,
+                 segmented: bool = False, segments: Optional[int] = None, decompress: bool = False,
+                 verify: bool = False, checksum: Optional[str] = None, checksum_url: Optional[str] = None,
+                 store: Optional["BlobStore"] = None) -> str:
         """
         Download the file from the source path to the specified output path.
 
+        The file is streamed to disk in chunks of ``chunk_size`` bytes, so memory use does
+        not grow with the file size. It is written to ``<output_path>.part`` and renamed
+        once complete; a failed download leaves no file at ``output_path``.
+
+        If the connection drops, the download continues from the last byte received with an
+        HTTP ``Range`` request. With ``resume``, the ``.part`` file is kept when the download
+        fails and the next call for the same path picks it up, unless the file changed on the
+        server. Servers that do not honor ranges make the download start over.
+
+        With ``segmented``, large files are split into byte ranges fetched concurrently over the
+        client's pooled connections and written at their offsets into a preallocated file. The
+        number of segments follows ``size_kbytes`` and small files use a single stream.
+
+        With ``decompress``, ``verify`` or ``checksum``, the file is downloaded in a single pass:
+        gunzipped into the output as it arrives and checked against its MD5/SHA-256 checksum,
+        computed over the same chunks. These downloads always start from byte zero.
+
+        With ``store``, the file is downloaded into a shared ``BlobStore`` the first time and
+        ``output_path`` is a link to the stored copy.
+
         :param output_path: The local path where the file should be saved.
+        :param session: Optional requests.Session to download with. Defaults to the
+            pooled session of the client that created this file.
+        :param retry_policy: Optional retry policy. Defaults to the policy of the client
+            that created this file.
+        :param chunk_size: Number of bytes read and written at a time.
+        :param progress: Optional callback receiving ``(bytes_written, total_bytes)`` as the
+            download proceeds; ``total_bytes`` is None if the size is unknown.
+        :param resume: Resume from, and keep on failure, a partial ``<output_path>.part``.
+        :param segmented: Download large files as concurrent byte ranges.
+        :param segments: Number of concurrent ranges of a segmented download. Defaults to one
+            per 8 MiB, at most 8.
+        :param decompress: Gunzip a ``.gz`` file while downloading it. A directory output path
+            gets the filename without ``.gz``. Other files are downloaded unchanged.
+        :param verify: Check the file against its checksum in the entry's checksum listing.
+        :param checksum: Expected MD5 or SHA-256 hex digest of the file as published, instead of
+            looking it up.
+        :param checksum_url: URL of the checksum listing used by ``verify``. Defaults to
+            ``checksum_listing_url``.
+        :param store: Optional ``BlobStore`` the file is downloaded into, once, and linked from.
+        :return: The path of the downloaded file.
+        :raises EMDBFileNotFoundError: If the file is not available.
+        :raises EMDBNetworkError: If the transfer failed.
+        :raises EMDBChecksumError: If the file does not match its checksum.
         """
         # If output_path is a directory, append the filename
         if output_path.endswith('/'):
-            output_path += self.filename
+            output_path += self.local_filename(decompress)
 
-        response = requests.get(self.source_path)
-        print("Path",self.source_path)
-        if response.status_code == 200:
-            with open(output_path, 'wb') as f:
-                f.write(response.content)
-            print(f"Downloaded {self.filename} to {output_path}")
-        else:
-            raise EMDBFileNotFoundError(self._emdb_id, self.filename)
+        self._download(output_path, session=session, retry_policy=retry_policy, chunk_size=chunk_size,
+                       progress=progress, resume=resume, segmented=segmented, segments=segments,
+                       decompress=decompress, verify=verify, checksum=checksum, checksum_url=checksum_url,
+                       store=store)
+        print(f"Downloaded {self.filename} to {output_path}")
+        return output_path
+
+    def open(self, decompress: Optional[bool] = None, session: Optional[requests.Session] = None,
+             retry_policy: Optional[RetryPolicy] = None, buffer_size: int = DEFAULT_BUFFER_SIZE) -> BinaryIO:
+        """
+        Open the file for reading straight from the server, without writing it to disk.
+
+        Data is requested as it is read, ``buffer_size`` bytes at a time, so reading the header of
+        a large map only transfers the start of it. The file object is seekable if the server
+        supports byte ranges; seeking then continues from the new position with a ``Range``
+        request. ``.gz`` files are gunzipped transparently, and seeking in them is emulated by
+        decompressing up to the new position.
+
+        Usage:
+            with entry.primary_map.open() as f:
+                header = f.read(1024)
+
+            with io.TextIOWrapper(entry.metadata_files[0].open(), encoding="utf-8") as f:
+                xml = ElementTree.parse(f)
+
+        :param decompress: Gunzip the file while it is read. Defaults to True for ``.gz`` files.
+        :param session: Optional requests.Session. Defaults to the pooled session of the client.
+        :param retry_policy: Optional retry policy. Defaults to the policy of the client.
+        :param buffer_size: Number of bytes requested from the network at a time.
+        :return: A read-only binary file object. Close it, or use it as a context manager, to
+            release the connection.
+        :raises EMDBFileNotFoundError: If the file is not available, on the first read.
+        """
+        timeout = self._client.timeout if self._client is not None else DEFAULT_TIMEOUT
+        if retry_policy is None and self._client is not None:
+            retry_policy = self._client.retry_policy
+        return open_remote(self, http=self._http(session), timeout=timeout, retry_policy=retry_policy,
+                           decompress=decompress, buffer_size=buffer_size)
+
+    def _download(self, output_path: str, session: Optional[requests.Session] = None,
+                  retry_policy: Optional[RetryPolicy] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                  progress: Optional[ProgressCallback] = None, resume: bool = True,
+                  segmented: bool = False, segments: Optional[int] = None, allocate: bool = False,
+                  decompress: bool = False, verify: bool = False, checksum: Optional[str] = None,
+                  checksum_url: Optional[str] = None, store: Optional["BlobStore"] = None) -> int:
+        """
+        Download the file to ``output_path`` without printing; see ``download``.
+
+        :param allocate: Reserve the file's size on disk before writing it.
+        :return: The size of the downloaded file in bytes.
+        """
+        # Only .gz files are gunzipped; others are downloaded as they are, like local_filename names them
+        decompress = decompress and self.filename.endswith(".gz")
+        if store is not None:
+            store.fetch(self, output_path, session=session, retry_policy=retry_policy, chunk_size=chunk_size,
+                        progress=progress, resume=resume, segmented=segmented, segments=segments,
+                        allocate=allocate, decompress=decompress, verify=verify, checksum=checksum,
+                        checksum_url=checksum_url)
+            return os.path.getsize(output_path)
+        timeout = self._client.timeout if self._client is not None else DEFAULT_TIMEOUT
+        if retry_policy is None and self._client is not None:
+            retry_policy = self._client.retry_policy
+        if decompress or verify or checksum:
+            if verify and checksum is None:
+                checksum = self.expected_checksum(checksum_url, session=session, retry_policy=retry_policy)
+            download_single_pass(self, output_path, http=self._http(session), timeout=timeout,
+                                 retry_policy=retry_policy, chunk_size=chunk_size, progress=progress,
+                                 decompress=decompress, checksum=checksum)
+            return os.path.getsize(output_path)
+        if segmented:
+            return download_segmented(self, output_path, http=self._http(session), timeout=timeout,
+                                      retry_policy=retry_policy, segments=segments, chunk_size=chunk_size,
+                                      progress=progress, resume=resume, allocate=allocate)
+        return download_file(self, output_path, http=self._http(session), timeout=timeout, retry_policy=retry_policy,
+                             chunk_size=chunk_size, progress=progress, resume=resume, allocate=allocate)
 
     def __str__(self):
         return f"<BaseFile filename={self.filename}, size_kbytes={self.size_kbytes}, format={self.format}>"
@@ -124,6 +322,43 @@ class BaseMapFile(BaseFile):
             details=data.get("details", None),
         )
 
+    def disk_size(self, decompress: bool = False) -> Optional[int]:
+        """
+        Number of bytes the file takes once downloaded. A gunzipped map is estimated from its
+        ``dimensions`` and ``data_type``, as it is often several times its ``size_kbytes``.
+
+        :param decompress: Whether the file is gunzipped while downloading.
+        :return: The size in bytes, or None if unknown.
+        """
+        if decompress and self.filename.endswith(".gz"):
+            estimate = map_file_size(self)
+            if estimate is not None:
+                return estimate
+        return super().disk_size(decompress)
+
+    def open_map(self, path: str, strict: bool = True, mode: str = "r") -> "MRCMap":
+        """
+        Open a downloaded copy of this map with its voxels memory-mapped as a NumPy array.
+
+        The MRC header is checked against this model's ``dimensions``, ``origin``, ``spacing``,
+        ``cell``, ``data_type`` and ``axis_order``. The array is indexed ``[z, y, x]`` and nothing
+        is read from disk until it is sliced, so sub-volumes of maps larger than memory can be used.
+
+        Usage:
+            path = entry.primary_map.download("maps/", decompress=True)
+            with entry.primary_map.open_map(path) as volume:
+                box = np.array(volume.data[:64, :64, :64])
+
+        :param path: Path of the downloaded map. Gzipped maps must be downloaded with ``decompress=True``.
+        :param strict: Raise if the header disagrees with this model; otherwise the differences are
+            kept in ``MRCMap.mismatches``.
+        :param mode: ``"r"``, ``"r+"`` or ``"c"``, as for ``numpy.memmap``.
+        :return: The opened map.
+        :raises EMDBInvalidMapError: If the file cannot be memory-mapped as an MRC map.
+        :raises EMDBMapMismatchError: With ``strict``, if the header disagrees with this model.
+        """
+        return open_map(path, metadata=self, strict=strict, mode=mode)
+
     def __str__(self):
         return f"<BaseMapFile filename={self.filename}, size_kbytes={self.size_kbytes}, format={self.format}, data_type={self.data_type}>"
 
@@ -1,4 +1,4 @@
-from typing import Optional, TYPE_CHECKING
+from typing import Any, Dict, Optional, TYPE_CHECKING
 from emdb.models.entry import EMDBEntry
 
 if TYPE_CHECKING:
@@ -6,18 +6,40 @@ if TYPE_CHECKING:
 
 
 class LazyEMDBEntry:
-    def __init__(self, emdb_id: str, client: "EMDB"):
+    __slots__ = ("_id", "_client", "_entry", "_fields", "_registry", "__weakref__")
+
+    def __init__(self, emdb_id: str, client: "EMDB", fields: Optional[Dict[str, Any]] = None,
+                 registry: Optional[Dict[str, "LazyEMDBEntry"]] = None):
+        """
+        :param emdb_id: The EMDB ID of the entry.
+        :param client: The EMDB client used to load the entry.
+        :param fields: Attribute values already known from the search, e.g. ``{"method": ..., "resolution": ...}``.
+            Reading them does not load the entry.
+        :param registry: Optional dictionary the entry adds itself to, under its EMDB ID, once loaded.
+        """
         self._id = emdb_id
         self._client = client
         self._entry: Optional[EMDBEntry] = None
+        self._fields = fields or {}
+        self._registry = registry
 
     def _load(self):
         if self._entry is None:
             self._entry = self._client.get_entry(self._id)
+            if self._registry is not None:
+                self._registry[self._id] = self
 
     def __getattr__(self, name):
+        if self._entry is None and name in self._fields:
+            return self._fields[name]
         self._load()
-        return getattr(self._entry, name)
+        try:
+            return getattr(self._entry, name)
+        except AttributeError:
+            # Search fields such as title have no EMDBEntry attribute; keep answering them once loaded
+            if name in self._fields:
+                return self._fields[name]
+            raise
 
     def __str__(self):
         return f"<LazyEMDBEntry {self._id}>"
@@ -1,39 +1,444 @@
-from typing import List, TYPE_CHECKING, Optional
+import math
+import re
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from typing import Any, Dict, List, TYPE_CHECKING, Optional, Iterator, Iterable, Tuple, Union
 
+import numpy as np
+import pandas
+from pandas.api.types import union_categoricals
 from pydantic import BaseModel, PrivateAttr
 
 from emdb.models.lazy_entry import LazyEMDBEntry
+from emdb.scheduler import AggregateProgressCallback, DownloadResult, DownloadScheduler
 
 if TYPE_CHECKING:
     from emdb.client import EMDB
+    from emdb.models.entry import EMDBEntry
+
+_EMDB_ID = re.compile(r"EMD-(\d+)")
+
+# Column types of known search fields; other fields are kept as strings
+SEARCH_FIELD_DTYPES = {
+    "emdb_id": str,
+    "structure_determination_method": "category",
+    "resolution": "float32",
+}
+
+# Attribute of LazyEMDBEntry/EMDBEntry under which a projected search field is available
+FIELD_ATTRIBUTES = {
+    "structure_determination_method": "method",
+}
+
+
+def search_fields(fields: Union[str, Iterable[str], None]) -> str:
+    """
+    The ``fl`` parameter of a search returning the EMDB ID and ``fields``.
+
+    :param fields: Extra search fields, as a list or a comma-separated string.
+    :return: Comma-separated field names, starting with ``emdb_id``.
+    """
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    names = ["emdb_id"]
+    for field in fields or ():
+        field = field.strip()
+        if field and field not in names:
+            names.append(field)
+    return ",".join(names)
+
+
+def accession_number(emdb_id: Union[str, int, LazyEMDBEntry]) -> int:
+    """
+    Numeric part of an EMDB ID, e.g. 1234 for ``"EMD-1234"``.
+    """
+    if isinstance(emdb_id, LazyEMDBEntry):
+        emdb_id = emdb_id._id
+    if isinstance(emdb_id, str):
+        return int(emdb_id.rsplit("-", 1)[-1])
+    return int(emdb_id)
+
+
+def format_emdb_id(number: int) -> str:
+    """
+    EMDB ID of an accession number, e.g. ``"EMD-1234"`` for 1234.
+    """
+    return f"EMD-{number:04d}"
+
+
+def _parse_accessions(data: str) -> np.ndarray:
+    # Skip the header line; the body is one EMDB ID per line
+    body = data.partition("\n")[2]
+    try:
+        return np.array(body.replace("EMD-", " ").split(), dtype=np.int32)
+    except ValueError:
+        # Quoted values or extra columns: pick the IDs out of the text instead
+        return np.array(_EMDB_ID.findall(body), dtype=np.int32)
+
+
+def _typed_frame(frame: "pandas.DataFrame") -> "pandas.DataFrame":
+    # Convert the string columns of known fields to their compact types; empty values become missing
+    for field, dtype in SEARCH_FIELD_DTYPES.items():
+        if field not in frame.columns or dtype is str:
+            continue
+        if dtype == "category":
+            frame[field] = frame[field].mask(frame[field] == "").astype("category")
+        else:
+            frame[field] = pandas.to_numeric(frame[field], errors="coerce").astype(dtype)
+    return frame
+
+
+def _column_value(column, index: int) -> Any:
+    # Python value of one cell of a projected column; missing values are None
+    value = column[index]
+    if isinstance(value, np.floating):
+        # str() gives the shortest decimal that round-trips, e.g. 3.2 rather than 3.2000000476837
+        return None if math.isnan(value) else float(str(value))
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def _concat_columns(first, second):
+    if isinstance(first, pandas.Categorical) and isinstance(second, pandas.Categorical):
+        return union_categoricals([first, second])
+    return np.concatenate([np.asarray(first), np.asarray(second)])
+
+
+def _member_mask(values: np.ndarray, sorted_ids: np.ndarray) -> np.ndarray:
+    # Vectorized membership of every value in a sorted array
+    if len(sorted_ids) == 0:
+        return np.zeros(len(values), dtype=bool)
+    low, high = int(sorted_ids[0]), int(sorted_ids[-1])
+    if high - low <= 8 * (len(values) + len(sorted_ids)) + 65536:
+        # Accession numbers are dense, so a bitmap over their range is small and needs no search
+        bitmap = np.zeros(high - low + 1, dtype=bool)
+        bitmap[sorted_ids - low] = True
+        inside = (values >= low) & (values <= high)
+        mask = np.zeros(len(values), dtype=bool)
+        mask[inside] = bitmap[values[inside] - low]
+        return mask
+    positions = np.minimum(np.searchsorted(sorted_ids, values), len(sorted_ids) - 1)
+    return sorted_ids[positions] == values
 
 
 class EMDBSearchResults(BaseModel):
-    entries: List[LazyEMDBEntry]
+    """
+    The hits of a search, in result order.
+
+    Hits are stored as a compact array of EMDB accession numbers. A :class:`LazyEMDBEntry`
+    is only created when a hit is indexed or iterated over, and the same view is returned
+    for a hit as long as it is referenced or its entry is loaded. ``len``, slicing and
+    membership tests work on the array and never load entries.
+
+    Search fields requested with the hits (see ``EMDB.search(fields=...)``) are stored as
+    columns next to the accession numbers, and lazy entries answer them, and ``id``,
+    without loading the full entry.
+
+    Results of several searches can be combined with ``&`` (hits in both), ``|`` (hits in
+    either) and ``-`` (hits in the first only). These work on the sorted accession numbers,
+    keep the order of the left-hand results and do not load any entry.
+
+    Usage:
+        results = client.search("HIV")
+        len(results)
+        "EMD-1234" in results
+        first_page = results[:50]
+        single_particle_hiv = results & client.search("structure_determination_method:singleParticle")
+    """
+    _ids: np.ndarray = PrivateAttr(default_factory=lambda: np.empty(0, dtype=np.int32))
+    _columns: Dict[str, Any] = PrivateAttr(default_factory=dict)
+    _sorted_ids: Optional[np.ndarray] = PrivateAttr(default=None)
     _client: Optional["EMDB"] = PrivateAttr(default=None)
+    # Shared between the results and their slices, so a hit has one view at a time
+    _views: weakref.WeakValueDictionary = PrivateAttr(default_factory=weakref.WeakValueDictionary)
+    # Views whose entry is loaded, keyed by EMDB ID, so the loaded entry outlives the caller's reference
+    _materialized: Dict[str, LazyEMDBEntry] = PrivateAttr(default_factory=dict)
 
     class Config:
         arbitrary_types_allowed = True
 
     @classmethod
     def from_api(cls, data: str, client: "EMDB") -> "EMDBSearchResults":
-        lines = data.strip().split("\n")
-        if len(lines) < 2:
-            return cls(_entries=[], _client=client)
-        # Skip the header line and parse the rest
-        emdb_ids = lines[1:]
-
-        obj = cls(
-            entries=[LazyEMDBEntry(emdb_id, client) for emdb_id in emdb_ids]
-        )
+        header = data.partition("\n")[0].strip()
+        if header in ("", "emdb_id"):
+            return cls._from_array(_parse_accessions(data), client)
+        frame = pandas.read_csv(StringIO(data), dtype=str, keep_default_na=False)
+        return cls._from_frame(_typed_frame(frame), client)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, str]], client: "EMDB") -> "EMDBSearchResults":
+        """
+        Create an EMDBSearchResults instance from search rows, e.g. those of ``EMDB.iter_search``.
+
+        :param rows: Dictionaries of search field to string value, with at least ``emdb_id``.
+        :param client: The EMDB client used to load the entries.
+        :return: An instance of EMDBSearchResults.
+        """
+        frame = pandas.DataFrame.from_records(list(rows))
+        if frame.empty:
+            return cls._from_array(np.empty(0, dtype=np.int32), client)
+        return cls._from_frame(_typed_frame(frame), client)
+
+    @classmethod
+    def _from_frame(cls, frame: "pandas.DataFrame", client: "EMDB") -> "EMDBSearchResults":
+        ids = frame["emdb_id"].astype(str).str.rsplit("-", n=1).str[-1].astype(np.int32).to_numpy()
+        obj = cls._from_array(ids, client)
+        for field in frame.columns:
+            if field != "emdb_id":
+                series = frame[field]
+                obj._columns[field] = series.array if isinstance(series.dtype, pandas.CategoricalDtype) \
+                    else series.to_numpy()
+        return obj
+
+    @classmethod
+    def from_ids(cls, emdb_ids: Iterable[str], client: "EMDB") -> "EMDBSearchResults":
+        """
+        Create an EMDBSearchResults instance from a sequence of EMDB IDs.
+
+        :param emdb_ids: The EMDB IDs of the hits, in result order.
+        :param client: The EMDB client used to load the entries.
+        :return: An instance of EMDBSearchResults.
+        """
+        return cls._from_array(np.fromiter(map(accession_number, emdb_ids), dtype=np.int32), client)
+
+    @classmethod
+    def _from_array(cls, ids: np.ndarray, client: "EMDB",
+                    parent: Optional["EMDBSearchResults"] = None,
+                    columns: Optional[Dict[str, Any]] = None) -> "EMDBSearchResults":
+        obj = cls()
+        obj._ids = ids
         obj._client = client
+        obj._columns = columns or {}
+        if parent is not None:
+            obj._views = parent._views
+            obj._materialized = parent._materialized
         return obj
 
-    def __iter__(self):
-        return iter(self.entries)
+    @property
+    def fields(self) -> Tuple[str, ...]:
+        """
+        The search fields stored with the hits, besides the EMDB ID.
+        """
+        return tuple(self._columns)
+
+    def column(self, field: str) -> Union[np.ndarray, "pandas.Categorical"]:
+        """
+        The values of a projected search field for every hit, in result order.
+
+        Usage:
+            results = client.search("HIV", fields=["resolution"])
+            high_resolution = results[results.column("resolution") < 3]
+
+        :param field: A field requested with the search, e.g. ``"resolution"``.
+        :return: A numpy array, or a pandas Categorical for categorical fields.
+        :raises KeyError: If the field was not requested with the search.
+        """
+        return self._columns[field]
+
+    @property
+    def accessions(self) -> np.ndarray:
+        """
+        The accession numbers of the hits in result order, as a read-only array.
+        """
+        ids = self._ids.view()
+        ids.flags.writeable = False
+        return ids
+
+    @property
+    def entries(self) -> List[LazyEMDBEntry]:
+        """
+        A lazy entry for every hit. Prefer iterating over or indexing the results,
+        which only create the entries actually used.
+        """
+        return list(self)
+
+    def _view(self, number: int, position: int) -> LazyEMDBEntry:
+        view = self._views.get(number)
+        if view is None:
+            emdb_id = format_emdb_id(number)
+            fields = {FIELD_ATTRIBUTES.get(field, field): _column_value(column, position)
+                      for field, column in self._columns.items()}
+            fields["id"] = emdb_id
+            view = LazyEMDBEntry(emdb_id, self._client, fields, registry=self._materialized)
+            self._views[number] = view
+        return view
+
+    def _sorted(self) -> np.ndarray:
+        if self._sorted_ids is None:
+            self._sorted_ids = np.sort(self._ids)
+        return self._sorted_ids
+
+    def _derive(self, index) -> "EMDBSearchResults":
+        columns = {field: column[index] for field, column in self._columns.items()}
+        return self._from_array(self._ids[index], self._client, parent=self, columns=columns)
+
+    def isin(self, emdb_ids: Iterable[Union[str, int]]) -> np.ndarray:
+        """
+        Test every hit for membership in a collection of IDs.
+
+        Usage:
+            mask = results.isin(["EMD-1234", "EMD-5678"])
+            selected = results[mask]
+
+        :param emdb_ids: EMDB IDs, accession numbers or other search results.
+        :return: A boolean array with one element per hit, in result order.
+        """
+        if isinstance(emdb_ids, EMDBSearchResults):
+            other = emdb_ids._sorted()
+        elif isinstance(emdb_ids, np.ndarray) and emdb_ids.dtype.kind in "iu":
+            other = np.sort(emdb_ids)
+        else:
+            other = np.sort(np.fromiter(map(accession_number, emdb_ids), dtype=np.int64))
+        return _member_mask(self._ids, other)
+
+    def __and__(self, other: "EMDBSearchResults") -> "EMDBSearchResults":
+        if not isinstance(other, EMDBSearchResults):
+            return NotImplemented
+        return self._derive(self.isin(other))
+
+    def __or__(self, other: "EMDBSearchResults") -> "EMDBSearchResults":
+        if not isinstance(other, EMDBSearchResults):
+            return NotImplemented
+        extra = ~other.isin(self)
+        # Only fields projected on both sides are kept
+        columns = {field: _concat_columns(column, other._columns[field][extra])
+                   for field, column in self._columns.items() if field in other._columns}
+        return self._from_array(np.concatenate([self._ids, other._ids[extra]]), self._client,
+                                parent=self, columns=columns)
+
+    def __sub__(self, other: "EMDBSearchResults") -> "EMDBSearchResults":
+        if not isinstance(other, EMDBSearchResults):
+            return NotImplemented
+        return self._derive(~self.isin(other))
+
+    def prefetch(self, window: int = 8) -> Iterator["EMDBEntry"]:
+        """
+        Iterate over the fully loaded entries, fetching up to ``window`` entries ahead
+        in the background while the caller works on the current one.
+
+        Loaded entries are handed to the caller and not kept by the search results, so
+        memory stays bounded by the window size rather than the number of hits.
+
+        Usage:
+            for entry in client.search("HIV").prefetch(window=16):
+                print(entry.resolution)
+
+        :param window: Maximum number of entries fetched ahead of the caller.
+        :return: An iterator of EMDBEntry objects in result order.
+        :raises EMDBAPIError: When an entry fails to load, at its position in the iteration.
+        """
+        numbers = iter(self._ids.tolist())
+        pending = deque()
+        executor = ThreadPoolExecutor(max_workers=window)
+
+        def load(number: int) -> "EMDBEntry":
+            view = self._views.get(number)
+            if view is not None and view._entry is not None:
+                return view._entry
+            return self._client.get_entry(format_emdb_id(number))
+
+        def submit_next() -> None:
+            number = next(numbers, None)
+            if number is not None:
+                pending.append(executor.submit(load, number))
+
+        try:
+            for _ in range(window):
+                submit_next()
+            while pending:
+                entry = pending.popleft().result()
+                submit_next()
+                yield entry
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def download_all_files(self, directory: str, scheduler: Optional[DownloadScheduler] = None,
+                           max_workers: int = 4, progress: Optional[AggregateProgressCallback] = None,
+                           window: int = 8) -> List[DownloadResult]:
+        """
+        Download the files of every entry in these results as one scheduled batch.
+
+        Entries are loaded ``window`` at a time with ``prefetch``, then all their files are
+        scheduled together. Each entry's files go to a subdirectory named after its EMDB ID.
+
+        :param directory: The directory to save the files into.
+        :param scheduler: Optional scheduler to run the downloads on. Defaults to a new one.
+        :param max_workers: Number of files downloaded at once by the default scheduler.
+        :param progress: Optional callback receiving the aggregate ``DownloadProgress`` of the
+            default scheduler.
+        :param window: Maximum number of entries loaded ahead of the downloads.
+        :return: A list of DownloadResult, entry by entry in result order, with per-file errors.
+        :raises EMDBAPIError: If an entry fails to load.
+        :raises EMDBInsufficientSpaceError: If the files do not fit in the free disk space.
+        """
+        if scheduler is not None:
+            return scheduler.download_entries(self.prefetch(window), directory)
+        with DownloadScheduler(max_workers=max_workers, progress=progress) as scheduler:
+            return scheduler.download_entries(self.prefetch(window), directory)
+
+    def materialize(self, concurrency: int = 4) -> List["EMDBEntry"]:
+        """
+        Load every entry of these results concurrently. Usually called on a slice,
+        e.g. ``results[:50].materialize(concurrency=8)``.
+
+        Loaded entries are kept by the search results and their slices, so later
+        attribute access does not go to the network again.
+
+        :param concurrency: Number of entries fetched in parallel.
+        :return: The loaded EMDBEntry objects in result order.
+        :raises EMDBAPIError: If any entry fails to load; the others stay loaded.
+        """
+        views = list(self)
+        to_load = [lazy for lazy in views if lazy._entry is None]
+        errors = []
+        for lazy, result in zip(to_load, self._client.get_entries([lazy._id for lazy in to_load], concurrency)):
+            if result.ok:
+                lazy._entry = result.value
+            else:
+                errors.append(result.error)
+        for lazy in views:
+            if lazy._entry is not None:
+                self._materialized[lazy._id] = lazy
+        if errors:
+            raise errors[0]
+        return [lazy._entry for lazy in views]
+
+    def __iter__(self) -> Iterator[LazyEMDBEntry]:
+        for position, number in enumerate(self._ids.tolist()):
+            yield self._view(number, position)
 
     def __getitem__(self, index):
-        return self.entries[index]
+        if isinstance(index, (slice, list, np.ndarray)):
+            # Slices, integer arrays and boolean masks such as the one returned by isin()
+            return self._derive(index)
+        position = range(len(self._ids))[index]
+        return self._view(int(self._ids[position]), position)
+
+    def __contains__(self, item) -> bool:
+        try:
+            number = accession_number(item)
+        except (TypeError, ValueError):
+            return False
+        sorted_ids = self._sorted()
+        limits = np.iinfo(sorted_ids.dtype)
+        if not limits.min <= number <= limits.max:
+            return False
+        # Search with the array's own dtype; a Python int would make numpy cast the whole array
+        position = int(sorted_ids.searchsorted(sorted_ids.dtype.type(number)))
+        return position < len(sorted_ids) and int(sorted_ids[position]) == number
 
     def __len__(self):
-        return len(self.entries)
+        return len(self._ids)
+
+    def __str__(self):
+        return f"<EMDBSearchResults {len(self._ids)} hits>"
+
+    def __repr__(self):
+        return self.__str__()
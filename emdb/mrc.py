@@ -0,0 +1,356 @@
+"""
+Memory-mapped access to downloaded MRC/CCP4 maps.
+
+The 1024-byte MRC header is parsed and the voxels are exposed as a ``numpy.memmap`` of the
+file, so opening a map costs the same for a 1 MB mask and a 10 GB tomogram, and slicing a
+sub-volume only reads the pages it touches. The array is indexed ``[z, y, x]`` whatever the
+order the axes are stored in; a map stored with another axis order gets a transposed view,
+still without copying.
+"""
+import os
+import struct
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+from emdb.exceptions import EMDBInvalidMapError, EMDBMapMismatchError
+
+if TYPE_CHECKING:
+    from emdb.models.files import BaseMapFile
+
+HEADER_SIZE = 1024
+
+# MRC2014 modes readable as plain arrays
+MODE_DTYPES = {
+    0: "i1",
+    1: "i2",
+    2: "f4",
+    4: "c8",
+    6: "u2",
+    12: "f2",
+}
+
+# EMDB ``data_type`` values, e.g. "IMAGE STORED AS FLOATING POINT NUMBER (4 BYTES)"
+DATA_TYPE_MODES = {
+    "IMAGE STORED AS SIGNED BYTE": 0,
+    "IMAGE STORED AS SIGNED INTEGER (2 BYTES)": 1,
+    "IMAGE STORED AS FLOATING POINT NUMBER (4 BYTES)": 2,
+    "TRANSFORM STORED AS COMPLEX NUMBER (8 BYTES)": 4,
+    "IMAGE STORED AS UNSIGNED INTEGER (2 BYTES)": 6,
+    "IMAGE STORED AS FLOATING POINT NUMBER (2 BYTES)": 12,
+}
+
+AXES = "XYZ"
+# Relative tolerance when comparing header floats (stored as float32) with the API metadata
+FLOAT_TOLERANCE = 1e-4
+
+# Words 1-24, the extra space, origin, MAP, MACHST, rms, nlabl and the ten 80-character labels
+_HEADER_FORMAT = "10i6f3i3fii100x3f4s4sfi800s"
+
+
+@dataclass
+class MRCHeader:
+    """
+    The main header of an MRC/CCP4 map.
+
+    Counts and positions are in file order: ``nx`` columns, ``ny`` rows and ``nz`` sections, the
+    columns, rows and sections being along the ``mapc``, ``mapr`` and ``maps`` axes (1=X, 2=Y, 3=Z).
+    """
+    nx: int
+    ny: int
+    nz: int
+    mode: int
+    nxstart: int
+    nystart: int
+    nzstart: int
+    mx: int
+    my: int
+    mz: int
+    cell_lengths: Tuple[float, float, float]
+    cell_angles: Tuple[float, float, float]
+    mapc: int
+    mapr: int
+    maps: int
+    dmin: float
+    dmax: float
+    dmean: float
+    ispg: int
+    nsymbt: int
+    origin: Tuple[float, float, float]
+    rms: float
+    labels: List[str] = field(default_factory=list)
+    byte_order: str = "<"
+
+    @classmethod
+    def from_bytes(cls, data: bytes, filename: str = "") -> "MRCHeader":
+        """
+        Parse a header from the first 1024 bytes of a map.
+
+        :param data: At least the first 1024 bytes of the file.
+        :param filename: Name of the file, for error messages.
+        :return: The parsed header.
+        :raises EMDBInvalidMapError: If the bytes are not an MRC header.
+        """
+        if len(data) < HEADER_SIZE:
+            raise EMDBInvalidMapError(filename, f"shorter than the {HEADER_SIZE}-byte header")
+        # MACHST: 0x44 0x44 (or 0x44 0x41) for little endian, 0x11 0x11 for big endian. Old files
+        # leave it empty, so fall back to the byte order that gives a sensible axis mapping.
+        if data[212] == 0x44:
+            orders = ["<"]
+        elif data[212] == 0x11:
+            orders = [">"]
+        else:
+            orders = ["<", ">"]
+        for byte_order in orders:
+            fields = struct.unpack_from(byte_order + _HEADER_FORMAT, data)
+            if sorted(fields[16:19]) == [1, 2, 3] and min(fields[0:3]) > 0 and fields[23] >= 0:
+                break
+        else:
+            raise EMDBInvalidMapError(filename, "the header has no valid dimensions, axis order and extended header size")
+        nlabl = max(0, min(10, fields[30]))
+        labels = [fields[31][i * 80:(i + 1) * 80].decode("ascii", "replace").rstrip(" \x00")
+                  for i in range(nlabl)]
+        return cls(
+            nx=fields[0], ny=fields[1], nz=fields[2], mode=fields[3],
+            nxstart=fields[4], nystart=fields[5], nzstart=fields[6],
+            mx=fields[7], my=fields[8], mz=fields[9],
+            cell_lengths=tuple(fields[10:13]), cell_angles=tuple(fields[13:16]),
+            mapc=fields[16], mapr=fields[17], maps=fields[18],
+            dmin=fields[19], dmax=fields[20], dmean=fields[21],
+            ispg=fields[22], nsymbt=fields[23],
+            origin=tuple(fields[24:27]), rms=fields[29],
+            labels=labels, byte_order=byte_order,
+        )
+
+    @classmethod
+    def read(cls, path: str) -> "MRCHeader":
+        """
+        Read the header of a map file.
+
+        :raises EMDBInvalidMapError: If the file is not an MRC map.
+        """
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read(HEADER_SIZE), os.path.basename(path))
+
+    @property
+    def dtype(self) -> np.dtype:
+        """
+        NumPy dtype of the voxels, in the byte order of the file.
+
+        :raises KeyError: If the mode has no NumPy equivalent (packed 4-bit or complex integers).
+        """
+        return np.dtype(self.byte_order + MODE_DTYPES[self.mode])
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        """
+        Shape of the voxel array in file order: ``(sections, rows, columns)``.
+        """
+        return self.nz, self.ny, self.nx
+
+    @property
+    def data_offset(self) -> int:
+        """
+        Byte offset of the first voxel, after the main and extended headers.
+        """
+        return HEADER_SIZE + self.nsymbt
+
+    @property
+    def axis_order(self) -> str:
+        """
+        The axes of columns, rows and sections, e.g. ``"XYZ"``.
+        """
+        return "".join(AXES[axis - 1] for axis in (self.mapc, self.mapr, self.maps))
+
+    @property
+    def voxel_size(self) -> Tuple[float, float, float]:
+        """
+        Size of a voxel along X, Y and Z in Ångström: the cell lengths over the sampling.
+        """
+        return tuple(length / sampling if sampling else 0.0
+                     for length, sampling in zip(self.cell_lengths, (self.mx, self.my, self.mz)))
+
+
+class MRCMap:
+    """
+    A downloaded map file, with its voxels memory-mapped.
+
+    ``data`` is indexed ``[z, y, x]``. It is a read-only view of the file unless the map was
+    opened with ``mode="r+"``. Copy what you slice from it with ``np.array`` to keep it in memory.
+
+    Usage:
+        with open_map("emd_1234.map", metadata=entry.primary_map) as volume:
+            box = np.asarray(volume.data[100:164, 100:164, 100:164])
+    """
+
+    def __init__(self, path: str, mode: str = "r"):
+        """
+        :param path: Path of an uncompressed ``.map``/``.mrc`` file.
+        :param mode: ``"r"`` for read-only, ``"r+"`` to write voxels back, ``"c"`` for copy-on-write.
+        :raises EMDBInvalidMapError: If the file is compressed, not an MRC map, of an unsupported
+            mode, or shorter than its header says.
+        """
+        self.path = path
+        filename = os.path.basename(path)
+        if path.endswith(".gz"):
+            raise EMDBInvalidMapError(filename, "gzipped maps cannot be memory-mapped; download them with "
+                                                "decompress=True")
+        self.header = MRCHeader.read(path)
+        if self.header.mode not in MODE_DTYPES:
+            raise EMDBInvalidMapError(filename, f"mode {self.header.mode} is not supported")
+        size = int(np.prod(self.header.shape)) * self.header.dtype.itemsize
+        if os.path.getsize(path) < self.header.data_offset + size:
+            raise EMDBInvalidMapError(filename, f"the file is shorter than the {size} bytes of voxels in its header")
+        self.raw = np.memmap(path, dtype=self.header.dtype, mode=mode, offset=self.header.data_offset,
+                             shape=self.header.shape)
+        # Array axes are (sections, rows, columns); find which holds each of Z, Y and X
+        file_axes = (self.header.maps, self.header.mapr, self.header.mapc)
+        self.data = self.raw.transpose([file_axes.index(axis) for axis in (3, 2, 1)])
+        self.mismatches: List[EMDBMapMismatchError] = []
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        """
+        Shape of ``data``: ``(z, y, x)``.
+        """
+        return self.data.shape
+
+    @property
+    def voxel_size(self) -> Tuple[float, float, float]:
+        """
+        Size of a voxel along X, Y and Z in Ångström.
+        """
+        return self.header.voxel_size
+
+    def check(self, metadata: "BaseMapFile", strict: bool = True) -> List[EMDBMapMismatchError]:
+        """
+        Compare the header with the API metadata of the map.
+
+        :param metadata: The map's model, e.g. ``entry.primary_map``.
+        :param strict: Raise on the first mismatch instead of only returning them.
+        :return: The mismatches found, also kept in ``mismatches``.
+        :raises EMDBMapMismatchError: With ``strict``, if the header and the metadata disagree.
+        """
+        self.mismatches = compare_header(self.header, metadata, os.path.basename(self.path))
+        if strict and self.mismatches:
+            raise self.mismatches[0]
+        return self.mismatches
+
+    def close(self) -> None:
+        """
+        Flush writes and drop the arrays. The mapping itself is released by NumPy once no view
+        sliced from ``data`` without copying is left.
+        """
+        if self.raw is not None and self.raw.mode == "r+":
+            self.raw.flush()
+        self.raw = None
+        self.data = None
+
+    def __enter__(self) -> "MRCMap":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __str__(self):
+        return f"<MRCMap {self.path} shape={self.shape}, dtype={self.header.dtype}, axis_order={self.header.axis_order}>"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def _number(value) -> Optional[float]:
+    # API values are plain numbers or {"valueOf_": number, "units": ...}
+    if isinstance(value, dict):
+        value = value.get("valueOf_")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _close(expected: float, actual: float) -> bool:
+    return abs(expected - actual) <= FLOAT_TOLERANCE * max(1.0, abs(expected))
+
+
+def compare_header(header: MRCHeader, metadata: "BaseMapFile", filename: str = "") -> List[EMDBMapMismatchError]:
+    """
+    Compare an MRC header with the API metadata of a map.
+
+    Fields missing from the metadata are skipped. Dimensions and origins are compared in file
+    order (columns, rows, sections), sampling and cell in X, Y, Z order, as in the EMDB header.
+
+    :param header: The parsed header.
+    :param metadata: The map's model, e.g. ``entry.primary_map``.
+    :param filename: Name of the file, for the errors.
+    :return: One error per field that disagrees.
+    """
+    mismatches = []
+
+    def compare(name: str, expected, actual, numeric: bool = False):
+        if expected is None:
+            return
+        if numeric:
+            if not _close(expected, actual):
+                mismatches.append(EMDBMapMismatchError(filename, name, expected, actual))
+        elif expected != actual:
+            mismatches.append(EMDBMapMismatchError(filename, name, expected, actual))
+
+    def ints(values: Dict, keys: str) -> Optional[Tuple[int, ...]]:
+        numbers = [_number(values.get(key)) for key in keys.split()]
+        return None if None in numbers else tuple(int(n) for n in numbers)
+
+    compare("dimensions", ints(metadata.dimensions or {}, "col row sec"), (header.nx, header.ny, header.nz))
+    compare("origin", ints(metadata.origin or {}, "col row sec"), (header.nxstart, header.nystart, header.nzstart))
+    compare("spacing", ints(metadata.spacing or {}, "x y z"), (header.mx, header.my, header.mz))
+    compare("data_type", DATA_TYPE_MODES.get((metadata.data_type or "").strip().upper()), header.mode)
+    cell = metadata.cell or {}
+    for key, actual in zip(("a", "b", "c", "alpha", "beta", "gamma"), header.cell_lengths + header.cell_angles):
+        value = _number(cell.get(key))
+        compare(f"cell {key}", value, actual, numeric=True)
+    order = metadata.axis_order or {}
+    if all(key in order for key in ("fast", "medium", "slow")):
+        compare("axis_order", "".join(str(order[key]).upper() for key in ("fast", "medium", "slow")),
+                header.axis_order)
+    return mismatches
+
+
+def map_file_size(metadata: "BaseMapFile") -> Optional[int]:
+    """
+    Size of a map once decompressed, from the API metadata: the 1024-byte header and the voxels.
+    Extended headers are not counted.
+
+    :param metadata: The map's model, e.g. ``entry.primary_map``.
+    :return: The size in bytes, or None if the metadata has no dimensions.
+    """
+    dimensions = [_number((metadata.dimensions or {}).get(key)) for key in ("col", "row", "sec")]
+    if None in dimensions:
+        return None
+    mode = DATA_TYPE_MODES.get((metadata.data_type or "").strip().upper())
+    # Most maps are 32-bit floats; assume so when the data type is unknown
+    itemsize = np.dtype(MODE_DTYPES[mode]).itemsize if mode is not None else 4
+    return HEADER_SIZE + int(np.prod([int(n) for n in dimensions], dtype=np.int64)) * itemsize
+
+
+def open_map(path: str, metadata: Optional["BaseMapFile"] = None, strict: bool = True, mode: str = "r") -> MRCMap:
+    """
+    Open a downloaded MRC/CCP4 map with its voxels memory-mapped.
+
+    :param path: Path of an uncompressed map file.
+    :param metadata: Optional API model of the map to check the header against.
+    :param strict: Raise if the header disagrees with ``metadata``; otherwise the differences are
+        kept in ``MRCMap.mismatches``.
+    :param mode: ``"r"``, ``"r+"`` or ``"c"``, as for ``numpy.memmap``.
+    :return: The opened map.
+    :raises EMDBInvalidMapError: If the file cannot be memory-mapped as an MRC map.
+    :raises EMDBMapMismatchError: With ``strict``, if the header disagrees with ``metadata``.
+    """
+    volume = MRCMap(path, mode=mode)
+    if metadata is not None:
+        try:
+            volume.check(metadata, strict=strict)
+        except EMDBMapMismatchError:
+            volume.close()
+            raise
+    return volume
@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+from dataclasses import dataclass, replace
+
+
+@dataclass
+class RateLimiterStats:
+    """
+    Counters describing how much a rate limiter has throttled its callers.
+    """
+    acquired: int = 0
+    throttled: int = 0
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+    penalties: int = 0
+
+
+class TokenBucketRateLimiter:
+    """
+    Token-bucket rate limiter shared by every request made through a client.
+
+    The bucket holds up to ``burst`` tokens and refills at ``rate`` tokens per second.
+    Each request takes one token; when the bucket is empty the caller reserves the next
+    token and waits until it has been refilled. Reservations are made under a lock that
+    is never held while sleeping, so the limiter can be shared between threads and
+    asyncio tasks at the same time.
+
+    Usage:
+        limiter = TokenBucketRateLimiter(rate=2.5, burst=5)
+        client = EMDB(rate_limiter=limiter)
+    """
+
+    def __init__(self, rate: float = 2.5, burst: int = 1):
+        """
+        :param rate: Sustained number of requests per second.
+        :param burst: Maximum number of requests allowed back to back after an idle period.
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if burst < 1:
+            raise ValueError("burst must be at least 1")
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._stats = RateLimiterStats()
+
+    def _refill(self) -> None:
+        # Must be called with the lock held
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _reserve(self, tokens: float) -> float:
+        """
+        Take ``tokens`` from the bucket and return how long the caller must wait for them.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+            self._stats.acquired += 1
+            if wait > 0:
+                self._stats.throttled += 1
+                self._stats.total_wait_seconds += wait
+                self._stats.max_wait_seconds = max(self._stats.max_wait_seconds, wait)
+            return wait
+
+    def acquire(self, tokens: float = 1) -> float:
+        """
+        Block the calling thread until ``tokens`` are available.
+
+        :param tokens: Number of tokens to take.
+        :return: The number of seconds spent waiting.
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens: float = 1) -> float:
+        """
+        Wait without blocking the event loop until ``tokens`` are available.
+
+        :param tokens: Number of tokens to take.
+        :return: The number of seconds spent waiting.
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def penalize(self, seconds: float) -> None:
+        """
+        Pause the whole bucket so that no caller gets a token for ``seconds``.
+
+        Used when the server answers 429 Too Many Requests: every request sharing the
+        limiter backs off, not only the one that was rejected.
+
+        :param seconds: Minimum number of seconds before the next token is handed out.
+        """
+        with self._lock:
+            self._refill()
+            # The next caller takes one token and must wait for the deficit to refill
+            self._tokens = min(self._tokens, 1 - seconds * self.rate)
+            self._stats.penalties += 1
+
+    @property
+    def stats(self) -> RateLimiterStats:
+        """
+        A snapshot of the throttling counters.
+        """
+        with self._lock:
+            return replace(self._stats)
+
+    def reset_stats(self) -> None:
+        """
+        Reset the throttling counters to zero.
+        """
+        with self._lock:
+            self._stats = RateLimiterStats()
+
+    def __str__(self):
+        return f"<TokenBucketRateLimiter rate={self.rate}/s burst={self.burst}>"
+
+    def __repr__(self):
+        return self.__str__()
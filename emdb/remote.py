@@ -0,0 +1,265 @@
+"""
+File-like, read-only access to remote EMDB files.
+
+``RemoteFile`` streams a file over HTTP as it is read, so nothing is written to disk and only
+the buffer is held in memory. When the server supports byte ranges, seeking closes the current
+response and the next read continues with a ``Range`` request from the new position; short
+forward seeks just skip the bytes in between. ``open_remote`` adds buffering and, for ``.gz``
+files, transparent decompression.
+"""
+import gzip
+import io
+import time
+from typing import BinaryIO, Optional, TYPE_CHECKING
+
+import requests
+import urllib3
+
+from emdb.download import _validator, content_length, open_download, parse_content_range
+from emdb.exceptions import EMDBFileNotFoundError, EMDBNetworkError
+from emdb.retry import RetryPolicy
+from emdb.utils import DEFAULT_TIMEOUT
+
+if TYPE_CHECKING:
+    from emdb.models.files import BaseFile
+
+# Reads go to the network in blocks of this size; small enough that reading a header
+# does not wait for megabytes, large enough to keep the number of reads low
+DEFAULT_BUFFER_SIZE = 256 * 1024
+# Forward seeks up to this distance read through the open response instead of a new request
+SEEK_SKIP = 256 * 1024
+
+
+class RemoteFileChangedError(EMDBNetworkError):
+    """
+    The file changed on the server while it was being read.
+    """
+
+
+class RemoteFile(io.RawIOBase):
+    """
+    Unbuffered, read-only file object over an EMDB file served by HTTP.
+
+    The response is opened on the first read. Dropped connections are resumed from the current
+    position under the retry policy. The file is seekable if the server advertises
+    ``Accept-Ranges: bytes``; a file that changes on the server while it is read raises
+    ``RemoteFileChangedError`` rather than mixing the two versions.
+
+    Usually wrapped by ``open_remote`` or ``BaseFile.open``.
+    """
+
+    def __init__(self, file: "BaseFile", http=requests, timeout=DEFAULT_TIMEOUT,
+                 retry_policy: Optional[RetryPolicy] = None):
+        """
+        :param file: The file to read.
+        :param http: A requests.Session, or the requests module.
+        :param timeout: Request timeout in seconds, or a (connect, read) tuple.
+        :param retry_policy: The retry policy. Defaults to ``RetryPolicy()``.
+        """
+        super().__init__()
+        self.file = file
+        self.url = file.source_path
+        self.name = file.filename
+        self.size: Optional[int] = None
+        self._http = http
+        self._timeout = timeout
+        self._policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self._position = 0
+        self._response: Optional[requests.Response] = None
+        self._ranges: Optional[bool] = None
+        self._validator: Optional[str] = None
+
+    def _open(self) -> None:
+        """
+        Open a response whose body starts at the current position.
+        """
+        headers = {}
+        if self._position:
+            headers["Range"] = f"bytes={self._position}-"
+            if self._validator:
+                headers["If-Range"] = self._validator
+        response = open_download(self._http, self.url, timeout=self._timeout, retry_policy=self._policy,
+                                 headers=headers)
+        if response.status_code == 416:
+            # Reading at or past the end
+            response.close()
+            total = parse_content_range(response.headers.get("Content-Range"))[2]
+            if total is not None:
+                self.size = total
+            return
+        if response.status_code == 206:
+            first, _, total = parse_content_range(response.headers.get("Content-Range"))
+            if first != self._position:
+                response.close()
+                raise EMDBNetworkError(f"{self.url} answered a range not starting at byte {self._position}")
+            self.size = total
+            self._ranges = True
+        elif response.status_code == 200:
+            if self._position and self._ranges:
+                # If-Range fell back to the full file: it changed since it was opened
+                response.close()
+                raise RemoteFileChangedError(f"{self.url} changed on the server while it was read")
+            if self._ranges is None:
+                self._ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+            self.size = content_length(response)
+            self._skip(response, self._position)
+        else:
+            response.close()
+            raise EMDBFileNotFoundError(self.file._emdb_id, self.file.filename)
+        if self._validator is None:
+            self._validator = _validator(response)
+        self._response = response
+
+    @staticmethod
+    def _skip(response: requests.Response, count: int) -> None:
+        while count > 0:
+            data = response.raw.read(min(count, DEFAULT_BUFFER_SIZE), decode_content=False)
+            if not data:
+                raise EMDBNetworkError(f"{response.url} ended while skipping to a later position")
+            count -= len(data)
+
+    def _close_response(self) -> None:
+        if self._response is not None:
+            self._response.close()
+            self._response = None
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        """
+        Whether the server supports byte ranges. Opens the file if that is not known yet.
+        """
+        self._checkClosed()
+        if self._ranges is None:
+            self._open()
+        return bool(self._ranges)
+
+    def readinto(self, buffer) -> int:
+        """
+        Read up to ``len(buffer)`` bytes into ``buffer``.
+
+        :return: The number of bytes read; 0 at the end of the file.
+        :raises EMDBFileNotFoundError: If the file is not available.
+        :raises EMDBNetworkError: If the transfer failed and could not be resumed.
+        """
+        self._checkClosed()
+        if not len(buffer) or (self.size is not None and self._position >= self.size):
+            return 0
+        attempt = 0
+        start = time.monotonic()
+        while True:
+            if self._response is None:
+                # Opening is retried by send_with_retry; only the transfer is retried here
+                self._open()
+                if self._response is None:
+                    return 0
+            try:
+                data = self._response.raw.read(len(buffer), decode_content=False)
+                if not data and self.size is not None and self._position < self.size:
+                    raise EMDBNetworkError(f"{self.url} ended at byte {self._position} of {self.size}")
+                break
+            except (requests.RequestException, urllib3.exceptions.HTTPError, EMDBNetworkError) as e:
+                self._close_response()
+                attempt += 1
+                delay = self._policy.backoff(attempt)
+                if not self._policy.should_retry("GET", attempt, time.monotonic() - start, delay):
+                    if isinstance(e, EMDBNetworkError):
+                        raise
+                    raise EMDBNetworkError(f"Network error while reading {self.url}: {e}")
+                time.sleep(delay)
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        """
+        Move to a new position. Seeking anywhere but the current position needs range support.
+
+        :return: The new position.
+        :raises io.UnsupportedOperation: If the server does not support byte ranges, or the size
+            needed for ``SEEK_END`` is unknown.
+        """
+        self._checkClosed()
+        if whence == io.SEEK_SET:
+            target = offset
+        elif whence == io.SEEK_CUR:
+            target = self._position + offset
+        elif whence == io.SEEK_END:
+            if self.size is None:
+                # The first response tells the size
+                self.seekable()
+            if self.size is None:
+                raise io.UnsupportedOperation(f"The size of {self.url} is unknown")
+            target = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if target < 0:
+            raise ValueError(f"Negative seek position {target}")
+        if target == self._position:
+            return target
+        if not self.seekable():
+            raise io.UnsupportedOperation(f"{self.url} does not support byte ranges")
+        if self._response is not None and 0 < target - self._position <= SEEK_SKIP:
+            try:
+                self._skip(self._response, target - self._position)
+                self._position = target
+                return target
+            except (requests.RequestException, urllib3.exceptions.HTTPError, EMDBNetworkError):
+                pass
+        self._close_response()
+        self._position = target
+        return target
+
+    def tell(self) -> int:
+        self._checkClosed()
+        return self._position
+
+    def close(self) -> None:
+        """
+        Close the open response, if any, and the file.
+        """
+        self._close_response()
+        super().close()
+
+    def __str__(self):
+        return f"<RemoteFile {self.url} position={self._position}, size={self.size}>"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class _GzipRemoteFile(gzip.GzipFile):
+    """
+    GzipFile that closes the remote file it reads from; GzipFile leaves a given fileobj open.
+    """
+
+    def close(self) -> None:
+        fileobj = self.fileobj
+        try:
+            super().close()
+        finally:
+            if fileobj is not None:
+                fileobj.close()
+
+
+def open_remote(file: "BaseFile", http=requests, timeout=DEFAULT_TIMEOUT, retry_policy: Optional[RetryPolicy] = None,
+                decompress: Optional[bool] = None, buffer_size: int = DEFAULT_BUFFER_SIZE) -> BinaryIO:
+    """
+    Open an EMDB file for reading straight from the server.
+
+    :param file: The file to read.
+    :param http: A requests.Session, or the requests module.
+    :param timeout: Request timeout in seconds, or a (connect, read) tuple.
+    :param retry_policy: The retry policy. Defaults to ``RetryPolicy()``.
+    :param decompress: Gunzip the file while it is read. Defaults to True for ``.gz`` files.
+    :param buffer_size: Number of bytes requested from the network at a time.
+    :return: A buffered binary file object; wrap it in ``io.TextIOWrapper`` to read text.
+    """
+    if decompress is None:
+        decompress = file.filename.endswith(".gz")
+    reader = io.BufferedReader(RemoteFile(file, http=http, timeout=timeout, retry_policy=retry_policy),
+                               buffer_size=buffer_size)
+    if decompress:
+        return _GzipRemoteFile(fileobj=reader, mode="rb")
+    return reader
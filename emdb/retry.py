@@ -0,0 +1,111 @@
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional, Iterable
+
+
+class RetryPolicy:
+    """
+    Retry policy shared by API calls and file downloads.
+
+    Failed attempts are retried with exponential backoff and full jitter. A ``Retry-After``
+    header sent with a retryable response takes precedence over the computed backoff.
+    Only idempotent methods are retried, and no retry is scheduled once the next attempt
+    would start after ``max_elapsed`` seconds.
+
+    Usage:
+        policy = RetryPolicy(max_attempts=5, max_elapsed=120)
+        client = EMDB(retry_policy=policy)
+    """
+
+    def __init__(self, max_attempts: int = 3, backoff_factor: float = 0.5, max_backoff: float = 30.0,
+                 max_elapsed: float = 120.0, jitter: bool = True,
+                 retry_statuses: Iterable[int] = (429, 500, 502, 503, 504),
+                 retry_methods: Iterable[str] = ("GET", "HEAD", "OPTIONS"),
+                 respect_retry_after: bool = True):
+        """
+        :param max_attempts: Maximum number of attempts, including the first one.
+        :param backoff_factor: Base delay in seconds; attempt ``n`` backs off up to ``backoff_factor * 2 ** (n - 1)``.
+        :param max_backoff: Upper bound for a single computed backoff delay.
+        :param max_elapsed: Give up instead of retrying once this many seconds have passed since the first attempt.
+        :param jitter: Randomise each delay between zero and the computed backoff.
+        :param retry_statuses: HTTP status codes that are retried.
+        :param retry_methods: HTTP methods considered idempotent and safe to retry.
+        :param respect_retry_after: Wait for the delay given in a ``Retry-After`` header.
+        """
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        self.max_attempts = max_attempts
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.max_elapsed = max_elapsed
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.retry_methods = frozenset(m.upper() for m in retry_methods)
+        self.respect_retry_after = respect_retry_after
+
+    def is_retryable_status(self, status_code: int) -> bool:
+        """
+        Whether a response with this status code should be retried.
+        """
+        return status_code in self.retry_statuses
+
+    def is_retryable_method(self, method: str) -> bool:
+        """
+        Whether requests with this HTTP method are idempotent and may be retried.
+        """
+        return method.upper() in self.retry_methods
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Delay before the attempt following ``attempt`` (1-based), without ``Retry-After``.
+        """
+        delay = min(self.max_backoff, self.backoff_factor * (2 ** (attempt - 1)))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Delay before the attempt following ``attempt``, honoring a parsed ``Retry-After`` value.
+        """
+        if retry_after is not None and self.respect_retry_after:
+            return max(0.0, retry_after)
+        return self.backoff(attempt)
+
+    def should_retry(self, method: str, attempt: int, elapsed: float, delay: float) -> bool:
+        """
+        Whether to schedule another attempt.
+
+        :param method: HTTP method of the failed request.
+        :param attempt: Number of attempts made so far.
+        :param elapsed: Seconds since the first attempt started.
+        :param delay: Seconds the caller would wait before the next attempt.
+        """
+        return (self.is_retryable_method(method)
+                and attempt < self.max_attempts
+                and elapsed + delay <= self.max_elapsed)
+
+    @staticmethod
+    def parse_retry_after(value: Optional[str]) -> Optional[float]:
+        """
+        Parse a ``Retry-After`` header given either in seconds or as an HTTP date.
+
+        :return: The delay in seconds, or None if the header is missing or invalid.
+        """
+        if not value:
+            return None
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError, IndexError):
+            return None
+
+    def __str__(self):
+        return (f"<RetryPolicy max_attempts={self.max_attempts} backoff_factor={self.backoff_factor} "
+                f"max_elapsed={self.max_elapsed}>")
+
+    def __repr__(self):
+        return self.__str__()
@@ -0,0 +1,423 @@
+import os
+import shutil
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Callable, Iterable, List, Optional, Set, Tuple, TYPE_CHECKING
+from urllib.parse import urlparse
+
+import requests
+
+from emdb.download import DEFAULT_CHUNK_SIZE, auto_segments
+from emdb.exceptions import EMDBInsufficientSpaceError
+from emdb.ratelimit import TokenBucketRateLimiter
+from emdb.retry import RetryPolicy
+
+if TYPE_CHECKING:
+    from emdb.models.entry import EMDBEntry
+    from emdb.models.files import BaseFile
+    from emdb.store import BlobStore
+
+
+@dataclass
+class DownloadResult:
+    """
+    Outcome of one scheduled download: the path and size of the file, or the error raised for it.
+    """
+    file: "BaseFile"
+    output_path: str
+    index: int
+    size: Optional[int] = None
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        """
+        True if the file was downloaded successfully.
+        """
+        return self.error is None
+
+    @property
+    def emdb_id(self) -> Optional[str]:
+        return self.file._emdb_id
+
+    def __str__(self):
+        outcome = f"{self.size} bytes" if self.ok else f"error={self.error!r}"
+        return f"<DownloadResult {self.file.filename} {outcome}>"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+@dataclass
+class DownloadProgress:
+    """
+    Aggregate progress of every download submitted to a scheduler.
+
+    ``bytes_done`` counts the bytes received from the network. ``bytes_total`` starts from
+    the files' ``size_kbytes`` and is corrected with the sizes reported by the server as
+    downloads begin; bytes already on disk, in a resumed ``.part`` file or a ``BlobStore``,
+    are not counted in either.
+    """
+    files_total: int = 0
+    files_done: int = 0
+    files_failed: int = 0
+    bytes_done: int = 0
+    bytes_total: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def files_pending(self) -> int:
+        return self.files_total - self.files_done - self.files_failed
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes_done / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self):
+        return (f"<DownloadProgress files={self.files_done + self.files_failed}/{self.files_total} "
+                f"bytes={self.bytes_done}/{self.bytes_total}>")
+
+    def __repr__(self):
+        return self.__str__()
+
+
+# Called with a snapshot of the scheduler's aggregate progress
+AggregateProgressCallback = Callable[[DownloadProgress], None]
+
+# Order in which pending files are started:
+#   fifo            in submission order
+#   largest_first   biggest size_kbytes first, so no huge file is left running alone at the end
+#   smallest_first  smallest size_kbytes first, for early results
+#   fair            the entry with the fewest running files first, so entries progress side by side
+POLICIES = ("fifo", "largest_first", "smallest_first", "fair")
+
+
+def required_space(files: Iterable["BaseFile"], decompress: bool = False) -> int:
+    """
+    Number of bytes needed to store files, from their ``disk_size``. Files without a size count as zero.
+
+    :param files: The files to download.
+    :param decompress: Whether ``.gz`` files are gunzipped while downloading; maps then count
+        their decompressed size.
+    """
+    return sum(file.disk_size(decompress) or 0 for file in files)
+
+
+class _Job:
+    __slots__ = ("file", "output_path", "index", "host", "entry", "future", "expected", "space", "done", "total",
+                 "connections")
+
+    def __init__(self, file: "BaseFile", output_path: str, index: int, decompress: bool = False):
+        self.file = file
+        self.output_path = output_path
+        self.index = index
+        self.host = urlparse(file.source_path).netloc
+        self.entry = file._emdb_id
+        self.future: Future = Future()
+        # Bytes to receive, and bytes taken on disk, which differ for decompressed files
+        self.expected = int(file.size_kbytes * 1024) if file.size_kbytes else 0
+        self.space = file.disk_size(decompress) or 0
+        # Offset of the last progress report; None until the download reports where it starts
+        self.done: Optional[int] = None
+        self.total: Optional[int] = None
+        # Connections to the host reserved for the job when it starts: its segments, or 1
+        self.connections = 1
+
+
+class DownloadScheduler:
+    """
+    Downloads files concurrently on a bounded worker pool shared by every caller.
+
+    Files from any number of entries can be submitted, from any thread. A file starts once a
+    worker is free and its host has fewer than ``max_per_host`` connections open; files for a
+    busy host wait without holding a worker. An optional bandwidth cap is shared by all
+    downloads, and aggregate progress is reported through a callback.
+
+    Among the files that can start, ``policy`` picks which one goes first (see ``POLICIES``).
+    Batches are checked against the free disk space before anything is downloaded, and each
+    file's size is reserved on disk when it starts.
+
+    Usage:
+        with DownloadScheduler(max_workers=8, bandwidth=50e6, progress=print) as scheduler:
+            results = scheduler.download_entries(client.search("HIV").prefetch(), "maps/")
+    """
+
+    def __init__(self, max_workers: int = 4, max_per_host: int = 4, bandwidth: Optional[float] = None,
+                 progress: Optional[AggregateProgressCallback] = None, session: Optional[requests.Session] = None,
+                 retry_policy: Optional[RetryPolicy] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 resume: bool = True, segmented: bool = False, policy: str = "fifo",
+                 check_space: bool = True, allocate: bool = True, decompress: bool = False,
+                 verify: bool = False, store: Optional["BlobStore"] = None):
+        """
+        :param max_workers: Maximum number of files downloading at once.
+        :param max_per_host: Maximum number of connections open at once to the same host. Each
+            segment of a segmented download counts as one.
+        :param bandwidth: Optional cap on the combined download rate, in bytes per second.
+        :param progress: Optional callback receiving a ``DownloadProgress`` after every chunk and file.
+        :param session: Optional requests.Session to download with. Defaults to the pooled
+            session of the client that created each file.
+        :param retry_policy: Optional retry policy. Defaults to the policy of each file's client.
+        :param chunk_size: Number of bytes read and written at a time.
+        :param resume: Resume from, and keep on failure, partial ``.part`` files.
+        :param segmented: Download large files as concurrent byte ranges; see ``BaseFile.download``.
+            A file gets at most as many segments as its host has free connections when it starts,
+            and files without ``size_kbytes`` use a single stream.
+        :param policy: Which pending file starts first: ``"fifo"``, ``"largest_first"``,
+            ``"smallest_first"`` or ``"fair"`` (per entry).
+        :param check_space: Refuse batches that do not fit in the free disk space.
+        :param allocate: Reserve each file's size on disk before writing it.
+        :param decompress: Gunzip ``.gz`` files while downloading them, saved without ``.gz``. The
+            space check counts the decompressed size of maps, estimated from their dimensions and
+            data type, and the compressed size of other files.
+        :param verify: Check each file against the checksum listing of its entry. Files without a
+            listing, such as figures and PDBe models, or missing from it are downloaded unchecked.
+        :param store: Optional ``BlobStore`` files are downloaded into, once, and linked from.
+        :raises ValueError: If a limit is not positive or the policy is unknown.
+        """
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if max_per_host < 1:
+            raise ValueError("max_per_host must be at least 1")
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {', '.join(POLICIES)}")
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.session = session
+        self.retry_policy = retry_policy
+        self.chunk_size = chunk_size
+        self.resume = resume
+        self.segmented = segmented
+        self.policy = policy
+        self.check_space = check_space
+        self.allocate = allocate
+        self.decompress = decompress
+        self.verify = verify
+        self.store = store
+        # Tokens are bytes; the burst of one chunk keeps the rate even from the start
+        self.bandwidth_limiter = (TokenBucketRateLimiter(rate=bandwidth, burst=max(1, min(int(bandwidth), chunk_size)))
+                                  if bandwidth else None)
+        self._progress_callback = progress
+        self._progress = DownloadProgress()
+        self._started: Optional[float] = None
+        self._pending: List[_Job] = []
+        self._active: Set[_Job] = set()
+        self._per_host: Counter = Counter()
+        self._per_entry: Counter = Counter()
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="emdb-download")
+
+    @property
+    def progress(self) -> DownloadProgress:
+        """
+        A snapshot of the aggregate progress of all submitted downloads.
+        """
+        with self._lock:
+            return self._snapshot()
+
+    def submit(self, file: "BaseFile", output_path: str, index: int = 0) -> "Future[DownloadResult]":
+        """
+        Schedule the download of a file.
+
+        :param file: The file to download.
+        :param output_path: The local path of the file. A path ending in ``/`` is a directory
+            the file is saved into under its own name.
+        :param index: Position of the file in the caller's batch, copied to the result.
+        :return: A future resolving to a ``DownloadResult``. Errors are stored in the result,
+            not raised by the future.
+        """
+        if output_path.endswith("/"):
+            output_path += file.local_filename(self.decompress)
+        job = _Job(file, output_path, index, self.decompress)
+        self._enqueue([job])
+        return job.future
+
+    def download(self, files: Iterable["BaseFile"], directory: str) -> List[DownloadResult]:
+        """
+        Download files into a directory and wait for all of them.
+
+        :param files: The files to download.
+        :param directory: The directory to save the files into; created if missing.
+        :return: A list of DownloadResult in input order.
+        :raises EMDBInsufficientSpaceError: If ``check_space`` is set and the files do not fit.
+        """
+        return self._run((file, directory) for file in files)
+
+    def download_entries(self, entries: Iterable["EMDBEntry"], directory: str) -> List[DownloadResult]:
+        """
+        Download the deposited files of many entries in one batch and wait for all of them.
+
+        All entries are loaded first, so that the space check covers the whole batch and the
+        scheduling policy orders all of its files; ``EMDBSearchResults.prefetch()`` loads them
+        concurrently.
+
+        :param entries: The entries, e.g. an ``EMDBSearchResults`` or its ``prefetch()`` iterator.
+        :param directory: The directory to save the files into, one subdirectory per entry.
+        :return: A list of DownloadResult, entry by entry in input order.
+        :raises EMDBInsufficientSpaceError: If ``check_space`` is set and the files do not fit.
+        """
+        return self._run((file, os.path.join(directory, entry.id))
+                         for entry in entries for file in entry.deposited_files)
+
+    def preflight(self, files: Iterable["BaseFile"], directory: str) -> int:
+        """
+        Check that files fit in the free space of a directory, on top of the downloads already queued.
+
+        :param files: The files about to be downloaded.
+        :param directory: An existing directory on the file system the files go to.
+        :return: The number of bytes the files need, from their ``disk_size``; with ``decompress``,
+            gzipped maps count their decompressed size.
+        :raises EMDBInsufficientSpaceError: If they do not fit.
+        """
+        required = required_space(files, self.decompress)
+        with self._lock:
+            # The part of each queued file not written yet, in proportion to the bytes received
+            queued = sum(job.space - job.space * min(job.done or 0, job.expected) // job.expected if job.expected
+                         else job.space for job in self._pending + list(self._active))
+        available = shutil.disk_usage(directory).free
+        if required + queued > available:
+            raise EMDBInsufficientSpaceError(directory, required + queued, available)
+        return required
+
+    def _run(self, targets: Iterable[Tuple["BaseFile", str]]) -> List[DownloadResult]:
+        targets = list(targets)
+        for directory in {directory for _, directory in targets}:
+            os.makedirs(directory, exist_ok=True)
+        if self.check_space and targets:
+            self.preflight([file for file, _ in targets], targets[0][1])
+        jobs = [_Job(file, os.path.join(directory, file.local_filename(self.decompress)), index, self.decompress)
+                for index, (file, directory) in enumerate(targets)]
+        self._enqueue(jobs)
+        return [job.future.result() for job in jobs]
+
+    def _enqueue(self, jobs: List[_Job]) -> None:
+        # The whole batch is queued before dispatching so that the policy sees all of it
+        with self._lock:
+            if self._started is None:
+                self._started = time.monotonic()
+            self._pending.extend(jobs)
+            self._progress.files_total += len(jobs)
+            self._progress.bytes_total += sum(job.expected for job in jobs)
+            self._dispatch()
+
+    def _next_job(self) -> Optional[_Job]:
+        # Must be called with the lock held: the pending job to start next, if any can start
+        ready = [job for job in self._pending if self._per_host[job.host] < self.max_per_host]
+        if not ready:
+            return None
+        if self.policy == "largest_first":
+            return max(ready, key=lambda job: job.expected)
+        if self.policy == "smallest_first":
+            return min(ready, key=lambda job: job.expected)
+        if self.policy == "fair":
+            return min(ready, key=lambda job: self._per_entry[job.entry])
+        return ready[0]
+
+    def _dispatch(self) -> None:
+        # Must be called with the lock held: start pending jobs while workers and host slots are free
+        while len(self._active) < self.max_workers:
+            job = self._next_job()
+            if job is None:
+                break
+            self._pending.remove(job)
+            self._active.add(job)
+            job.connections = self._connections(job)
+            self._per_host[job.host] += job.connections
+            self._per_entry[job.entry] += 1
+            self._executor.submit(self._work, job)
+
+    def _connections(self, job: _Job) -> int:
+        # Must be called with the lock held: number of segments the job may open, within its host's free slots
+        if not self.segmented or (self.decompress and job.file.filename.endswith(".gz")) or self.verify:
+            return 1
+        free = self.max_per_host - self._per_host[job.host]
+        return max(1, min(auto_segments(job.expected), free))
+
+    def _work(self, job: _Job) -> None:
+        def progress(done: int, total: Optional[int]) -> None:
+            self._advance(job, done, total)
+
+        try:
+            segmented = job.connections > 1
+            checksum = None
+            if self.verify:
+                checksum = job.file.expected_checksum(session=self.session, retry_policy=self.retry_policy,
+                                                      missing_ok=True)
+            size = job.file._download(job.output_path, session=self.session, retry_policy=self.retry_policy,
+                                      chunk_size=self.chunk_size, progress=progress, resume=self.resume,
+                                      segmented=segmented, segments=job.connections if segmented else None,
+                                      allocate=self.allocate, decompress=self.decompress, checksum=checksum,
+                                      store=self.store)
+            result = DownloadResult(job.file, job.output_path, job.index, size=size)
+        except Exception as e:
+            result = DownloadResult(job.file, job.output_path, job.index, error=e)
+        with self._lock:
+            self._active.discard(job)
+            self._per_host[job.host] -= job.connections
+            self._per_entry[job.entry] -= 1
+            if result.ok:
+                self._progress.files_done += 1
+            else:
+                self._progress.files_failed += 1
+            self._dispatch()
+            snapshot = self._snapshot()
+        job.future.set_result(result)
+        self._report(snapshot)
+
+    def _advance(self, job: _Job, done: int, total: Optional[int]) -> None:
+        with self._lock:
+            if job.done is None:
+                # The first report is where the download starts; those bytes are already on disk
+                self._progress.bytes_total -= done
+                job.done = done
+            elif done < job.done:
+                # Started over: the bytes dropped are downloaded again
+                self._progress.bytes_total += job.done - done
+                job.done = done
+            delta = done - job.done
+            self._progress.bytes_done += delta
+            job.done = done
+            if total is not None and total != job.total:
+                # The server's size replaces the estimate from size_kbytes
+                self._progress.bytes_total += total - (job.total if job.total is not None else job.expected)
+                job.total = total
+            snapshot = self._snapshot()
+        if self.bandwidth_limiter is not None and delta > 0:
+            self.bandwidth_limiter.acquire(delta)
+        self._report(snapshot)
+
+    def _snapshot(self) -> DownloadProgress:
+        # Must be called with the lock held
+        elapsed = time.monotonic() - self._started if self._started is not None else 0.0
+        return replace(self._progress, elapsed=elapsed)
+
+    def _report(self, snapshot: DownloadProgress) -> None:
+        if self._progress_callback is not None:
+            self._progress_callback(snapshot)
+
+    def close(self) -> None:
+        """
+        Wait for the running and pending downloads and stop the worker threads.
+        """
+        while True:
+            with self._lock:
+                futures = [job.future for job in self._pending]
+            if not futures:
+                break
+            for future in futures:
+                future.result()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> "DownloadScheduler":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __str__(self):
+        return f"<DownloadScheduler max_workers={self.max_workers}, max_per_host={self.max_per_host}>"
+
+    def __repr__(self):
+        return self.__str__()
@@ -0,0 +1,287 @@
+"""
+Shared, content-addressed store of downloaded files.
+
+Files are downloaded once into ``<root>/blobs/``, named after the SHA-256 of their content,
+and exposed at the paths callers ask for as hardlinks (or symlinks, or copies). An SQLite
+index maps each source URL to its blob and records when every blob was last used, so the
+store can be kept under a disk budget by evicting the least recently used blobs. A lock
+file per source URL makes concurrent processes wait for each other instead of downloading
+the same file twice.
+"""
+import errno
+import hashlib
+import os
+import shutil
+import stat
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, TYPE_CHECKING
+
+from emdb.cache import _SQLiteDatabase
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+if TYPE_CHECKING:
+    from emdb.models.files import BaseFile
+
+LINK_MODES = ("hardlink", "symlink", "copy")
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path: str) -> str:
+    """
+    SHA-256 hex digest of a file, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BlobStore(_SQLiteDatabase):
+    """
+    Local store of EMDB files, deduplicated by content and bounded by a disk budget.
+
+    A file is looked up by its source URL; on a miss it is downloaded into the store's staging
+    directory (resumable, like ``BaseFile.download``), hashed and moved to
+    ``blobs/<sha256[:2]>/<sha256>``. Identical content from different URLs is stored once.
+    Blobs are read-only: hardlinks to them share their data, so writing to a linked file would
+    change every copy. Evicting a blob does not affect hardlinks or copies made from it, but
+    leaves symlinks dangling, and the space of a hardlinked blob is only freed once every link
+    to it is gone.
+
+    Without ``fcntl`` (on Windows) only threads of the same process are kept from downloading
+    the same file twice.
+
+    Usage:
+        store = BlobStore("~/.cache/emdb-files", max_bytes=200 * 2 ** 30)
+        entry.primary_map.download("run1/", store=store)
+        entry.primary_map.download("run2/", store=store)  # a hardlink, no download
+    """
+
+    _SIZE_QUERY = "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs"
+
+    def __init__(self, root: str, max_bytes: Optional[int] = None, link: str = "hardlink"):
+        """
+        :param root: The store directory; created if missing.
+        :param max_bytes: Optional disk budget for the blobs. Least recently used blobs are evicted
+            when a new one would exceed it.
+        :param link: How files are exposed to callers: ``"hardlink"`` (falling back to a copy across
+            file systems), ``"symlink"`` or ``"copy"``.
+        :raises ValueError: If the link mode is unknown or the budget is negative.
+        """
+        if link not in LINK_MODES:
+            raise ValueError(f"link must be one of {', '.join(LINK_MODES)}")
+        if max_bytes is not None and max_bytes < 0:
+            raise ValueError("max_bytes must not be negative")
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.max_bytes = max_bytes
+        self.link = link
+        for directory in ("blobs", "staging", "locks"):
+            os.makedirs(os.path.join(self.root, directory), exist_ok=True)
+        self._open_database(os.path.join(self.root, "index.sqlite"))
+        self._key_locks: Dict[str, threading.Lock] = {}
+
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                "digest TEXT PRIMARY KEY, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sources ("
+                "key TEXT PRIMARY KEY, digest TEXT NOT NULL, fetched_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sources_digest ON sources (digest)")
+
+    @staticmethod
+    def source_key(file: "BaseFile", decompress: bool = False) -> str:
+        """
+        Key of a file in the index: its source URL, marked when the file is stored decompressed.
+        """
+        return f"{file.source_path}#gunzip" if decompress and file.filename.endswith(".gz") else file.source_path
+
+    def blob_path(self, digest: str) -> str:
+        """
+        Path of the blob with a given SHA-256 hex digest.
+        """
+        return os.path.join(self.root, "blobs", digest[:2], digest)
+
+    @contextmanager
+    def _locked(self, name: str) -> Iterator[None]:
+        """
+        Hold the lock called ``name`` against other threads and, with ``fcntl``, other processes.
+        """
+        with self._lock:
+            thread_lock = self._key_locks.setdefault(name, threading.Lock())
+        with thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.root, "locks", f"{name}.lock"), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def lookup(self, key: str) -> Optional[str]:
+        """
+        Find the blob stored for a source key and mark it as used.
+
+        :param key: The source key, see ``source_key``.
+        :return: The path of the blob, or None if it is not in the store.
+        """
+        row = self._connection().execute("SELECT digest FROM sources WHERE key = ?", (key,)).fetchone()
+        if row is None or not os.path.exists(self.blob_path(row[0])):
+            return None
+        with self._connection() as conn:
+            conn.execute("UPDATE blobs SET last_used = ? WHERE digest = ?", (time.time(), row[0]))
+        return self.blob_path(row[0])
+
+    def fetch(self, file: "BaseFile", output_path: str, link: Optional[str] = None, decompress: bool = False,
+              progress=None, **download_options) -> str:
+        """
+        Make a file available at ``output_path``, downloading it into the store if needed.
+
+        :param file: The file to fetch.
+        :param output_path: The local path to expose the file at. A path ending in ``/`` is a
+            directory the file is linked into under its own name. An existing file is replaced.
+        :param link: ``"hardlink"``, ``"symlink"`` or ``"copy"``. Defaults to the store's mode.
+        :param decompress: Store and expose the file gunzipped; kept apart from the compressed file.
+        :param progress: Optional callback receiving ``(bytes_written, total_bytes)``. A file already
+            in the store is reported once as complete.
+        :param download_options: Other options of ``BaseFile.download``, used on a miss. Files already
+            in the store are not downloaded or verified again.
+        :return: The path the file was exposed at.
+        :raises EMDBFileNotFoundError: If the file is not available.
+        :raises EMDBNetworkError: If the transfer failed.
+        """
+        if output_path.endswith("/"):
+            output_path += file.local_filename(decompress)
+        key = self.source_key(file, decompress)
+        name = hashlib.sha256(key.encode()).hexdigest()[:32]
+        downloaded = False
+        blob = self.lookup(key)
+        if blob is not None:
+            try:
+                self._expose(blob, output_path, link or self.link)
+            except FileNotFoundError:
+                # Evicted by another process between the lookup and the link
+                blob = None
+        if blob is None:
+            with self._locked(name):
+                # Another thread or process may have stored the file while we waited
+                blob = self.lookup(key)
+                if blob is None:
+                    blob = self._download(file, key, name, decompress, progress, download_options)
+                    downloaded = True
+                self._expose(blob, output_path, link or self.link)
+        with self._lock:
+            if downloaded:
+                self._stats.misses += 1
+            else:
+                self._stats.hits += 1
+        if progress is not None and not downloaded:
+            size = os.path.getsize(output_path)
+            progress(size, size)
+        return output_path
+
+    def _download(self, file: "BaseFile", key: str, name: str, decompress: bool, progress,
+                  download_options: dict) -> str:
+        staging_path = os.path.join(self.root, "staging", name)
+        file._download(staging_path, decompress=decompress, progress=progress, **download_options)
+        digest = file_digest(staging_path)
+        size = os.path.getsize(staging_path)
+        blob = self.blob_path(digest)
+        with self._locked(digest):
+            if os.path.exists(blob):
+                # Same content from another URL
+                os.remove(staging_path)
+            else:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                os.chmod(staging_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                os.replace(staging_path, blob)
+            now = time.time()
+            with self._connection() as conn:
+                conn.execute("INSERT OR REPLACE INTO blobs (digest, size, last_used) VALUES (?, ?, ?)",
+                             (digest, size, now))
+                conn.execute("INSERT OR REPLACE INTO sources (key, digest, fetched_at) VALUES (?, ?, ?)",
+                             (key, digest, now))
+        if self.max_bytes is not None:
+            self.evict(self.max_bytes, keep=digest)
+        return blob
+
+    @staticmethod
+    def _expose(blob: str, output_path: str, link: str) -> None:
+        directory = os.path.dirname(os.path.abspath(output_path))
+        os.makedirs(directory, exist_ok=True)
+        temp_path = f"{output_path}.link-{os.getpid()}-{threading.get_ident()}"
+        try:
+            if link == "hardlink":
+                try:
+                    os.link(blob, temp_path)
+                except OSError as e:
+                    if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                        raise
+                    shutil.copyfile(blob, temp_path)
+            elif link == "symlink":
+                os.symlink(blob, temp_path)
+            else:
+                shutil.copyfile(blob, temp_path)
+            os.replace(temp_path, output_path)
+        finally:
+            if os.path.lexists(temp_path):
+                os.remove(temp_path)
+
+    def evict(self, max_bytes: int, keep: Optional[str] = None) -> int:
+        """
+        Delete least recently used blobs until the store holds at most ``max_bytes``.
+
+        :param max_bytes: The size to shrink the store to.
+        :param keep: Optional digest of a blob never to evict, e.g. the one just stored.
+        :return: The number of bytes freed from the store.
+        """
+        freed = 0
+        with self._locked("evict"):
+            conn = self._connection()
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            if total <= max_bytes:
+                return 0
+            for digest, size in conn.execute("SELECT digest, size FROM blobs ORDER BY last_used").fetchall():
+                if total - freed <= max_bytes:
+                    break
+                if digest == keep:
+                    continue
+                self._remove(digest)
+                freed += size
+                with self._lock:
+                    self._stats.evictions += 1
+        return freed
+
+    def _remove(self, digest: str) -> None:
+        with self._connection() as conn:
+            conn.execute("DELETE FROM sources WHERE digest = ?", (digest,))
+            conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+        try:
+            os.remove(self.blob_path(digest))
+        except FileNotFoundError:
+            pass
+
+    def clear(self) -> None:
+        """
+        Delete every blob and index row. Files already exposed as hardlinks or copies are kept.
+        """
+        with self._locked("evict"):
+            for (digest,) in self._connection().execute("SELECT digest FROM blobs").fetchall():
+                self._remove(digest)
+
+    def __str__(self):
+        return f"<BlobStore root={self.root}, max_bytes={self.max_bytes}>"
+
+    def __repr__(self):
+        return self.__str__()
@@ -1,13 +1,32 @@
 import functools
+import json
+import threading
 import time
+from typing import Callable, Dict, Hashable, TypeVar
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from emdb.cache import SQLiteResponseCache
 from emdb.exceptions import (
     EMDBAPIError, EMDBNotFoundError, EMDBRateLimitError, EMDBNetworkError
 )
+from emdb.ratelimit import TokenBucketRateLimiter
+from emdb.retry import RetryPolicy
+
+API_BASE_URL = "https://www.ebi.ac.uk/emdb/api"
+DEFAULT_TIMEOUT = 10
+
+T = TypeVar("T")
 
 
 def fixed_sleep_rate_limit(min_interval_seconds: float):
+    """
+    Decorator spacing calls to a function at least ``min_interval_seconds`` apart.
+
+    The interval is tracked per decorated function and shared by every caller in the
+    process. The EMDB client uses a per-client :class:`TokenBucketRateLimiter` instead.
+    """
     last_call = [0]
 
     def decorator(func):
@@ -23,36 +42,204 @@ def fixed_sleep_rate_limit(min_interval_seconds: float):
     return decorator
 
 
-def make_request(endpoint: str, params=None, restype="json", retries=3):
-    url = f"https://www.ebi.ac.uk/emdb/api{endpoint}"
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
 
-    for attempt in range(1, retries + 1):
-        try:
-            response = requests.get(url, params=params, timeout=10)
-
-            if response.status_code == 404:
-                raise EMDBNotFoundError("Entry not found", 404, url)
-            elif response.status_code == 429:
-                raise EMDBRateLimitError("Rate limit exceeded", 429, url)
-            elif response.status_code >= 500:
-                raise EMDBAPIError("Server error", response.status_code, url)
-
-            response.raise_for_status()
-            if restype == "csv":
-                return response.text.strip()
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it is in
+    flight wait for it and receive the same result (or exception). Once the call
+    completes the key is forgotten, so later calls run again.
+
+    Usage:
+        flights = SingleFlight()
+        entry = flights.do(("entry", "EMD-1234"), lambda: fetch("EMD-1234"))
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.shared = 0
+
+    def do(self, key: Hashable, func: Callable[[], T]) -> T:
+        """
+        Run ``func`` unless a call with the same key is already in flight, in which
+        case wait for that call and return its result.
+
+        :param key: Identifies identical calls.
+        :param func: The function to run.
+        :return: The result of the call.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
             else:
-                return response.json()
+                self.shared += 1
 
-        except requests.Timeout:
-            if attempt < retries:
-                time.sleep(attempt)
-                continue
-            raise EMDBNetworkError(f"Request timed out while accessing {url}")
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = func()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+
+def create_session(pool_connections: int = 10, pool_maxsize: int = 10, pool_block: bool = False,
+                   keep_alive: bool = True) -> requests.Session:
+    """
+    Create a requests session backed by a pool of keep-alive connections.
+
+    :param pool_connections: Number of hosts to keep a connection pool for.
+    :param pool_maxsize: Maximum number of connections kept open per host.
+    :param pool_block: If True, wait for a free connection when a host pool is exhausted
+        instead of opening a throwaway one.
+    :param keep_alive: If False, ask the server to close the connection after every response.
+    :return: A configured requests.Session.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+    return session
 
+
+def send_with_retry(http, url: str, method: str = "GET", retry_policy: RetryPolicy = None,
+                    rate_limiter: TokenBucketRateLimiter = None, **kwargs) -> requests.Response:
+    """
+    Send an HTTP request, retrying network errors and retryable status codes.
+
+    Retries follow ``retry_policy``: exponential backoff with jitter, ``Retry-After`` honored,
+    idempotent methods only, bounded by a maximum number of attempts and elapsed time. When
+    the server answers 429 the shared ``rate_limiter`` is paused for the retry delay, so every
+    request going through it slows down.
+
+    :param http: A requests.Session, or the requests module.
+    :param url: The URL to request.
+    :param method: HTTP method.
+    :param retry_policy: The retry policy. Defaults to ``RetryPolicy()``.
+    :param rate_limiter: Optional rate limiter to take a token from before each attempt.
+    :param kwargs: Extra arguments passed to the request (params, headers, timeout, stream, ...).
+    :return: The first response that is not retried. This may still carry a retryable
+        status code if the policy gave up.
+    :raises EMDBNetworkError: If the last attempt failed with a network error.
+    """
+    policy = retry_policy if retry_policy is not None else RetryPolicy()
+    start = time.monotonic()
+    attempt = 0
+
+    while True:
+        attempt += 1
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+
+        retry_after = None
+        try:
+            response = getattr(http, method.lower())(url, **kwargs)
+        except requests.Timeout:
+            error = EMDBNetworkError(f"Request timed out while accessing {url}")
+            response = None
         except requests.exceptions.RequestException as e:
-            raise EMDBNetworkError(f"Network error while accessing {url}: {e}")
+            error = EMDBNetworkError(f"Network error while accessing {url}: {e}")
+            response = None
+        else:
+            if not policy.is_retryable_status(response.status_code):
+                return response
+            retry_after = policy.parse_retry_after(response.headers.get("Retry-After"))
+
+        delay = policy.delay(attempt, retry_after)
+        if not policy.should_retry(method, attempt, time.monotonic() - start, delay):
+            if response is None:
+                raise error
+            return response
+
+        if response is not None:
+            response.close()
+        if response is not None and response.status_code == 429 and rate_limiter is not None:
+            # Slow down the whole client; the next acquire() waits out the delay
+            rate_limiter.penalize(delay)
+        else:
+            time.sleep(delay)
+
+
+def _decode_payload(text: str, restype: str):
+    if restype == "csv":
+        return text.strip()
+    return json.loads(text)
+
+
+def make_request(endpoint: str, params=None, restype="json", retries=3, session: requests.Session = None,
+                 timeout=DEFAULT_TIMEOUT, base_url: str = API_BASE_URL,
+                 rate_limiter: TokenBucketRateLimiter = None, retry_policy: RetryPolicy = None,
+                 response_cache: SQLiteResponseCache = None):
+    url = f"{base_url}{endpoint}"
+    http = session if session is not None else requests
+    if retry_policy is None:
+        retry_policy = RetryPolicy(max_attempts=retries)
+
+    # restype="stream" returns the open response for the caller to read and close; it is never cached
+    stream = restype == "stream"
+    if stream:
+        response_cache = None
+
+    # Fresh cached responses skip the rate limiter and the network; stale ones are revalidated
+    headers = None
+    cached = response_cache.lookup(endpoint, url, params) if response_cache is not None else None
+    if cached is not None:
+        if cached.fresh:
+            return _decode_payload(cached.body.decode("utf-8"), restype)
+        headers = cached.validators
+
+    response = send_with_retry(http, url, params=params, headers=headers, timeout=timeout,
+                               retry_policy=retry_policy, rate_limiter=rate_limiter,
+                               **({"stream": True} if stream else {}))
+    if stream and response.status_code >= 400:
+        response.close()
 
-        except Exception as e:
-            raise EMDBAPIError(f"An unexpected error occurred: {str(e)}", url=url)
+    if response.status_code == 304 and cached is not None:
+        response_cache.touch(url, params)
+        return _decode_payload(cached.body.decode("utf-8"), restype)
+    elif response.status_code == 404:
+        raise EMDBNotFoundError("Entry not found", 404, url)
+    elif response.status_code == 429:
+        raise EMDBRateLimitError("Rate limit exceeded", 429, url)
+    elif response.status_code >= 500:
+        raise EMDBAPIError("Server error", response.status_code, url)
 
+    try:
+        response.raise_for_status()
+        if stream:
+            # Let reads of response.raw undo any gzip/deflate content encoding
+            response.raw.decode_content = True
+            return response
+        if restype == "csv":
+            result = response.text.strip()
+        else:
+            result = response.json()
+    except Exception as e:
+        raise EMDBAPIError(f"An unexpected error occurred: {str(e)}", response.status_code, url)
 
+    if response_cache is not None:
+        response_cache.store(endpoint, url, params, response.content,
+                             etag=response.headers.get("ETag"),
+                             last_modified=response.headers.get("Last-Modified"))
+    return result
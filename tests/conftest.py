@@ -0,0 +1,25 @@
+"""Shared pytest fixtures."""
+import pytest
+
+from tests.standin_server import StandInServer
+
+
+@pytest.fixture
+def standin_server():
+    """
+    Factory starting local stand-in EMDB servers, shut down after the test.
+
+    Usage:
+        server = standin_server(delay=0.2)
+        client = EMDB(base_url=server.api_url)
+    """
+    servers = []
+
+    def start(**kwargs) -> StandInServer:
+        server = StandInServer(**kwargs).__enter__()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.__exit__(None, None, None)
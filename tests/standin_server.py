@@ -0,0 +1,198 @@
+"""
+A small local HTTP server that stands in for the EMDB API and FTP hosts in tests and benchmarks.
+
+It speaks HTTP/1.1 with keep-alive, so clients that pool connections can reuse them.
+"""
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+
+from emdb.models.files import FigureFile
+
+
+def minimal_entry(emdb_id: str) -> dict:
+    """
+    Smallest /entry payload that EMDBEntry.from_api accepts.
+    """
+    return {"emdb_id": emdb_id, "map": {"file": f"emd_{emdb_id[4:]}.map.gz", "size_kbytes": 1}}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, keep-alive
+    # connections stall on Nagle + delayed ACK for ~40 ms per response.
+    disable_nagle_algorithm = True
+    routes: Dict[str, Callable[["StandInHandler", re.Match], None]] = {}
+    delay: float = 0.0
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        with self.server.lock:
+            self.server.requests[path] += 1
+        if self.delay:
+            time.sleep(self.delay)
+        for pattern, handler in self.routes.items():
+            match = re.fullmatch(pattern, path)
+            if match:
+                handler(self, match)
+                return
+        self.send_body(404, b"not found", "text/plain")
+
+    # Routes check self.command and leave out the body of HEAD responses
+    do_HEAD = do_GET
+
+    def send_body(self, status: int, body: bytes, content_type: str = "application/json", headers: Optional[dict] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RangedFile:
+    """
+    Stand-in file under ``/files/`` honoring ``Range`` and ``If-Range``; the n-th response drops
+    the connection after ``drops[n]`` bytes. ``HEAD`` requests are answered with ``head_status``.
+    """
+
+    def __init__(self, data: bytes, drops=(), etag: str = '"v1"', honor_ranges: bool = True,
+                 head_status: int = 200):
+        self.data = data
+        self.drops = list(drops)
+        self.etag = etag
+        self.honor_ranges = honor_ranges
+        self.head_status = head_status
+        # Range header of every GET, None for a whole file
+        self.ranges = []
+        self.heads = 0
+        # Body bytes written, across all responses
+        self.sent = 0
+
+    def route(self, handler: StandInHandler, match: re.Match) -> None:
+        if handler.command == "HEAD":
+            self.heads += 1
+            if self.head_status != 200:
+                handler.send_body(self.head_status, b"", "text/plain")
+                return
+            handler.send_response(200)
+            handler.send_header("Content-Length", str(len(self.data)))
+            handler.send_header("ETag", self.etag)
+            if self.honor_ranges:
+                handler.send_header("Accept-Ranges", "bytes")
+            handler.end_headers()
+            return
+        requested = handler.headers.get("Range")
+        self.ranges.append(requested)
+        start, end = 0, len(self.data) - 1
+        if self.honor_ranges and requested and handler.headers.get("If-Range") in (None, self.etag):
+            first, _, last = requested[len("bytes="):].partition("-")
+            start = int(first)
+            end = min(end, int(last)) if last else end
+            if start >= len(self.data):
+                handler.send_body(416, b"", headers={"Content-Range": f"bytes */{len(self.data)}"})
+                return
+            handler.send_response(206)
+            handler.send_header("Content-Range", f"bytes {start}-{end}/{len(self.data)}")
+        else:
+            handler.send_response(200)
+        if self.honor_ranges:
+            handler.send_header("Accept-Ranges", "bytes")
+        handler.send_header("Content-Length", str(end + 1 - start))
+        handler.send_header("ETag", self.etag)
+        handler.end_headers()
+        body = self.data[start:end + 1]
+        drop = self.drops.pop(0) if self.drops else None
+        if drop is not None:
+            body = body[:drop]
+            handler.close_connection = True
+        try:
+            handler.wfile.write(body)
+            self.sent += len(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client closed the response before reading all of it
+            handler.close_connection = True
+
+    @property
+    def routes(self) -> Dict[str, Callable]:
+        return {r"/files/(.+)": self.route}
+
+
+def served_file(server: "StandInServer", filename: str = "400_1234.gif", client=None, emdb_id: str = "EMD-1234",
+                size_kbytes: Optional[float] = None) -> FigureFile:
+    """
+    A file of ``emdb_id`` served by ``server`` under ``/files/<emdb_id>/<filename>``.
+    """
+    file = FigureFile(filename=filename, size_kbytes=size_kbytes)
+    file._emdb_id = emdb_id
+    file._client = client
+    file._BASE_FIGURES_URL = f"{server.url}/files"
+    return file
+
+
+def _entry_route(handler: StandInHandler, match: re.Match) -> None:
+    handler.send_body(200, json.dumps(minimal_entry(match.group(1))).encode())
+
+
+class StandInServer:
+    """
+    Runs a ThreadingHTTPServer on localhost in a background thread.
+
+    Usage:
+        with StandInServer() as server:
+            client = EMDB(base_url=server.api_url)
+    """
+
+    def __init__(self, routes: Optional[Dict[str, Callable]] = None, delay: float = 0.0):
+        """
+        :param routes: Extra ``{path regex: handler(request_handler, match)}`` routes.
+        :param delay: Seconds to wait before answering each request.
+        """
+        handler = type("Handler", (StandInHandler,), {
+            # Extra routes are matched before the default entry route
+            "routes": {**(routes or {}), r"/emdb/api/entry/(EMD-\d+)": _entry_route},
+            "delay": delay,
+        })
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.httpd.daemon_threads = True
+        self.httpd.lock = threading.Lock()
+        self.httpd.requests = Counter()
+        self._thread = threading.Thread(target=self.httpd.serve_forever, kwargs={"poll_interval": 0.05},
+                                        daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self) -> str:
+        return f"{self.url}/emdb/api"
+
+    @property
+    def requests(self) -> Counter:
+        """
+        Number of requests received, per path.
+        """
+        return self.httpd.requests
+
+    @property
+    def request_count(self) -> int:
+        return sum(self.httpd.requests.values())
+
+    def __enter__(self) -> "StandInServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
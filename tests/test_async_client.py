@@ -0,0 +1,183 @@
+"""Unit tests for the asyncio EMDB client."""
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from emdb.async_client import AsyncEMDB  # noqa: E402
+from emdb.client import EMDB  # noqa: E402
+from emdb.exceptions import EMDBAPIError, EMDBInvalidIDError, EMDBFileNotFoundError, EMDBNetworkError  # noqa: E402
+from emdb.models.entry import EMDBEntry  # noqa: E402
+from emdb.models.files import FigureFile  # noqa: E402
+from emdb.models.search import EMDBSearchResults  # noqa: E402
+from emdb.retry import RetryPolicy  # noqa: E402
+
+
+def make_client(handler, **kwargs):
+    kwargs.setdefault("rate_limit", 1000)
+    kwargs.setdefault("burst", 1000)
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return AsyncEMDB(http_client=http_client, **kwargs)
+
+
+def entry_handler(request):
+    if request.url.path.startswith("/emdb/api/entry/"):
+        emdb_id = request.url.path.rsplit("/", 1)[-1]
+        return httpx.Response(200, json={"emdb_id": emdb_id})
+    return httpx.Response(404)
+
+
+class TestAsyncEMDB:
+    """Tests for the AsyncEMDB client."""
+
+    def test_get_entry_returns_model(self):
+        """Test that get_entry returns an EMDBEntry bound to a blocking sibling client."""
+        async def run():
+            async with make_client(entry_handler) as client:
+                return await client.get_entry("EMD-1234")
+
+        entry = asyncio.run(run())
+
+        assert isinstance(entry, EMDBEntry)
+        assert entry.id == "EMD-1234"
+        assert isinstance(entry._client, EMDB)
+
+    def test_rate_limiter_is_shared_with_sync_client(self):
+        """Test that the async client and its blocking sibling throttle on the same bucket."""
+        client = make_client(entry_handler)
+
+        assert client.sync_client.rate_limiter is client.rate_limiter
+
+    def test_requests_wait_on_rate_limiter(self):
+        """Test that concurrent requests are spread out by the token bucket."""
+        async def run():
+            async with make_client(entry_handler, rate_limit=20, burst=1) as client:
+                await asyncio.gather(*(client.get_entry(f"EMD-{1000 + i}") for i in range(5)))
+                return client.rate_limiter.stats
+
+        stats = asyncio.run(run())
+
+        assert stats.acquired == 5
+        assert stats.throttled == 4
+        assert stats.max_wait_seconds == pytest.approx(0.2, abs=0.02)
+
+    def test_server_errors_are_retried(self):
+        """Test that transient 5xx responses are retried with the client's policy."""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(503) if len(calls) < 3 else entry_handler(request)
+
+        async def run():
+            policy = RetryPolicy(backoff_factor=0, jitter=False)
+            async with make_client(handler, retry_policy=policy) as client:
+                return await client.get_entry("EMD-1234")
+
+        assert asyncio.run(run()).id == "EMD-1234"
+        assert len(calls) == 3
+
+    def test_get_entry_invalid_id(self):
+        """Test that invalid EMDB IDs are rejected before any request."""
+        async def run():
+            async with make_client(entry_handler) as client:
+                await client.get_entry("1234")
+
+        with pytest.raises(EMDBInvalidIDError):
+            asyncio.run(run())
+
+    def test_get_entry_not_found(self):
+        """Test that 404 responses raise EMDBAPIError."""
+        async def run():
+            async with make_client(lambda request: httpx.Response(404)) as client:
+                await client.get_entry("EMD-9999")
+
+        with pytest.raises(EMDBAPIError):
+            asyncio.run(run())
+
+    def test_search_and_csv_search(self):
+        """Test that search results and CSV tables are parsed like the blocking client."""
+        def handler(request):
+            assert request.url.params["wt"] == "csv"
+            return httpx.Response(200, text="emdb_id,resolution\nEMD-1234,3.5\nEMD-5678,4.2")
+
+        async def run():
+            async with make_client(handler) as client:
+                return await client.search("HIV"), await client.csv_search("HIV", fields="emdb_id,resolution")
+
+        results, df = asyncio.run(run())
+
+        assert isinstance(results, EMDBSearchResults)
+        assert len(df) == 2
+        assert df.iloc[1]["resolution"] == 4.2
+
+    def test_count_and_facets(self):
+        """Test that count and facets ask for zero rows and parse the Solr JSON."""
+        def handler(request):
+            assert request.url.params["rows"] == "0"
+            body = {"response": {"numFound": 7, "docs": []},
+                    "facet_counts": {"facet_fields": {"structure_determination_method": ["helical", 7]}}}
+            return httpx.Response(200, json=body)
+
+        async def run():
+            async with make_client(handler) as client:
+                return await client.count("HIV"), await client.facets("HIV", ranges=None)
+
+        count, facets = asyncio.run(run())
+
+        assert count == 7
+        assert facets.counts("structure_determination_method") == {"helical": 7}
+
+    def test_concurrency_is_bounded(self):
+        """Test that no more than max_concurrency requests are in flight at once."""
+        in_flight = {"now": 0, "max": 0}
+
+        async def handler(request):
+            in_flight["now"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["now"])
+            await asyncio.sleep(0.01)
+            in_flight["now"] -= 1
+            return entry_handler(request)
+
+        async def run():
+            async with make_client(handler, max_concurrency=5) as client:
+                return await asyncio.gather(*(client.get_entry(f"EMD-{1000 + i}") for i in range(50)))
+
+        entries = asyncio.run(run())
+
+        assert [e.id for e in entries] == [f"EMD-{1000 + i}" for i in range(50)]
+        assert in_flight["max"] == 5
+
+    def test_download_file(self, tmp_path):
+        """Test that files are streamed to disk."""
+        figure = FigureFile(filename="400_1234.gif")
+        figure._emdb_id = "EMD-1234"
+
+        async def run(handler):
+            async with make_client(handler) as client:
+                return await client.download_file(figure, f"{tmp_path}/")
+
+        path = asyncio.run(run(lambda request: httpx.Response(200, content=b"GIF89a" * 1000)))
+        assert open(path, "rb").read() == b"GIF89a" * 1000
+
+        with pytest.raises(EMDBFileNotFoundError):
+            asyncio.run(run(lambda request: httpx.Response(404)))
+
+    def test_failed_download_leaves_no_file(self, tmp_path):
+        """Test that a transfer failing midway removes its .part file and leaves nothing at the output path."""
+        figure = FigureFile(filename="400_1234.gif")
+        figure._emdb_id = "EMD-1234"
+
+        async def dropped():
+            yield b"GIF89a" * 1000
+            raise httpx.ReadError("connection reset")
+
+        async def run():
+            async with make_client(lambda request: httpx.Response(200, content=dropped())) as client:
+                return await client.download_file(figure, f"{tmp_path}/")
+
+        with pytest.raises(EMDBNetworkError):
+            asyncio.run(run())
+
+        assert list(tmp_path.iterdir()) == []
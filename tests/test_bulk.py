@@ -0,0 +1,120 @@
+"""Unit tests for bulk fetching."""
+import threading
+import time
+
+from emdb.bulk import BulkResult, iter_bulk, run_bulk
+from emdb.client import EMDB
+from emdb.exceptions import EMDBInvalidIDError, EMDBNotFoundError
+from emdb.models.entry import EMDBEntry
+
+
+class TestBulkHelpers:
+    """Tests for run_bulk and iter_bulk."""
+
+    def test_run_bulk_keeps_input_order_and_errors(self):
+        """Test that results are returned in input order with errors captured per ID."""
+        def fetch(emdb_id):
+            time.sleep(0.01 * (5 - int(emdb_id[-1])))
+            if emdb_id.endswith("3"):
+                raise ValueError("boom")
+            return emdb_id.lower()
+
+        results = run_bulk(fetch, [f"EMD-{i}" for i in range(5)], max_workers=5)
+
+        assert [r.emdb_id for r in results] == [f"EMD-{i}" for i in range(5)]
+        assert [r.ok for r in results] == [True, True, True, False, True]
+        assert results[0].value == "emd-0"
+        assert isinstance(results[3].error, ValueError)
+
+    def test_iter_bulk_yields_in_completion_order(self):
+        """Test that the iterator yields fast results before slow ones."""
+        def fetch(emdb_id):
+            time.sleep(0.2 if emdb_id == "slow" else 0.01)
+            return emdb_id
+
+        results = list(iter_bulk(fetch, ["slow", "fast"], max_workers=2))
+
+        assert [r.emdb_id for r in results] == ["fast", "slow"]
+        assert [r.index for r in results] == [1, 0]
+
+    def test_iter_bulk_bounds_work_in_flight(self):
+        """Test that a lazy ID iterable is consumed incrementally."""
+        consumed = []
+        active = {"now": 0, "max": 0}
+        lock = threading.Lock()
+
+        def ids():
+            for i in range(50):
+                consumed.append(i)
+                yield str(i)
+
+        def fetch(emdb_id):
+            with lock:
+                active["now"] += 1
+                active["max"] = max(active["max"], active["now"])
+            time.sleep(0.005)
+            with lock:
+                active["now"] -= 1
+            return emdb_id
+
+        iterator = iter_bulk(fetch, ids(), max_workers=3)
+        next(iterator)
+        assert len(consumed) <= 7
+
+        assert len(list(iterator)) == 49
+        assert active["max"] <= 3
+
+    def test_bulk_result_repr(self):
+        """Test the string representation of results."""
+        assert str(BulkResult("EMD-1", 0, value=1)) == "<BulkResult EMD-1 1>"
+        assert "error=" in str(BulkResult("EMD-1", 0, error=ValueError("x")))
+
+
+class TestClientBulk:
+    """Tests for the EMDB bulk methods against a stand-in server."""
+
+    def test_get_entries(self, standin_server):
+        """Test that entries come back in input order with per-ID errors."""
+        server = standin_server(routes={r"/emdb/api/entry/EMD-404": lambda h, m: h.send_body(404, b"{}")})
+        client = EMDB(base_url=server.api_url, rate_limit=1000, burst=10)
+
+        results = client.get_entries(["EMD-1000", "EMD-404", "bad-id", "EMD-1001"])
+
+        assert [r.emdb_id for r in results] == ["EMD-1000", "EMD-404", "bad-id", "EMD-1001"]
+        assert isinstance(results[0].value, EMDBEntry)
+        assert results[0].value.id == "EMD-1000"
+        assert isinstance(results[1].error, EMDBNotFoundError)
+        assert isinstance(results[2].error, EMDBInvalidIDError)
+        assert results[3].value.id == "EMD-1001"
+
+    def test_get_entries_runs_concurrently(self, standin_server):
+        """Test that the worker pool overlaps slow requests."""
+        server = standin_server(delay=0.1)
+        client = EMDB(base_url=server.api_url, rate_limit=1000, burst=10)
+
+        start = time.monotonic()
+        results = client.get_entries([f"EMD-{1000 + i}" for i in range(8)], max_workers=8)
+        elapsed = time.monotonic() - start
+
+        assert all(r.ok for r in results)
+        assert elapsed < 0.5
+
+    def test_get_entries_respects_shared_rate_limit(self, standin_server):
+        """Test that all workers draw from the client's rate limiter."""
+        server = standin_server()
+        client = EMDB(base_url=server.api_url, rate_limit=20, burst=1)
+
+        start = time.monotonic()
+        client.get_entries([f"EMD-{1000 + i}" for i in range(5)], max_workers=5)
+
+        assert time.monotonic() - start >= 0.19
+        assert client.rate_limiter.stats.acquired == 5
+
+    def test_iter_entries(self, standin_server):
+        """Test the iterator form."""
+        server = standin_server()
+        client = EMDB(base_url=server.api_url, rate_limit=1000, burst=10)
+
+        ids = sorted(r.value.id for r in client.iter_entries(["EMD-1000", "EMD-1001"]))
+
+        assert ids == ["EMD-1000", "EMD-1001"]
@@ -0,0 +1,244 @@
+"""Unit tests for the EMDB caches."""
+import threading
+import time
+
+import responses
+
+from emdb.cache import MemoryCache, SQLiteResponseCache, approximate_size
+from emdb.client import EMDB
+
+
+class TestMemoryCache:
+    """Tests for MemoryCache."""
+
+    def test_hit_and_miss_counters(self):
+        """Test that lookups are counted as hits and misses."""
+        cache = MemoryCache()
+        cache.set("entry", "EMD-1234", "value", size=10)
+
+        assert cache.get("entry", "EMD-1234") == "value"
+        assert cache.get("entry", "EMD-5678") is None
+        assert cache.get("validation", "EMD-1234") is None
+
+        stats = cache.stats
+        assert (stats.hits, stats.misses, stats.entries, stats.bytes) == (1, 2, 1, 10)
+
+    def test_lru_eviction_by_count(self):
+        """Test that the least recently used item is evicted first."""
+        cache = MemoryCache(max_entries=2)
+        cache.set("entry", "a", 1)
+        cache.set("entry", "b", 2)
+        cache.get("entry", "a")
+        cache.set("entry", "c", 3)
+
+        assert cache.get("entry", "b") is None
+        assert cache.get("entry", "a") == 1
+        assert cache.get("entry", "c") == 3
+        assert cache.stats.evictions == 1
+
+    def test_eviction_by_bytes(self):
+        """Test that the byte budget is enforced and oversized items are not cached."""
+        cache = MemoryCache(max_bytes=100)
+        cache.set("entry", "a", 1, size=60)
+        cache.set("entry", "b", 2, size=60)
+        cache.set("entry", "huge", 3, size=101)
+
+        assert len(cache) == 1
+        assert cache.get("entry", "b") == 2
+        assert cache.get("entry", "huge") is None
+        assert cache.stats.bytes == 60
+
+    def test_per_endpoint_ttl(self):
+        """Test that items expire after their endpoint's time-to-live."""
+        cache = MemoryCache(ttl={"entry": 0.05, "annotations": 60})
+        cache.set("entry", "EMD-1234", "entry")
+        cache.set("annotations", "EMD-1234", "annotations")
+        time.sleep(0.06)
+
+        assert cache.get("entry", "EMD-1234") is None
+        assert cache.get("annotations", "EMD-1234") == "annotations"
+        assert cache.stats.expirations == 1
+
+    def test_invalidate(self):
+        """Test dropping one ID for one or all endpoints."""
+        cache = MemoryCache()
+        for endpoint in ("entry", "validation", "annotations"):
+            cache.set(endpoint, "EMD-1234", endpoint)
+
+        cache.invalidate("EMD-1234", endpoint="entry")
+        assert cache.get("entry", "EMD-1234") is None
+        assert cache.get("validation", "EMD-1234") == "validation"
+
+        cache.invalidate("EMD-1234")
+        assert len(cache) == 0
+
+    def test_approximate_size(self):
+        """Test payload size estimation."""
+        assert approximate_size("abcd") == 4
+        assert approximate_size({"a": 1}) == len('{"a":1}')
+
+
+class TestClientMemoryCache:
+    """Tests for the EMDB client with an in-memory cache."""
+
+    @responses.activate
+    def test_cache_hit_skips_network_and_rate_limiter(self):
+        """Test that repeated lookups are served from the cache."""
+        responses.add(responses.GET, "https://www.ebi.ac.uk/emdb/api/entry/EMD-1234",
+                      json={"emdb_id": "EMD-1234"}, status=200)
+        client = EMDB(cache=MemoryCache())
+
+        first = client.get_entry("EMD-1234")
+        second = client.get_entry("EMD-1234")
+
+        assert second is first
+        assert len(responses.calls) == 1
+        assert client.rate_limiter.stats.acquired == 1
+        assert client.cache.stats.hits == 1
+
+    @responses.activate
+    def test_endpoints_are_cached_separately(self):
+        """Test that entries and annotations for one ID use different cache keys."""
+        responses.add(responses.GET, "https://www.ebi.ac.uk/emdb/api/entry/EMD-1234",
+                      json={"emdb_id": "EMD-1234"}, status=200)
+        responses.add(responses.GET, "https://www.ebi.ac.uk/emdb/api/annotations/EMD-1234",
+                      json={"emdb_id": "EMD-1234"}, status=200)
+        client = EMDB(cache=MemoryCache())
+
+        client.get_entry("EMD-1234")
+        client.get_annotations("EMD-1234")
+        client.get_annotations("EMD-1234")
+
+        assert len(responses.calls) == 2
+        assert client.cache.stats.entries == 2
+
+    @responses.activate
+    def test_no_cache_by_default(self):
+        """Test that caching is opt-in."""
+        responses.add(responses.GET, "https://www.ebi.ac.uk/emdb/api/entry/EMD-1234",
+                      json={"emdb_id": "EMD-1234"}, status=200)
+        client = EMDB(rate_limit=1000)
+
+        client.get_entry("EMD-1234")
+        client.get_entry("EMD-1234")
+
+        assert client.cache is None
+        assert len(responses.calls) == 2
+
+
+ENTRY_URL = "https://www.ebi.ac.uk/emdb/api/entry/EMD-1234"
+
+
+class TestSQLiteResponseCache:
+    """Tests for SQLiteResponseCache."""
+
+    def test_store_and_lookup(self, tmp_path):
+        """Test that stored payloads are returned fresh and compressed on disk."""
+        cache = SQLiteResponseCache(str(tmp_path / "cache.sqlite"))
+        body = b'{"emdb_id": "EMD-1234", "padding": "' + b"x" * 10000 + b'"}'
+        cache.store("/entry/EMD-1234", ENTRY_URL, None, body, etag='"abc"')
+
+        cached = cache.lookup("/entry/EMD-1234", ENTRY_URL)
+
+        assert cached.body == body
+        assert cached.fresh
+        assert cached.validators == {"If-None-Match": '"abc"'}
+        assert cache.stats.entries == 1
+        assert cache.stats.bytes < len(body) / 10
+
+    def test_params_are_part_of_the_key(self, tmp_path):
+        """Test that the same URL with different parameters is cached separately."""
+        cache = SQLiteResponseCache(str(tmp_path / "cache.sqlite"))
+        cache.store("/analysis/EMD-1234", ENTRY_URL, {"information": "all"}, b"{}")
+
+        assert cache.lookup("/analysis/EMD-1234", ENTRY_URL, {"information": "all"}) is not None
+        assert cache.lookup("/analysis/EMD-1234", ENTRY_URL) is None
+
+    def test_stale_response_without_validators_is_a_miss(self, tmp_path):
+        """Test that expired payloads without ETag or Last-Modified are refetched."""
+        cache = SQLiteResponseCache(str(tmp_path / "cache.sqlite"), ttl={"entry": 0.05})
+        cache.store("/entry/EMD-1234", ENTRY_URL, None, b"{}")
+        cache.store("/entry/EMD-5678", ENTRY_URL + "5678", None, b"{}", last_modified="Mon, 01 Jan 2024 00:00:00 GMT")
+        time.sleep(0.06)
+
+        assert cache.lookup("/entry/EMD-1234", ENTRY_URL) is None
+        stale = cache.lookup("/entry/EMD-5678", ENTRY_URL + "5678")
+        assert not stale.fresh
+        assert stale.validators == {"If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT"}
+
+    def test_zero_ttl_endpoints_are_not_cached(self, tmp_path):
+        """Test that search responses are not cached by default."""
+        cache = SQLiteResponseCache(str(tmp_path / "cache.sqlite"))
+        cache.store("/search/HIV", "https://www.ebi.ac.uk/emdb/api/search/HIV", None, b"emdb_id")
+
+        assert cache.lookup("/search/HIV", "https://www.ebi.ac.uk/emdb/api/search/HIV") is None
+        assert cache.stats.entries == 0
+
+    def test_invalidate_entry(self, tmp_path):
+        """Test that invalidating an ID drops all its endpoints."""
+        cache = SQLiteResponseCache(str(tmp_path / "cache.sqlite"))
+        for endpoint in ("/entry/EMD-1234", "/analysis/EMD-1234", "/annotations/EMD-1234", "/entry/EMD-12345"):
+            cache.store(endpoint, f"https://www.ebi.ac.uk/emdb/api{endpoint}", None, b"{}")
+
+        assert cache.invalidate("EMD-1234") == 3
+        assert cache.stats.entries == 1
+
+    def test_shared_between_instances_and_threads(self, tmp_path):
+        """Test that separate cache objects on one file, used from many threads, see each other's writes."""
+        path = str(tmp_path / "cache.sqlite")
+        writer = SQLiteResponseCache(path)
+        reader = SQLiteResponseCache(path)
+        errors = []
+
+        def work(i):
+            try:
+                url = f"{ENTRY_URL}{i}"
+                writer.store(f"/entry/EMD-{i}", url, None, str(i).encode())
+                assert reader.lookup(f"/entry/EMD-{i}", url).body == str(i).encode()
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(e)
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert errors == []
+        assert reader.stats.entries == 20
+        writer.close()
+        reader.close()
+
+
+class TestClientResponseCache:
+    """Tests for the EMDB client with a persistent response cache."""
+
+    @responses.activate
+    def test_warm_cache_survives_new_client(self, tmp_path):
+        """Test that a new client on a warm cache file does not go to the network."""
+        responses.add(responses.GET, ENTRY_URL, json={"emdb_id": "EMD-1234"}, status=200)
+        path = str(tmp_path / "cache.sqlite")
+
+        EMDB(response_cache=SQLiteResponseCache(path)).get_entry("EMD-1234")
+        client = EMDB(response_cache=SQLiteResponseCache(path))
+        entry = client.get_entry("EMD-1234")
+
+        assert entry.id == "EMD-1234"
+        assert len(responses.calls) == 1
+        assert client.rate_limiter.stats.acquired == 0
+
+    @responses.activate
+    def test_stale_response_is_revalidated(self, tmp_path):
+        """Test that a stale response is revalidated with its ETag and reused on 304."""
+        responses.add(responses.GET, ENTRY_URL, json={"emdb_id": "EMD-1234"}, status=200, headers={"ETag": '"v1"'})
+        responses.add(responses.GET, ENTRY_URL, status=304)
+        cache = SQLiteResponseCache(str(tmp_path / "cache.sqlite"), ttl={"entry": 0.01})
+        client = EMDB(response_cache=cache, rate_limit=1000)
+
+        client.get_entry("EMD-1234")
+        time.sleep(0.02)
+        entry = client.get_entry("EMD-1234")
+
+        assert entry.id == "EMD-1234"
+        assert responses.calls[1].request.headers["If-None-Match"] == '"v1"'
+        assert cache.stats.revalidations == 1
@@ -1,4 +1,10 @@
 """Unit tests for EMDB client module."""
+import gzip
+import json
+import threading
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
 import pytest
 import responses
 from unittest.mock import patch, MagicMock
@@ -12,6 +18,7 @@ from emdb.models.entry import EMDBEntry
 from emdb.models.validation import EMDBValidation
 from emdb.models.annotations import EMDBAnnotations
 from emdb.models.search import EMDBSearchResults
+from emdb.ratelimit import TokenBucketRateLimiter
 
 
 class TestEMDBClient:
@@ -22,6 +29,64 @@ class TestEMDBClient:
         client = EMDB()
         assert client is not None
 
+    def test_emdb_client_owns_pooled_session(self):
+        """Test that the client builds one pooled session from its options."""
+        client = EMDB(pool_connections=2, pool_maxsize=5, timeout=(3, 30))
+
+        adapter = client.session.get_adapter("https://www.ebi.ac.uk/emdb/api")
+        assert adapter._pool_connections == 2
+        assert adapter._pool_maxsize == 5
+        assert client.timeout == (3, 30)
+
+    def test_emdb_client_context_manager_closes_session(self):
+        """Test that leaving the context manager closes the session."""
+        with EMDB() as client:
+            session = client.session
+        with patch.object(session, "close") as mock_close:
+            client.close()
+        mock_close.assert_called_once()
+
+    def test_emdb_client_owns_rate_limiter(self):
+        """Test that each client gets its own limiter unless one is shared explicitly."""
+        shared = TokenBucketRateLimiter(rate=5, burst=2)
+
+        assert EMDB().rate_limiter is not EMDB().rate_limiter
+        assert EMDB(rate_limit=4, burst=3).rate_limiter.rate == 4
+        assert EMDB(rate_limiter=shared).rate_limiter is shared
+
+    @responses.activate
+    def test_all_api_calls_share_rate_limiter(self):
+        """Test that entry, validation, annotation and search calls all take a token."""
+        for path, body in [("entry/EMD-1234", '{"emdb_id": "EMD-1234"}'),
+                           ("analysis/EMD-1234", "{\"1234\": {}}"),
+                           ("annotations/EMD-1234", "{\"emdb_id\": \"EMD-1234\"}"),
+                           ("search/query", "emdb_id\nEMD-1234")]:
+            responses.add(responses.GET, f"https://www.ebi.ac.uk/emdb/api/{path}", body=body, status=200)
+        client = EMDB(rate_limit=1000, burst=10)
+
+        client.get_entry("EMD-1234")
+        client.get_validation("EMD-1234")
+        client.get_annotations("EMD-1234")
+        client.search("query")
+
+        assert client.rate_limiter.stats.acquired == 4
+
+    @responses.activate
+    def test_requests_reuse_client_session(self):
+        """Test that API calls are sent through the client's session."""
+        responses.add(
+            responses.GET,
+            "https://www.ebi.ac.uk/emdb/api/search/query",
+            body="emdb_id\nEMD-1234",
+            status=200,
+        )
+        client = EMDB()
+
+        with patch.object(client.session, "get", wraps=client.session.get) as mock_get:
+            client.search("query")
+
+        mock_get.assert_called_once()
+
     @responses.activate
     def test_get_entry_success(self):
         """Test successfully retrieving an entry."""
@@ -211,3 +276,297 @@ class TestEMDBClient:
         assert len(responses.calls) == 1
         request_url = responses.calls[0].request.url
         assert "fl=emdb_id%2Ctitle" in request_url or "fl=emdb_id,title" in request_url
+
+
+class TestRequestCoalescing:
+    """Stress tests for coalescing concurrent identical requests."""
+
+    def _call_concurrently(self, func, n):
+        barrier = threading.Barrier(n)
+        results = [None] * n
+        errors = []
+
+        def worker(i):
+            barrier.wait()
+            try:
+                results[i] = func()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results, errors
+
+    def test_concurrent_get_entry_makes_one_upstream_request(self, standin_server):
+        """Test that N concurrent callers for one entry share one HTTP call and one parse."""
+        server = standin_server(delay=0.3)
+        client = EMDB(base_url=server.api_url)
+
+        with patch.object(EMDBEntry, "from_api", wraps=EMDBEntry.from_api) as mock_from_api:
+            results, errors = self._call_concurrently(lambda: client.get_entry("EMD-1234"), 25)
+
+        assert errors == []
+        assert server.requests["/emdb/api/entry/EMD-1234"] == 1
+        assert mock_from_api.call_count == 1
+        assert all(entry is results[0] for entry in results)
+        assert client.rate_limiter.stats.acquired == 1
+
+    def test_different_entries_are_not_coalesced(self, standin_server):
+        """Test that concurrent calls for different IDs each reach the server."""
+        server = standin_server(delay=0.05)
+        client = EMDB(base_url=server.api_url, rate_limit=1000, burst=10)
+        ids = iter(range(4))
+        lock = threading.Lock()
+
+        def next_entry():
+            with lock:
+                emdb_id = f"EMD-{1000 + next(ids)}"
+            return client.get_entry(emdb_id)
+
+        results, errors = self._call_concurrently(next_entry, 4)
+
+        assert errors == []
+        assert server.request_count == 4
+        assert sorted(entry.id for entry in results) == ["EMD-1000", "EMD-1001", "EMD-1002", "EMD-1003"]
+
+    def test_sequential_calls_are_not_coalesced(self, standin_server):
+        """Test that coalescing only applies while a call is in flight."""
+        server = standin_server()
+        client = EMDB(base_url=server.api_url, rate_limit=1000)
+
+        client.get_entry("EMD-1234")
+        client.get_entry("EMD-1234")
+
+        assert server.request_count == 2
+
+
+def paged_search_route(n_hits):
+    """Stand-in /search route serving n_hits synthetic rows honoring start/rows."""
+    def route(handler, match):
+        query = parse_qs(urlsplit(handler.path).query)
+        start, rows = int(query["start"][0]), int(query["rows"][0])
+        fields = query["fl"][0].split(",")
+        lines = [",".join(fields)]
+        for i in range(start, min(start + rows, n_hits)):
+            values = {"emdb_id": f"EMD-{10000 + i}", "resolution": f"{2 + i / 1000:.3f}"}
+            lines.append(",".join(values[f] for f in fields))
+        handler.send_body(200, ("\n".join(lines) + "\n").encode(), "text/csv")
+    return {r"/emdb/api/search/(.+)": route}
+
+
+class TestPagedSearch:
+    """Tests for paged search against a stand-in server."""
+
+    def test_iter_search_streams_all_pages(self, standin_server):
+        """Test that every hit is yielded once, in order, across pages."""
+        server = standin_server(routes=paged_search_route(2350))
+        client = EMDB(base_url=server.api_url, rate_limit=1000, burst=10)
+
+        rows = list(client.iter_search("HIV", fields="emdb_id,resolution", page_size=500, prefetch=3))
+
+        assert len(rows) == 2350
+        assert rows[0] == {"emdb_id": "EMD-10000", "resolution": "2.000"}
+        assert rows[-1]["emdb_id"] == "EMD-12349"
+        # 5 pages of data, plus at most prefetch - 1 requests past the end
+        assert 5 <= server.request_count <= 7
+
+    def test_iter_search_is_lazy(self, standin_server):
+        """Test that pages are only requested as the caller advances."""
+        server = standin_server(routes=paged_search_route(10000))
+        client = EMDB(base_url=server.api_url, rate_limit=1000, burst=10)
+
+        iterator = client.iter_search("HIV", page_size=100, prefetch=2)
+        next(iterator)
+
+        assert server.request_count <= 3
+        iterator.close()
+
+    def test_iter_search_exact_multiple_of_page_size(self, standin_server):
+        """Test that a result count divisible by the page size terminates."""
+        server = standin_server(routes=paged_search_route(300))
+        client = EMDB(base_url=server.api_url, rate_limit=1000, burst=10)
+
+        assert len(list(client.iter_search("HIV", page_size=100, prefetch=1))) == 300
+
+    def test_search_with_page_size(self, standin_server):
+        """Test that search can build its results page by page."""
+        server = standin_server(routes=paged_search_route(250))
+        client = EMDB(base_url=server.api_url, rate_limit=1000, burst=10)
+
+        results = client.search("HIV", page_size=100)
+
+        assert isinstance(results, EMDBSearchResults)
+        assert len(results) == 250
+        assert results[249]._id == "EMD-10249"
+
+    def test_search_with_fields_avoids_entry_requests(self, standin_server):
+        """Test that projected fields come with the search and other attributes fetch the entry."""
+        server = standin_server(routes=paged_search_route(20))
+        client = EMDB(base_url=server.api_url, rate_limit=1000, burst=10)
+
+        results = client.search("HIV", page_size=10, fields=["resolution"])
+
+        assert [lazy.resolution for lazy in results][:2] == [2.0, 2.001]
+        assert server.requests["/emdb/api/entry/EMD-10000"] == 0
+        assert results[0].primary_map is not None
+        assert server.requests["/emdb/api/entry/EMD-10000"] == 1
+
+    def test_iter_search_error(self, standin_server):
+        """Test that failing pages raise EMDBAPIError."""
+        server = standin_server(routes={r"/emdb/api/search/(.+)": lambda h, m: h.send_body(400, b"bad query")})
+        client = EMDB(base_url=server.api_url, rate_limit=1000, burst=10)
+
+        with pytest.raises(EMDBAPIError):
+            list(client.iter_search("HIV"))
+
+
+def facet_route(seen):
+    """Stand-in /search route answering rows=0 JSON requests and recording their parameters."""
+    def route(handler, match):
+        seen.append(parse_qs(urlsplit(handler.path).query))
+        body = {
+            "response": {"numFound": 42, "start": 0, "docs": []},
+            "facet_counts": {
+                "facet_fields": {"structure_determination_method": ["singleParticle", 40, "helical", 2]},
+                "facet_ranges": {"resolution": {"counts": ["3.0", 42], "gap": 1.0, "start": 0.0, "end": 20.0}},
+            },
+        }
+        handler.send_body(200, json.dumps(body).encode())
+    return {r"/emdb/api/search/(.+)": route}
+
+
+class TestSearchCounts:
+    """Tests for count and facets against a stand-in server."""
+
+    def test_count_requests_no_rows(self, standin_server):
+        """Test that count asks for zero rows and returns numFound."""
+        seen = []
+        server = standin_server(routes=facet_route(seen))
+        client = EMDB(base_url=server.api_url, rate_limit=1000, burst=10)
+
+        assert client.count("HIV") == 42
+        assert seen[0]["rows"] == ["0"]
+        assert seen[0]["wt"] == ["json"]
+
+    def test_facets(self, standin_server):
+        """Test that facets sends repeated facet parameters and parses the counts."""
+        seen = []
+        server = standin_server(routes=facet_route(seen))
+        client = EMDB(base_url=server.api_url, rate_limit=1000, burst=10)
+
+        facets = client.facets("HIV", fields=["structure_determination_method", "sample_type"],
+                               ranges={"resolution": (0, 20, 1)})
+
+        assert facets.num_found == 42
+        assert facets.counts("structure_determination_method") == {"singleParticle": 40, "helical": 2}
+        assert facets.counts("resolution") == {"3.0": 42}
+        assert seen[0]["rows"] == ["0"]
+        assert seen[0]["facet.field"] == ["structure_determination_method", "sample_type"]
+        assert seen[0]["f.resolution.facet.range.gap"] == ["1"]
+
+    def test_count_error(self, standin_server):
+        """Test that failing counts raise EMDBAPIError."""
+        server = standin_server(routes={r"/emdb/api/search/(.+)": lambda h, m: h.send_body(400, b"bad query")})
+        client = EMDB(base_url=server.api_url, rate_limit=1000, burst=10)
+
+        with pytest.raises(EMDBAPIError):
+            client.count("HIV")
+
+
+def csv_search_route(n_hits, compress=False):
+    """Stand-in /search route serving the whole result set as CSV, optionally gzip-encoded."""
+    def route(handler, match):
+        fields = parse_qs(urlsplit(handler.path).query)["fl"][0].split(",")
+        lines = [",".join(fields)]
+        for i in range(n_hits):
+            values = {
+                "emdb_id": f"EMD-{10000 + i}",
+                "structure_determination_method": ("singleParticle", "helical", "tomography")[i % 3],
+                "resolution": "" if i % 10 == 9 else f"{2 + i / 1000:.3f}",
+                "title": f"Entry {i}",
+            }
+            lines.append(",".join(values[f] for f in fields))
+        body = ("\n".join(lines) + "\n").encode()
+        if compress:
+            handler.send_body(200, gzip.compress(body), "text/csv", {"Content-Encoding": "gzip"})
+        else:
+            handler.send_body(200, body, "text/csv")
+    return {r"/emdb/api/search/(.+)": route}
+
+
+class TestCSVSearch:
+    """Tests for streamed, typed CSV search against a stand-in server."""
+
+    def test_known_fields_are_typed(self, standin_server):
+        """Test that method is categorical, resolution float32 and emdb_id a string."""
+        server = standin_server(routes=csv_search_route(30))
+        client = EMDB(base_url=server.api_url, rate_limit=1000, burst=10)
+
+        df = client.csv_search("HIV")
+
+        assert len(df) == 30
+        assert df["structure_determination_method"].dtype == "category"
+        assert df["resolution"].dtype == np.float32
+        assert df["resolution"].isna().sum() == 3
+        assert df["emdb_id"].iloc[0] == "EMD-10000"
+
+    def test_chunked_iterator(self, standin_server):
+        """Test that chunksize yields DataFrames of at most that many rows."""
+        server = standin_server(routes=csv_search_route(2500, compress=True))
+        client = EMDB(base_url=server.api_url, rate_limit=1000, burst=10)
+
+        chunks = list(client.csv_search("HIV", fields="emdb_id,resolution,title", chunksize=1000))
+
+        assert [len(chunk) for chunk in chunks] == [1000, 1000, 500]
+        assert chunks[2]["title"].iloc[-1] == "Entry 2499"
+        assert server.request_count == 1
+
+    def test_dtype_override(self, standin_server):
+        """Test that callers can override the default column types."""
+        server = standin_server(routes=csv_search_route(5))
+        client = EMDB(base_url=server.api_url, rate_limit=1000, burst=10)
+
+        df = client.csv_search("HIV", dtype={"resolution": "float64", "structure_determination_method": str})
+
+        assert df["resolution"].dtype == np.float64
+        assert df["structure_determination_method"].dtype == object
+
+    def test_pyarrow_engine(self, standin_server):
+        """Test parsing with the pyarrow engine."""
+        pytest.importorskip("pyarrow")
+        server = standin_server(routes=csv_search_route(50))
+        client = EMDB(base_url=server.api_url, rate_limit=1000, burst=10)
+
+        df = client.csv_search("HIV", engine="pyarrow")
+
+        assert len(df) == 50
+        assert df["resolution"].dtype == np.float32
+
+    def test_chunked_error(self, standin_server):
+        """Test that failing chunked searches raise EMDBAPIError when iterated."""
+        server = standin_server(routes={r"/emdb/api/search/(.+)": lambda h, m: h.send_body(400, b"bad query")})
+        client = EMDB(base_url=server.api_url, rate_limit=1000, burst=10)
+
+        with pytest.raises(EMDBAPIError):
+            list(client.csv_search("HIV", chunksize=10))
+
+    def test_to_parquet(self, standin_server, tmp_path):
+        """Test that results are written to Parquet one row group per chunk."""
+        pq = pytest.importorskip("pyarrow.parquet")
+        server = standin_server(routes=csv_search_route(2500))
+        client = EMDB(base_url=server.api_url, rate_limit=1000, burst=10)
+        path = tmp_path / "hits.parquet"
+
+        rows = client.csv_search_to_parquet("HIV", str(path), fields="emdb_id,structure_determination_method,resolution",
+                                            chunksize=1000)
+
+        parquet_file = pq.ParquetFile(path)
+        assert rows == 2500
+        assert parquet_file.metadata.num_rows == 2500
+        assert parquet_file.num_row_groups == 3
+        df = parquet_file.read().to_pandas()
+        assert df["structure_determination_method"].dtype == "category"
+        assert df["emdb_id"].iloc[-1] == "EMD-12499"
@@ -8,6 +8,10 @@ from emdb.exceptions import (
     EMDBNetworkError,
     EMDBRateLimitError,
     EMDBFileNotFoundError,
+    EMDBInsufficientSpaceError,
+    EMDBChecksumError,
+    EMDBInvalidMapError,
+    EMDBMapMismatchError,
 )
 
 
@@ -109,3 +113,56 @@ class TestEMDBFileNotFoundError:
         """Test that EMDBFileNotFoundError inherits from EMDBError."""
         error = EMDBFileNotFoundError("EMD-5678", "another_file.mrc")
         assert isinstance(error, EMDBError)
+
+
+class TestEMDBInsufficientSpaceError:
+    """Tests for EMDBInsufficientSpaceError exception."""
+
+    def test_insufficient_space_error_attributes(self):
+        """Test EMDBInsufficientSpaceError stores the directory and byte counts."""
+        error = EMDBInsufficientSpaceError("/data", 2000, 1000)
+        assert error.directory == "/data"
+        assert error.required == 2000
+        assert error.available == 1000
+        assert "needs 2000 bytes but only 1000 are free in /data" in str(error)
+        assert isinstance(error, EMDBError)
+
+
+class TestEMDBChecksumError:
+    """Tests for EMDBChecksumError exception."""
+
+    def test_checksum_error_attributes(self):
+        """Test EMDBChecksumError stores the filename, algorithm and both digests."""
+        error = EMDBChecksumError("emd_1234.map.gz", "md5", "abc", "def")
+        assert error.filename == "emd_1234.map.gz"
+        assert error.algorithm == "md5"
+        assert error.expected == "abc"
+        assert error.actual == "def"
+        assert "md5 checksum of 'emd_1234.map.gz' is def, expected abc" in str(error)
+        assert isinstance(error, EMDBError)
+
+
+class TestEMDBInvalidMapError:
+    """Tests for EMDBInvalidMapError exception."""
+
+    def test_invalid_map_error_attributes(self):
+        """Test EMDBInvalidMapError stores the filename and the reason."""
+        error = EMDBInvalidMapError("emd_1234.map", "mode 101 is not supported")
+        assert error.filename == "emd_1234.map"
+        assert error.reason == "mode 101 is not supported"
+        assert "'emd_1234.map' is not a readable MRC map: mode 101 is not supported" in str(error)
+        assert isinstance(error, EMDBError)
+
+
+class TestEMDBMapMismatchError:
+    """Tests for EMDBMapMismatchError exception."""
+
+    def test_map_mismatch_error_attributes(self):
+        """Test EMDBMapMismatchError stores the filename, field and both values."""
+        error = EMDBMapMismatchError("emd_1234.map", "dimensions", (4, 5, 7), (4, 5, 6))
+        assert error.filename == "emd_1234.map"
+        assert error.field == "dimensions"
+        assert error.expected == (4, 5, 7)
+        assert error.actual == (4, 5, 6)
+        assert "dimensions of 'emd_1234.map' is (4, 5, 6) in the file header, expected (4, 5, 7)" in str(error)
+        assert isinstance(error, EMDBError)
@@ -0,0 +1,65 @@
+"""Unit tests for EMDB search facets."""
+import pytest
+
+from emdb.models.facets import EMDBFacets, FacetCount
+
+SOLR_FACETS = {
+    "response": {"numFound": 1520, "start": 0, "docs": []},
+    "facet_counts": {
+        "facet_fields": {
+            "structure_determination_method": ["singleParticle", 1400, "subtomogramAveraging", 100, "helical", 20],
+        },
+        "facet_ranges": {
+            "resolution": {
+                "counts": ["2.0", 300, "3.0", 900, "4.0", 250],
+                "gap": 1.0, "start": 0.0, "end": 20.0, "before": 0, "after": 5,
+            },
+            "release_date": {
+                "counts": ["2023-01-01T00:00:00Z", 700, "2024-01-01T00:00:00Z", 820],
+                "gap": "+1YEAR", "start": "2006-01-01T00:00:00Z", "end": "2027-01-01T00:00:00Z",
+            },
+        },
+    },
+}
+
+
+class TestEMDBFacets:
+    """Tests for the EMDBFacets model."""
+
+    def test_from_api(self):
+        """Test parsing the total and the field and range counts of a Solr response."""
+        facets = EMDBFacets.from_api(SOLR_FACETS)
+
+        assert facets.num_found == 1520
+        assert facets.fields["structure_determination_method"][0] == FacetCount(value="singleParticle", count=1400)
+        assert facets.ranges["resolution"].gap == 1.0
+        assert facets.ranges["resolution"].after == 5
+        assert facets.ranges["release_date"].before is None
+
+    def test_counts(self):
+        """Test the value to count dictionaries of field and range facets."""
+        facets = EMDBFacets.from_api(SOLR_FACETS)
+
+        assert facets.counts("structure_determination_method") == {
+            "singleParticle": 1400, "subtomogramAveraging": 100, "helical": 20
+        }
+        assert facets.counts("release_date") == {"2023-01-01T00:00:00Z": 700, "2024-01-01T00:00:00Z": 820}
+        with pytest.raises(KeyError):
+            facets.counts("sample_type")
+
+    def test_from_api_without_facets(self):
+        """Test a plain rows=0 response."""
+        facets = EMDBFacets.from_api({"response": {"numFound": 3, "docs": []}})
+
+        assert facets.num_found == 3
+        assert facets.fields == {}
+        assert facets.ranges == {}
+
+    def test_request_params(self):
+        """Test that no hits are requested and per-field range parameters are set."""
+        params = EMDBFacets.request_params(["structure_determination_method"], {"resolution": (0, 10, 0.5)})
+
+        assert params["rows"] == 0
+        assert params["facet.field"] == ["structure_determination_method"]
+        assert params["facet.range"] == ["resolution"]
+        assert params["f.resolution.facet.range.gap"] == 0.5
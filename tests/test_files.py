@@ -0,0 +1,484 @@
+"""Unit tests for EMDB file models."""
+import gzip
+import hashlib
+import json
+import os
+import tracemalloc
+
+import pytest
+import responses
+from unittest.mock import patch
+
+from emdb.client import EMDB
+from emdb.download import MIN_SEGMENT_SIZE, auto_segments, parse_checksums, segment_bounds
+from emdb.exceptions import EMDBChecksumError, EMDBError, EMDBFileNotFoundError, EMDBNetworkError
+from emdb.models.entry import EMDBEntry
+from emdb.models.files import FigureFile, ModelCifFile
+from emdb.retry import RetryPolicy
+from tests.standin_server import RangedFile, served_file
+
+
+FIGURE_URL = "https://www.ebi.ac.uk/emdb/images/entry/EMD-1234/400_1234.gif"
+
+
+def make_figure(client=None):
+    figure = FigureFile(filename="400_1234.gif")
+    figure._emdb_id = "EMD-1234"
+    figure._client = client
+    return figure
+
+
+class TestBaseFileDownload:
+    """Tests for BaseFile.download."""
+
+    @responses.activate
+    def test_download_writes_file(self, tmp_path):
+        """Test that the downloaded bytes are written to the output path."""
+        responses.add(responses.GET, FIGURE_URL, body=b"GIF89a", status=200)
+
+        make_figure().download(f"{tmp_path}/")
+
+        assert (tmp_path / "400_1234.gif").read_bytes() == b"GIF89a"
+
+    @responses.activate
+    def test_download_missing_file_raises(self, tmp_path):
+        """Test that a non-200 response raises EMDBFileNotFoundError."""
+        responses.add(responses.GET, FIGURE_URL, status=404)
+
+        with pytest.raises(EMDBFileNotFoundError):
+            make_figure().download(f"{tmp_path}/")
+
+    @responses.activate
+    def test_download_retries_with_client_policy(self, tmp_path):
+        """Test that transient server errors are retried with the client's retry policy."""
+        responses.add(responses.GET, FIGURE_URL, status=503)
+        responses.add(responses.GET, FIGURE_URL, body=b"GIF89a", status=200)
+        client = EMDB(retry_policy=RetryPolicy(backoff_factor=0, jitter=False))
+
+        make_figure(client).download(f"{tmp_path}/")
+
+        assert (tmp_path / "400_1234.gif").read_bytes() == b"GIF89a"
+        assert len(responses.calls) == 2
+
+    @responses.activate
+    def test_download_uses_client_session(self, tmp_path):
+        """Test that files created by a client download through its pooled session."""
+        responses.add(responses.GET, FIGURE_URL, body=b"GIF89a", status=200)
+        client = EMDB(timeout=5)
+
+        with patch.object(client.session, "get", wraps=client.session.get) as mock_get:
+            make_figure(client).download(f"{tmp_path}/")
+
+        mock_get.assert_called_once()
+        assert mock_get.call_args.kwargs["timeout"] == 5
+
+    def test_entry_files_are_bound_to_client(self):
+        """Test that EMDBEntry.from_api hands its client to every file."""
+        client = EMDB()
+        entry = EMDBEntry.from_api({"emdb_id": "EMD-1234"}, client)
+
+        for file in entry.deposited_files + entry.metadata_files:
+            assert file._client is client
+
+
+BLOCK = bytes(range(256)) * 4096  # 1 MiB
+
+
+def large_file_route(size, truncate_at=None):
+    """Stand-in route streaming a synthetic file of `size` bytes, optionally dropping the connection early."""
+    def route(handler, match):
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/octet-stream")
+        handler.send_header("Content-Length", str(size))
+        handler.end_headers()
+        sent = 0
+        end = size if truncate_at is None else truncate_at
+        while sent < end:
+            block = BLOCK[:min(len(BLOCK), end - sent)]
+            handler.wfile.write(block)
+            sent += len(block)
+        if truncate_at is not None:
+            handler.close_connection = True
+    return {r"/files/(.+)": route}
+
+
+class TestStreamingDownload:
+    """Tests for streaming downloads against a stand-in server."""
+
+    def test_large_file_uses_constant_memory(self, standin_server, tmp_path):
+        """Test that a large file is written in chunks without being held in memory."""
+        size = 64 * len(BLOCK)
+        server = standin_server(routes=large_file_route(size))
+        figure = served_file(server)
+
+        tracemalloc.start()
+        try:
+            path = figure.download(f"{tmp_path}/", chunk_size=256 * 1024)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        assert os.path.getsize(path) == size
+        with open(path, "rb") as f:
+            assert f.read(len(BLOCK)) == BLOCK
+        # The server's 1 MiB block plus a few chunks, far below the 64 MiB file
+        assert peak < 8 * 1024 * 1024
+
+    def test_progress_callback(self, standin_server, tmp_path):
+        """Test that progress reports growing byte counts and the total from Content-Length."""
+        size = 3 * len(BLOCK) + 123
+        server = standin_server(routes=large_file_route(size))
+        calls = []
+
+        served_file(server).download(f"{tmp_path}/", chunk_size=len(BLOCK),
+                                       progress=lambda done, total: calls.append((done, total)))
+
+        assert calls[-1] == (size, size)
+        assert [done for done, _ in calls] == sorted(done for done, _ in calls)
+
+    def test_failed_download_without_resume_leaves_no_file(self, standin_server, tmp_path):
+        """Test that without resume a dropped connection raises and leaves neither the file nor its .part file."""
+        server = standin_server(routes=large_file_route(4 * len(BLOCK), truncate_at=len(BLOCK) + 10))
+        client = EMDB(retry_policy=RetryPolicy(max_attempts=1))
+
+        with pytest.raises(EMDBNetworkError):
+            served_file(server, client=client).download(f"{tmp_path}/", resume=False)
+
+        assert os.listdir(tmp_path) == []
+
+    def test_existing_file_replaced_only_when_complete(self, standin_server, tmp_path):
+        """Test that a failed download keeps the previous copy of the file intact."""
+        server = standin_server(routes=large_file_route(2 * len(BLOCK), truncate_at=100))
+        (tmp_path / "400_1234.gif").write_bytes(b"previous")
+
+        with pytest.raises(EMDBNetworkError):
+            served_file(server, client=EMDB(retry_policy=RetryPolicy(max_attempts=1))).download(f"{tmp_path}/")
+
+        assert (tmp_path / "400_1234.gif").read_bytes() == b"previous"
+
+
+class TestResumableDownload:
+    """Tests for resuming interrupted downloads with Range requests."""
+
+    DATA = BLOCK * 3
+
+    @staticmethod
+    def client(max_attempts=3):
+        return EMDB(retry_policy=RetryPolicy(max_attempts=max_attempts, backoff_factor=0, jitter=False))
+
+    def test_resumes_within_one_call(self, standin_server, tmp_path):
+        """Test that a dropped connection continues from the last byte received."""
+        remote = RangedFile(self.DATA, drops=[1000, 5000])
+        server = standin_server(routes=remote.routes)
+
+        path = served_file(server, client=self.client()).download(f"{tmp_path}/")
+
+        assert open(path, "rb").read() == self.DATA
+        assert remote.ranges == [None, "bytes=1000-", "bytes=6000-"]
+        assert os.listdir(tmp_path) == ["400_1234.gif"]
+
+    def test_failed_download_keeps_part_for_next_call(self, standin_server, tmp_path):
+        """Test that a failed download keeps its .part file and a later call resumes it."""
+        remote = RangedFile(self.DATA, drops=[len(BLOCK)])
+        server = standin_server(routes=remote.routes)
+        figure = served_file(server, client=self.client(max_attempts=1))
+
+        with pytest.raises(EMDBNetworkError):
+            figure.download(f"{tmp_path}/")
+        assert os.path.getsize(tmp_path / "400_1234.gif.part") == len(BLOCK)
+        assert not (tmp_path / "400_1234.gif").exists()
+
+        figure.download(f"{tmp_path}/")
+
+        assert (tmp_path / "400_1234.gif").read_bytes() == self.DATA
+        assert remote.ranges == [None, f"bytes={len(BLOCK)}-"]
+        assert os.listdir(tmp_path) == ["400_1234.gif"]
+
+    def test_changed_file_restarts(self, standin_server, tmp_path):
+        """Test that a file changed on the server since the first attempt is downloaded from the start."""
+        remote = RangedFile(self.DATA, drops=[1000])
+        server = standin_server(routes=remote.routes)
+        figure = served_file(server, client=self.client(max_attempts=1))
+        with pytest.raises(EMDBNetworkError):
+            figure.download(f"{tmp_path}/")
+
+        remote.data = BLOCK[::-1] * 2
+        remote.etag = '"v2"'
+        figure.download(f"{tmp_path}/")
+
+        assert (tmp_path / "400_1234.gif").read_bytes() == BLOCK[::-1] * 2
+
+    def test_server_without_ranges_restarts(self, standin_server, tmp_path):
+        """Test that a server ignoring Range makes the download start over instead of corrupting the file."""
+        remote = RangedFile(self.DATA, drops=[1000], honor_ranges=False)
+        server = standin_server(routes=remote.routes)
+
+        path = served_file(server, client=self.client()).download(f"{tmp_path}/")
+
+        assert open(path, "rb").read() == self.DATA
+        assert remote.ranges == [None, "bytes=1000-"]
+
+    def test_server_without_ranges_gives_up(self, standin_server, tmp_path):
+        """Test that restarts that never get further than before are limited by the retry policy."""
+        remote = RangedFile(self.DATA, drops=[1000] * 10, honor_ranges=False)
+        server = standin_server(routes=remote.routes)
+
+        with pytest.raises(EMDBNetworkError):
+            served_file(server, client=self.client()).download(f"{tmp_path}/")
+
+        assert len(remote.ranges) == 3
+
+    def test_preallocated_part_resumes(self, standin_server, tmp_path):
+        """Test that a .part file preallocated to the full size resumes and is cut to the bytes received."""
+        remote = RangedFile(self.DATA, drops=[1000])
+        server = standin_server(routes=remote.routes)
+        figure = served_file(server, client=self.client(max_attempts=1))
+
+        with pytest.raises(EMDBNetworkError):
+            figure._download(str(tmp_path / "400_1234.gif"), allocate=True)
+        meta = json.loads((tmp_path / "400_1234.gif.part.json").read_text())
+        assert meta["offset"] == 1000
+        figure._download(str(tmp_path / "400_1234.gif"), allocate=True)
+
+        assert (tmp_path / "400_1234.gif").read_bytes() == self.DATA
+
+    def test_complete_part_file_is_finished(self, standin_server, tmp_path):
+        """Test that a .part file already holding the whole file is renamed after a 416 response."""
+        remote = RangedFile(self.DATA)
+        server = standin_server(routes=remote.routes)
+        figure = served_file(server)
+        (tmp_path / "400_1234.gif.part").write_bytes(self.DATA)
+        (tmp_path / "400_1234.gif.part.json").write_text(json.dumps(
+            {"url": figure.source_path, "offset": len(self.DATA), "total": len(self.DATA), "etag": '"v1"'}))
+
+        figure.download(f"{tmp_path}/")
+
+        assert (tmp_path / "400_1234.gif").read_bytes() == self.DATA
+        assert remote.ranges == [f"bytes={len(self.DATA)}-"]
+        assert os.listdir(tmp_path) == ["400_1234.gif"]
+
+    def test_part_larger_than_size_kbytes_is_discarded(self, standin_server, tmp_path):
+        """Test that a .part file much larger than the file's size_kbytes is not resumed."""
+        remote = RangedFile(self.DATA)
+        server = standin_server(routes=remote.routes)
+        figure = served_file(server)
+        figure.size_kbytes = 1
+        (tmp_path / "400_1234.gif.part").write_bytes(b"x" * 10000)
+        (tmp_path / "400_1234.gif.part.json").write_text(json.dumps(
+            {"url": figure.source_path, "offset": 10000, "total": None, "etag": '"v1"'}))
+
+        figure.download(f"{tmp_path}/")
+
+        assert (tmp_path / "400_1234.gif").read_bytes() == self.DATA
+        assert remote.ranges == [None]
+
+
+class TestSegmentedDownload:
+    """Tests for downloads split into concurrent byte ranges."""
+
+    DATA = bytes(range(251)) * 20000  # About 5 MB, not a multiple of the segment count
+
+    def test_auto_segments(self):
+        """Test that the segment count grows with the size, with a single stream for small files."""
+        assert auto_segments(None) == 1
+        assert auto_segments(MIN_SEGMENT_SIZE) == 1
+        assert auto_segments(4 * MIN_SEGMENT_SIZE) == 4
+        assert auto_segments(1000 * MIN_SEGMENT_SIZE) == 8
+
+    def test_segment_bounds_cover_file(self):
+        """Test that segments are contiguous and cover every byte once."""
+        bounds = segment_bounds(10, 3)
+
+        assert bounds == [(0, 3), (4, 7), (8, 9)]
+
+    def test_segments_assemble_file(self, standin_server, tmp_path):
+        """Test that concurrent ranges are written at their offsets into one complete file."""
+        remote = RangedFile(self.DATA)
+        server = standin_server(routes=remote.routes)
+        calls = []
+
+        path = served_file(server, client=EMDB()).download(
+            f"{tmp_path}/", segmented=True, segments=4, progress=lambda done, total: calls.append((done, total)))
+
+        assert open(path, "rb").read() == self.DATA
+        assert remote.heads == 1
+        assert sorted(remote.ranges) == sorted(f"bytes={first}-{last}"
+                                               for first, last in segment_bounds(len(self.DATA), 4))
+        assert calls[-1] == (len(self.DATA), len(self.DATA))
+        assert os.listdir(tmp_path) == ["400_1234.gif"]
+
+    def test_interrupted_segment_resumes(self, standin_server, tmp_path):
+        """Test that a dropped segment continues from its last byte instead of failing the download."""
+        remote = RangedFile(self.DATA, drops=[1000])
+        server = standin_server(routes=remote.routes)
+        client = EMDB(retry_policy=RetryPolicy(backoff_factor=0, jitter=False))
+
+        path = served_file(server, client=client).download(f"{tmp_path}/", segmented=True, segments=2)
+
+        assert open(path, "rb").read() == self.DATA
+        assert len(remote.ranges) == 3
+
+    def test_server_without_ranges_uses_single_stream(self, standin_server, tmp_path):
+        """Test that a server not accepting ranges is downloaded as a single stream."""
+        remote = RangedFile(self.DATA, honor_ranges=False)
+        server = standin_server(routes=remote.routes)
+
+        path = served_file(server).download(f"{tmp_path}/", segmented=True, segments=4)
+
+        assert open(path, "rb").read() == self.DATA
+        assert remote.ranges == [None]
+
+    @pytest.mark.parametrize("status", [403, 405])
+    def test_refused_head_uses_single_stream(self, standin_server, tmp_path, status):
+        """Test that a server refusing HEAD is downloaded as a single stream, while a 404 still raises."""
+        remote = RangedFile(self.DATA, head_status=status)
+        server = standin_server(routes=remote.routes)
+
+        path = served_file(server).download(f"{tmp_path}/", segmented=True, segments=4)
+
+        assert open(path, "rb").read() == self.DATA
+        assert remote.ranges == [None]
+
+        remote.head_status = 404
+        with pytest.raises(EMDBFileNotFoundError):
+            served_file(server).download(f"{tmp_path}/other/", segmented=True, segments=4)
+
+    def test_small_file_skips_head(self, standin_server, tmp_path):
+        """Test that a file too small to split, by size_kbytes, is fetched as a single stream without HEAD."""
+        remote = RangedFile(self.DATA)
+        server = standin_server(routes=remote.routes)
+        figure = served_file(server)
+        figure.size_kbytes = len(self.DATA) / 1024
+
+        path = figure.download(f"{tmp_path}/", segmented=True)
+
+        assert open(path, "rb").read() == self.DATA
+        assert remote.heads == 0
+        assert remote.ranges == [None]
+
+    def test_failed_segment_removes_part(self, standin_server, tmp_path):
+        """Test that a segment failing for good raises and leaves no partial file."""
+        remote = RangedFile(self.DATA, drops=[0] * 10)
+        server = standin_server(routes=remote.routes)
+        client = EMDB(retry_policy=RetryPolicy(max_attempts=2, backoff_factor=0, jitter=False))
+
+        with pytest.raises(EMDBNetworkError):
+            served_file(server, client=client).download(f"{tmp_path}/", segmented=True, segments=2)
+
+        assert os.listdir(tmp_path) == []
+
+
+def static_files_route(files):
+    """Stand-in route serving `files`, a {path under /files/: bytes} dictionary."""
+    def route(handler, match):
+        if match.group(1) in files:
+            handler.send_body(200, files[match.group(1)], "application/octet-stream")
+        else:
+            handler.send_body(404, b"not found", "text/plain")
+    return {r"/files/(.+)": route}
+
+
+class TestSinglePassDownload:
+    """Tests for downloads decompressed and verified while streaming."""
+
+    RAW = bytes(4 * len(BLOCK)) + BLOCK + bytes(len(BLOCK))
+    GZ = gzip.compress(RAW)
+
+    @staticmethod
+    def served_map(server, client=None):
+        figure = served_file(server, client=client)
+        figure.filename = "emd_1234.map.gz"
+        figure._BASE_FTP_URL = f"{server.url}/files"
+        return figure
+
+    def test_decompress_while_downloading(self, standin_server, tmp_path):
+        """Test that a .gz file is saved decompressed, without the .gz suffix."""
+        server = standin_server(routes=static_files_route({"EMD-1234/emd_1234.map.gz": self.GZ}))
+
+        path = self.served_map(server).download(f"{tmp_path}/", decompress=True)
+
+        assert path.endswith("/emd_1234.map")
+        assert open(path, "rb").read() == self.RAW
+        assert os.listdir(tmp_path) == ["emd_1234.map"]
+
+    def test_decompress_uses_constant_memory(self, standin_server, tmp_path):
+        """Test that a file expanding 1000-fold is decompressed without holding it in memory."""
+        raw_size = 64 * len(BLOCK)
+        server = standin_server(routes=static_files_route({"EMD-1234/emd_1234.map.gz": gzip.compress(bytes(raw_size))}))
+        figure = self.served_map(server)
+
+        tracemalloc.start()
+        try:
+            path = figure.download(f"{tmp_path}/", decompress=True, chunk_size=256 * 1024)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        assert os.path.getsize(path) == raw_size
+        assert peak < 8 * 1024 * 1024
+
+    def test_verify_against_listing(self, standin_server, tmp_path):
+        """Test that verify looks the checksum of the published .gz file up in the entry's listing."""
+        listing = f"{hashlib.md5(self.GZ).hexdigest()}  emd_1234.map.gz\n".encode()
+        server = standin_server(routes=static_files_route({
+            "EMD-1234/emd_1234.map.gz": self.GZ,
+            "EMD-1234/md5sum.txt": listing,
+        }))
+
+        path = self.served_map(server).download(f"{tmp_path}/", decompress=True, verify=True)
+
+        assert open(path, "rb").read() == self.RAW
+
+    def test_checksum_listing_only_for_ftp_files(self, standin_server, tmp_path):
+        """Test that files served outside the entry's FTP directory have no checksum listing to verify against."""
+        server = standin_server(routes=static_files_route({"EMD-1234/md5sum.txt": b""}))
+        figure = served_file(server)
+        model = ModelCifFile(filename="8abc_updated.cif", pdb_id="8abc")
+        model._emdb_id = "EMD-1234"
+
+        assert self.served_map(server).checksum_listing_url == f"{server.url}/files/EMD-1234/md5sum.txt"
+        assert figure.checksum_listing_url is None and model.checksum_listing_url is None
+        assert figure.expected_checksum(missing_ok=True) is None
+        assert self.served_map(server).expected_checksum(missing_ok=True) is None
+        with pytest.raises(EMDBError):
+            figure.download(f"{tmp_path}/", verify=True)
+
+    def test_checksum_mismatch_leaves_no_file(self, standin_server, tmp_path):
+        """Test that a file not matching its checksum raises and is not kept."""
+        server = standin_server(routes=static_files_route({"EMD-1234/emd_1234.map.gz": self.GZ}))
+
+        with pytest.raises(EMDBChecksumError) as excinfo:
+            self.served_map(server).download(f"{tmp_path}/", checksum="0" * 64)
+
+        assert excinfo.value.algorithm == "sha256"
+        assert excinfo.value.actual == hashlib.sha256(self.GZ).hexdigest()
+        assert os.listdir(tmp_path) == []
+
+    def test_explicit_checksum_without_decompress(self, standin_server, tmp_path):
+        """Test that a checksum can be verified while saving the file as published."""
+        server = standin_server(routes=static_files_route({"EMD-1234/emd_1234.map.gz": self.GZ}))
+
+        path = self.served_map(server).download(f"{tmp_path}/", checksum=hashlib.sha256(self.GZ).hexdigest())
+
+        assert open(path, "rb").read() == self.GZ
+
+    def test_corrupt_gzip_raises(self, standin_server, tmp_path):
+        """Test that a truncated gzip stream is reported instead of saved."""
+        server = standin_server(routes=static_files_route({"EMD-1234/emd_1234.map.gz": self.GZ[:len(self.GZ) // 2]}))
+
+        with pytest.raises(EMDBNetworkError):
+            self.served_map(server).download(f"{tmp_path}/", decompress=True)
+
+        assert os.listdir(tmp_path) == []
+
+    def test_parse_checksums(self):
+        """Test that md5sum and sha256sum listings are parsed by filename, skipping other lines."""
+        listing = (
+            "# EMD-1234\n"
+            f"{'A' * 32}  map/emd_1234.map.gz\n"
+            f"{'b' * 64} *header/emd-1234.xml\n"
+            "\n"
+            "not a checksum line\n"
+        )
+
+        assert parse_checksums(listing) == {"emd_1234.map.gz": "a" * 32, "emd-1234.xml": "b" * 64}
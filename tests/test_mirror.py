@@ -0,0 +1,274 @@
+"""Unit tests for the incremental mirror sync."""
+import gzip
+import json
+import os
+from collections import Counter
+
+from emdb.client import EMDB
+from emdb.mirror import MANIFEST_NAME, EMDBMirror, MirrorManifest, SyncReport
+from emdb.scheduler import DownloadScheduler
+
+LAST_MODIFIED = "Mon, 05 Oct 2026 10:00:00 GMT"
+
+
+class FakeArchive:
+    """Stand-in entries and files, editable between syncs, recording the requests per file."""
+
+    def __init__(self):
+        self.entries = {}
+        self.files = {}
+        self.entry_gets = Counter()
+        self.gets = Counter()
+        self.heads = Counter()
+
+    def add_entry(self, emdb_id, map_size=100):
+        number = emdb_id[4:]
+        self.entries[emdb_id] = {"emdb_id": emdb_id, "map": {"file": f"emd_{number}.map.gz", "size_kbytes": 1}}
+        self.files[f"emd_{number}.map.gz"] = (bytes(map_size), LAST_MODIFIED)
+        self.files[f"400_{number}.gif"] = (b"figure", LAST_MODIFIED)
+
+    def remove_entry(self, emdb_id):
+        number = emdb_id[4:]
+        del self.entries[emdb_id]
+        del self.files[f"emd_{number}.map.gz"], self.files[f"400_{number}.gif"]
+
+    def entry_route(self, handler, match):
+        if match.group(1) not in self.entries:
+            handler.send_body(404, b"{}")
+            return
+        self.entry_gets[match.group(1)] += 1
+        handler.send_body(200, json.dumps(self.entries[match.group(1)]).encode())
+
+    def file_route(self, handler, match):
+        filename = match.group(1)
+        if filename not in self.files:
+            handler.send_body(404, b"not found", "text/plain")
+            return
+        (self.heads if handler.command == "HEAD" else self.gets)[filename] += 1
+        body, last_modified = self.files[filename]
+        handler.send_body(200, body, "application/octet-stream", {"Last-Modified": last_modified})
+
+    @property
+    def routes(self):
+        # A pattern other than the default entry route's, so that it is not overridden
+        return {r"/emdb/api/entry/(EMD-\d+)/?": self.entry_route, r"/files/.*/([^/]+)": self.file_route}
+
+
+class StandInMirror(EMDBMirror):
+    """EMDBMirror whose files point at the stand-in server."""
+
+    def __init__(self, root, client, base_url, **kwargs):
+        super().__init__(root, client, metadata_files=False, **kwargs)
+        self.base_url = base_url
+
+    def entry_files(self, entry):
+        files = super().entry_files(entry)
+        for file in files.values():
+            file._BASE_FTP_URL = f"{self.base_url}/files"
+            file._BASE_FIGURES_URL = f"{self.base_url}/files"
+        return files
+
+
+def make_mirror(standin_server, tmp_path, archive):
+    server = standin_server(routes=archive.routes)
+    client = EMDB(base_url=server.api_url)
+    return StandInMirror(str(tmp_path), client, server.url)
+
+
+class TestEMDBMirror:
+    """Tests for EMDBMirror."""
+
+    def test_first_sync_downloads_everything(self, standin_server, tmp_path):
+        """Test that a new mirror downloads every file into a directory per entry and records a manifest."""
+        archive = FakeArchive()
+        archive.add_entry("EMD-1000")
+        archive.add_entry("EMD-1001")
+        mirror = make_mirror(standin_server, tmp_path, archive)
+
+        report = mirror.sync(["EMD-1000", "EMD-1001"])
+
+        assert report.ok
+        assert sorted(report.downloaded) == ["EMD-1000/400_1000.gif", "EMD-1000/emd_1000.map.gz",
+                                             "EMD-1001/400_1001.gif", "EMD-1001/emd_1001.map.gz"]
+        assert (tmp_path / "EMD-1000" / "emd_1000.map.gz").read_bytes() == bytes(100)
+        manifest = MirrorManifest(str(tmp_path / MANIFEST_NAME))
+        assert manifest.files["EMD-1000/emd_1000.map.gz"].last_modified == LAST_MODIFIED
+        assert manifest.files["EMD-1000/emd_1000.map.gz"].size == 100
+
+    def test_noop_sync_downloads_nothing(self, standin_server, tmp_path):
+        """Test that a second sync only checks the files and downloads none of them."""
+        archive = FakeArchive()
+        archive.add_entry("EMD-1000")
+        mirror = make_mirror(standin_server, tmp_path, archive)
+        mirror.sync(["EMD-1000"])
+
+        report = mirror.sync(["EMD-1000"])
+
+        assert report.downloaded == []
+        assert sorted(report.unchanged) == ["EMD-1000/400_1000.gif", "EMD-1000/emd_1000.map.gz"]
+        assert archive.gets["emd_1000.map.gz"] == 1
+        assert archive.heads["emd_1000.map.gz"] == 2
+
+    def test_noop_sync_reuses_file_lists(self, standin_server, tmp_path):
+        """Test that known entries are only checked with HEAD requests, without fetching their JSON again."""
+        archive = FakeArchive()
+        archive.add_entry("EMD-1000")
+        archive.add_entry("EMD-1001")
+        mirror = make_mirror(standin_server, tmp_path, archive)
+        mirror.sync(["EMD-1000", "EMD-1001"])
+
+        report = mirror.sync(["EMD-1000", "EMD-1001"])
+
+        assert len(report.unchanged) == 4 and report.ok
+        assert archive.entry_gets == Counter({"EMD-1000": 1, "EMD-1001": 1})
+        assert archive.heads["400_1001.gif"] == 2
+
+    def test_changed_entry_is_fetched_again(self, standin_server, tmp_path):
+        """Test that only the entries with a changed file, or an old file list, are fetched from the API again."""
+        archive = FakeArchive()
+        archive.add_entry("EMD-1000")
+        archive.add_entry("EMD-1001")
+        mirror = make_mirror(standin_server, tmp_path, archive)
+        mirror.sync(["EMD-1000", "EMD-1001"])
+        archive.files["400_1000.gif"] = (b"figure", "Tue, 06 Oct 2026 10:00:00 GMT")
+
+        report = mirror.sync(["EMD-1000", "EMD-1001"])
+
+        assert report.downloaded == ["EMD-1000/400_1000.gif"]
+        assert archive.entry_gets == Counter({"EMD-1000": 2, "EMD-1001": 1})
+
+        mirror.sync(["EMD-1000", "EMD-1001"], refresh_age=0)
+
+        assert archive.entry_gets == Counter({"EMD-1000": 3, "EMD-1001": 2})
+
+    def test_changed_files_are_downloaded_again(self, standin_server, tmp_path):
+        """Test that a file with a new size or Last-Modified is fetched again and the others are not."""
+        archive = FakeArchive()
+        archive.add_entry("EMD-1000")
+        mirror = make_mirror(standin_server, tmp_path, archive)
+        mirror.sync(["EMD-1000"])
+        archive.files["emd_1000.map.gz"] = (bytes(200), LAST_MODIFIED)
+        archive.files["400_1000.gif"] = (b"figure", "Tue, 06 Oct 2026 10:00:00 GMT")
+
+        report = mirror.sync(["EMD-1000"])
+
+        assert sorted(report.downloaded) == ["EMD-1000/400_1000.gif", "EMD-1000/emd_1000.map.gz"]
+        assert (tmp_path / "EMD-1000" / "emd_1000.map.gz").read_bytes() == bytes(200)
+
+    def test_local_changes_are_repaired(self, standin_server, tmp_path):
+        """Test that files deleted or modified locally are downloaded again."""
+        archive = FakeArchive()
+        archive.add_entry("EMD-1000")
+        mirror = make_mirror(standin_server, tmp_path, archive)
+        mirror.sync(["EMD-1000"])
+        os.remove(tmp_path / "EMD-1000" / "400_1000.gif")
+        (tmp_path / "EMD-1000" / "emd_1000.map.gz").write_bytes(b"corrupt")
+
+        report = mirror.sync(["EMD-1000"])
+
+        assert sorted(report.downloaded) == ["EMD-1000/400_1000.gif", "EMD-1000/emd_1000.map.gz"]
+        assert (tmp_path / "EMD-1000" / "emd_1000.map.gz").read_bytes() == bytes(100)
+
+    def test_max_age_skips_requests(self, standin_server, tmp_path):
+        """Test that entries checked within max_age are trusted without any request."""
+        archive = FakeArchive()
+        archive.add_entry("EMD-1000")
+        mirror = make_mirror(standin_server, tmp_path, archive)
+        mirror.sync(["EMD-1000"])
+        requests = sum(archive.heads.values())
+
+        report = mirror.sync(["EMD-1000"], max_age=3600)
+
+        assert len(report.unchanged) == 2 and report.downloaded == []
+        assert sum(archive.heads.values()) == requests
+
+    def test_max_age_still_repairs_local_changes(self, standin_server, tmp_path):
+        """Test that a recently checked entry is synced anyway when one of its files is gone."""
+        archive = FakeArchive()
+        archive.add_entry("EMD-1000")
+        mirror = make_mirror(standin_server, tmp_path, archive)
+        mirror.sync(["EMD-1000"])
+        os.remove(tmp_path / "EMD-1000" / "400_1000.gif")
+
+        report = mirror.sync(["EMD-1000"], max_age=3600)
+
+        assert report.downloaded == ["EMD-1000/400_1000.gif"]
+
+    def test_manifest_survives_new_mirror(self, standin_server, tmp_path):
+        """Test that a mirror opened on an existing root picks up its manifest."""
+        archive = FakeArchive()
+        archive.add_entry("EMD-1000")
+        mirror = make_mirror(standin_server, tmp_path, archive)
+        mirror.sync(["EMD-1000"])
+
+        reopened = StandInMirror(str(tmp_path), mirror.client, mirror.base_url)
+        report = reopened.sync(["EMD-1000"])
+
+        assert report.downloaded == []
+        assert len(reopened.manifest) == 2
+
+    def test_prune_withdrawn_files_and_entries(self, standin_server, tmp_path):
+        """Test that prune removes files dropped from an entry and every file of a withdrawn entry."""
+        archive = FakeArchive()
+        archive.add_entry("EMD-1000")
+        archive.add_entry("EMD-1001")
+        mirror = make_mirror(standin_server, tmp_path, archive)
+        mirror.sync(["EMD-1000", "EMD-1001"])
+        archive.entries["EMD-1000"]["map"]["file"] = "emd_1000_v2.map.gz"
+        archive.files["emd_1000_v2.map.gz"] = (bytes(10), LAST_MODIFIED)
+        del archive.files["emd_1000.map.gz"]
+        archive.remove_entry("EMD-1001")
+
+        report = mirror.sync(["EMD-1000", "EMD-1001"], prune=True)
+
+        assert report.ok
+        assert report.downloaded == ["EMD-1000/emd_1000_v2.map.gz"]
+        assert sorted(report.removed) == ["EMD-1000/emd_1000.map.gz", "EMD-1001/400_1001.gif",
+                                          "EMD-1001/emd_1001.map.gz"]
+        assert sorted(os.listdir(tmp_path / "EMD-1000")) == ["400_1000.gif", "emd_1000_v2.map.gz"]
+        assert not (tmp_path / "EMD-1001").exists()
+        assert "EMD-1001" not in mirror.manifest.entries
+
+    def test_without_prune_files_are_kept(self, standin_server, tmp_path):
+        """Test that withdrawn entries are reported as errors and left on disk without prune."""
+        archive = FakeArchive()
+        archive.add_entry("EMD-1001")
+        mirror = make_mirror(standin_server, tmp_path, archive)
+        mirror.sync(["EMD-1001"])
+        archive.remove_entry("EMD-1001")
+
+        report = mirror.sync(["EMD-1001"])
+
+        assert list(report.errors) == ["EMD-1001"]
+        assert report.removed == []
+        assert (tmp_path / "EMD-1001" / "emd_1001.map.gz").exists()
+
+    def test_missing_file_is_reported(self, standin_server, tmp_path):
+        """Test that a file that cannot be checked is reported without stopping the others."""
+        archive = FakeArchive()
+        archive.add_entry("EMD-1000")
+        del archive.files["400_1000.gif"]
+        mirror = make_mirror(standin_server, tmp_path, archive)
+
+        report = mirror.sync(["EMD-1000"])
+
+        assert list(report.errors) == ["EMD-1000/400_1000.gif"]
+        assert report.errors["EMD-1000/400_1000.gif"].emdb_id == "EMD-1000"
+        assert report.downloaded == ["EMD-1000/emd_1000.map.gz"]
+        assert isinstance(report, SyncReport) and not report.ok
+
+    def test_decompressing_scheduler(self, standin_server, tmp_path):
+        """Test that with a decompressing scheduler, .gz files are mirrored and recorded without .gz."""
+        archive = FakeArchive()
+        archive.add_entry("EMD-1000")
+        archive.files["emd_1000.map.gz"] = (gzip.compress(b"map data"), LAST_MODIFIED)
+        server = standin_server(routes=archive.routes)
+        with DownloadScheduler(decompress=True) as scheduler:
+            mirror = StandInMirror(str(tmp_path), EMDB(base_url=server.api_url), server.url, scheduler=scheduler)
+            mirror.sync(["EMD-1000"])
+
+            report = mirror.sync(["EMD-1000"])
+
+        assert sorted(report.unchanged) == ["EMD-1000/400_1000.gif", "EMD-1000/emd_1000.map"]
+        assert sorted(os.listdir(tmp_path / "EMD-1000")) == ["400_1000.gif", "emd_1000.map"]
+        assert (tmp_path / "EMD-1000" / "emd_1000.map").read_bytes() == b"map data"
@@ -0,0 +1,210 @@
+"""Unit tests for memory-mapped MRC maps."""
+import os
+import struct
+
+import numpy as np
+import pytest
+
+from emdb.exceptions import EMDBInvalidMapError, EMDBMapMismatchError
+from emdb.models.files import PrimaryMapFile
+from emdb.mrc import MRCHeader, MRCMap, compare_header, map_file_size, open_map
+
+
+def write_mrc(path, volume, axis_order=(1, 2, 3), byte_order="<", voxel_size=1.5, start=(0, 0, 0),
+              extended=b"", machst=True, labels=("made by test_mrc",)):
+    """
+    Write ``volume``, indexed [z, y, x], as an MRC file whose columns, rows and sections run along
+    ``axis_order`` (mapc, mapr, maps).
+    """
+    volume = np.asarray(volume)
+    # File array axes are (sections, rows, columns) = (maps, mapr, mapc), taken from [z, y, x]
+    stored = volume.transpose([3 - axis for axis in reversed(axis_order)])
+    nz, ny, nx = stored.shape
+    nxyz = volume.shape[::-1]
+    mode = {np.dtype("float32"): 2, np.dtype("int16"): 1, np.dtype("int8"): 0, np.dtype("uint16"): 6}[volume.dtype]
+    label_bytes = b"".join(label.encode().ljust(80) for label in labels).ljust(800, b" ")
+    header = struct.pack(
+        byte_order + "10i6f3i3fii100x3f4s4sfi800s",
+        nx, ny, nz, mode, *start, *nxyz, *(n * voxel_size for n in nxyz), 90.0, 90.0, 90.0,
+        *axis_order, float(volume.min()), float(volume.max()), float(volume.mean()), 1, len(extended),
+        0.0, 0.0, 0.0, b"MAP ", (b"\x44\x44\x00\x00" if byte_order == "<" else b"\x11\x11\x00\x00") if machst
+        else bytes(4), float(volume.std()), len(labels), label_bytes,
+    )
+    with open(path, "wb") as f:
+        f.write(header + extended + stored.astype(volume.dtype.newbyteorder(byte_order)).tobytes())
+    return str(path)
+
+
+def map_metadata(shape_xyz=(4, 5, 6), voxel_size=1.5, axis_order="XYZ", **overrides):
+    data = {
+        "file": "emd_1234.map.gz",
+        "data_type": "IMAGE STORED AS FLOATING POINT NUMBER (4 BYTES)",
+        "dimensions": {"col": shape_xyz[0], "row": shape_xyz[1], "sec": shape_xyz[2]},
+        "origin": {"col": 0, "row": 0, "sec": 0},
+        "spacing": {"x": shape_xyz[0], "y": shape_xyz[1], "z": shape_xyz[2]},
+        "cell": {
+            "a": {"valueOf_": shape_xyz[0] * voxel_size, "units": "Å"},
+            "b": {"valueOf_": shape_xyz[1] * voxel_size, "units": "Å"},
+            "c": {"valueOf_": shape_xyz[2] * voxel_size, "units": "Å"},
+            "alpha": {"valueOf_": 90.0, "units": "deg"},
+            "beta": {"valueOf_": 90.0, "units": "deg"},
+            "gamma": {"valueOf_": 90.0, "units": "deg"},
+        },
+        "axis_order": dict(zip(("fast", "medium", "slow"), axis_order)),
+        "pixel_spacing": {},
+    }
+    data.update(overrides)
+    return PrimaryMapFile.from_api(data)
+
+
+VOLUME = np.arange(6 * 5 * 4, dtype=np.float32).reshape(6, 5, 4)
+
+
+class TestMRCHeader:
+    """Tests for parsing MRC headers."""
+
+    def test_parse_header(self, tmp_path):
+        """Test that the header fields, labels, dtype and voxel size are read."""
+        path = write_mrc(tmp_path / "a.map", VOLUME)
+
+        header = MRCHeader.read(path)
+
+        assert (header.nx, header.ny, header.nz) == (4, 5, 6)
+        assert header.mode == 2 and header.dtype == np.dtype("<f4")
+        assert header.axis_order == "XYZ"
+        assert header.voxel_size == pytest.approx((1.5, 1.5, 1.5))
+        assert header.labels == ["made by test_mrc"]
+        assert header.dmax == VOLUME.max()
+
+    def test_big_endian_without_machine_stamp(self, tmp_path):
+        """Test that the byte order is detected from the header when the machine stamp is empty."""
+        path = write_mrc(tmp_path / "a.map", VOLUME, byte_order=">", machst=False)
+
+        header = MRCHeader.read(path)
+
+        assert header.byte_order == ">" and header.nx == 4
+
+    def test_not_a_map(self, tmp_path):
+        """Test that files without a valid header raise EMDBInvalidMapError."""
+        (tmp_path / "short.map").write_bytes(b"MAP")
+        (tmp_path / "zeros.map").write_bytes(bytes(2048))
+
+        with pytest.raises(EMDBInvalidMapError):
+            MRCHeader.read(str(tmp_path / "short.map"))
+        with pytest.raises(EMDBInvalidMapError):
+            MRCHeader.read(str(tmp_path / "zeros.map"))
+
+
+class TestMRCMap:
+    """Tests for memory-mapped voxel access."""
+
+    def test_data_is_memory_mapped(self, tmp_path):
+        """Test that voxels are a memmap indexed [z, y, x] equal to the written volume."""
+        path = write_mrc(tmp_path / "a.map", VOLUME)
+
+        with open_map(path) as volume:
+            assert isinstance(volume.raw, np.memmap)
+            assert np.shares_memory(volume.data, volume.raw)
+            assert volume.shape == (6, 5, 4)
+            np.testing.assert_array_equal(volume.data, VOLUME)
+            np.testing.assert_array_equal(volume.data[2:4, 1:3, 0:2], VOLUME[2:4, 1:3, 0:2])
+
+    @pytest.mark.parametrize("axis_order", [(2, 1, 3), (3, 2, 1), (2, 3, 1)])
+    def test_axis_order_is_transposed(self, tmp_path, axis_order):
+        """Test that maps stored in another axis order are still indexed [z, y, x], without a copy."""
+        path = write_mrc(tmp_path / "a.map", VOLUME, axis_order=axis_order)
+
+        with open_map(path) as volume:
+            np.testing.assert_array_equal(volume.data, VOLUME)
+            assert np.shares_memory(volume.data, volume.raw)
+
+    def test_extended_header_and_byte_order(self, tmp_path):
+        """Test that voxels start after the extended header and big-endian data reads correctly."""
+        volume_i2 = (VOLUME - 50).astype(np.int16)
+        path = write_mrc(tmp_path / "a.map", volume_i2, byte_order=">", extended=bytes(96))
+
+        with open_map(path) as volume:
+            assert volume.header.data_offset == 1024 + 96
+            np.testing.assert_array_equal(volume.data, volume_i2)
+
+    def test_read_write_mode(self, tmp_path):
+        """Test that voxels written through an r+ map are saved to the file."""
+        path = write_mrc(tmp_path / "a.map", VOLUME)
+
+        with open_map(path, mode="r+") as volume:
+            volume.data[0, 0, 0] = -1.0
+
+        with open_map(path) as volume:
+            assert volume.data[0, 0, 0] == -1.0
+            assert not volume.data.flags.writeable
+
+    def test_gzipped_and_truncated_maps(self, tmp_path):
+        """Test that gzipped and truncated maps raise EMDBInvalidMapError."""
+        path = write_mrc(tmp_path / "a.map", VOLUME)
+        with open(path, "rb") as f:
+            (tmp_path / "short.map").write_bytes(f.read(1024 + 10))
+
+        with pytest.raises(EMDBInvalidMapError):
+            MRCMap(str(tmp_path / "a.map.gz"))
+        with pytest.raises(EMDBInvalidMapError):
+            MRCMap(str(tmp_path / "short.map"))
+
+
+class TestMetadataCheck:
+    """Tests for cross-checking headers against the API metadata."""
+
+    def test_matching_metadata(self, tmp_path):
+        """Test that a map agreeing with its metadata opens without mismatches."""
+        path = write_mrc(tmp_path / "a.map", VOLUME)
+        metadata = map_metadata()
+
+        with metadata.open_map(path) as volume:
+            assert volume.mismatches == []
+
+    def test_axis_order_metadata(self, tmp_path):
+        """Test that the metadata axis order is compared with mapc, mapr and maps."""
+        path = write_mrc(tmp_path / "a.map", VOLUME, axis_order=(2, 1, 3))
+
+        # Columns run along Y, so the dimensions are (ny, nx, nz) while sampling and cell stay in X, Y, Z
+        metadata = map_metadata(axis_order="YXZ", dimensions={"col": 5, "row": 4, "sec": 6})
+
+        mismatches = compare_header(MRCHeader.read(path), metadata)
+
+        assert mismatches == []
+
+    def test_mismatch_raises(self, tmp_path):
+        """Test that a header disagreeing with the metadata raises EMDBMapMismatchError."""
+        path = write_mrc(tmp_path / "a.map", VOLUME)
+        metadata = map_metadata(shape_xyz=(4, 5, 7))
+
+        with pytest.raises(EMDBMapMismatchError) as excinfo:
+            metadata.open_map(path)
+
+        assert excinfo.value.field == "dimensions"
+        assert excinfo.value.expected == (4, 5, 7)
+        assert excinfo.value.actual == (4, 5, 6)
+
+    def test_mismatches_kept_when_not_strict(self, tmp_path):
+        """Test that strict=False opens the map and records every mismatch."""
+        path = write_mrc(tmp_path / "a.map", VOLUME)
+        metadata = map_metadata(voxel_size=2.0, data_type="IMAGE STORED AS SIGNED INTEGER (2 BYTES)")
+
+        with metadata.open_map(path, strict=False) as volume:
+            fields = [mismatch.field for mismatch in volume.mismatches]
+
+        assert fields == ["data_type", "cell a", "cell b", "cell c"]
+
+    def test_missing_metadata_is_skipped(self, tmp_path):
+        """Test that fields missing from the API metadata are not compared."""
+        path = write_mrc(tmp_path / "a.map", VOLUME)
+        metadata = map_metadata(dimensions={}, cell={}, axis_order={}, data_type="")
+
+        assert compare_header(MRCHeader.read(path), metadata) == []
+
+    def test_map_file_size(self, tmp_path):
+        """Test that the size estimated from the metadata matches the written map, and needs dimensions."""
+        path = write_mrc(tmp_path / "a.map", VOLUME)
+
+        assert map_file_size(map_metadata()) == os.path.getsize(path)
+        assert map_file_size(map_metadata(data_type="IMAGE STORED AS SIGNED BYTE")) == 1024 + VOLUME.size
+        assert map_file_size(map_metadata(dimensions={})) is None
@@ -0,0 +1,97 @@
+"""Unit tests for the EMDB rate limiter."""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from emdb.ratelimit import TokenBucketRateLimiter
+
+
+class TestTokenBucketRateLimiter:
+    """Tests for TokenBucketRateLimiter."""
+
+    def test_invalid_parameters(self):
+        """Test that non-positive rates and empty buckets are rejected."""
+        with pytest.raises(ValueError):
+            TokenBucketRateLimiter(rate=0)
+        with pytest.raises(ValueError):
+            TokenBucketRateLimiter(rate=1, burst=0)
+
+    def test_burst_is_not_throttled(self):
+        """Test that a full bucket serves `burst` calls without waiting."""
+        limiter = TokenBucketRateLimiter(rate=1, burst=3)
+
+        waits = [limiter.acquire() for _ in range(3)]
+
+        assert waits == [0.0, 0.0, 0.0]
+        assert limiter.stats.throttled == 0
+
+    def test_sustained_rate_is_enforced(self):
+        """Test that calls beyond the burst are spaced at the sustained rate."""
+        limiter = TokenBucketRateLimiter(rate=20, burst=1)
+
+        start = time.monotonic()
+        for _ in range(5):
+            limiter.acquire()
+        elapsed = time.monotonic() - start
+
+        assert elapsed >= 0.19
+        stats = limiter.stats
+        assert stats.acquired == 5
+        assert stats.throttled == 4
+        assert stats.total_wait_seconds == pytest.approx(0.2, abs=0.03)
+
+    def test_idle_time_refills_bucket(self):
+        """Test that tokens are refilled while the limiter is idle."""
+        limiter = TokenBucketRateLimiter(rate=50, burst=1)
+        limiter.acquire()
+        time.sleep(0.03)
+
+        assert limiter.acquire() == 0.0
+
+    def test_thread_safe_acquisition(self):
+        """Test that concurrent threads never exceed the configured rate."""
+        limiter = TokenBucketRateLimiter(rate=50, burst=2)
+        times = []
+        lock = threading.Lock()
+
+        def worker():
+            limiter.acquire()
+            with lock:
+                times.append(time.monotonic())
+
+        threads = [threading.Thread(target=worker) for _ in range(12)]
+        start = time.monotonic()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        # 2 burst tokens, then 10 more at 50/s
+        assert max(times) - start >= 0.19
+        assert limiter.stats.acquired == 12
+
+    def test_async_acquisition(self):
+        """Test that asyncio tasks wait without blocking each other."""
+        limiter = TokenBucketRateLimiter(rate=20, burst=1)
+
+        async def run():
+            start = time.monotonic()
+            waits = await asyncio.gather(*(limiter.acquire_async() for _ in range(4)))
+            return time.monotonic() - start, waits
+
+        elapsed, waits = asyncio.run(run())
+
+        assert elapsed >= 0.14
+        assert sorted(waits)[-1] == pytest.approx(0.15, abs=0.02)
+
+    def test_reset_stats(self):
+        """Test that counters can be reset."""
+        limiter = TokenBucketRateLimiter(rate=100, burst=1)
+        limiter.acquire()
+        limiter.acquire()
+        limiter.reset_stats()
+
+        assert limiter.stats.acquired == 0
+        assert limiter.stats.total_wait_seconds == 0.0
@@ -0,0 +1,146 @@
+"""Unit tests for reading remote files without downloading them."""
+import gzip
+import io
+
+import pytest
+
+from emdb.client import EMDB
+from emdb.exceptions import EMDBFileNotFoundError, EMDBNetworkError
+from emdb.remote import RemoteFile, RemoteFileChangedError, open_remote
+from emdb.retry import RetryPolicy
+from tests.standin_server import RangedFile, served_file
+
+DATA = bytes(range(256)) * 4096
+
+
+class TestRemoteFile:
+    """Tests for RemoteFile and open_remote."""
+
+    def test_read_whole_file(self, standin_server):
+        """Test that the file reads back in full through the buffered reader."""
+        server = standin_server(routes=RangedFile(DATA).routes)
+
+        with served_file(server).open() as f:
+            assert f.read() == DATA
+
+    def test_partial_read_does_not_transfer_the_file(self, standin_server):
+        """Test that reading a header only fetches about one buffer of the file."""
+        remote = RangedFile(DATA * 16)
+        server = standin_server(routes=remote.routes)
+
+        with served_file(server).open(buffer_size=64 * 1024) as f:
+            assert f.read(1024) == DATA[:1024]
+
+        assert remote.sent < len(remote.data)
+
+    def test_seek_uses_ranges(self, standin_server):
+        """Test that seeking far ahead or back continues with a Range request."""
+        remote = RangedFile(DATA)
+        server = standin_server(routes=remote.routes)
+
+        with served_file(server).open(buffer_size=4096) as f:
+            assert f.seekable()
+            f.seek(len(DATA) - 100)
+            assert f.read() == DATA[-100:]
+            f.seek(10)
+            assert f.read(5) == DATA[10:15]
+            assert f.tell() == 15
+            f.seek(-10, io.SEEK_END)
+            assert f.read() == DATA[-10:]
+
+        assert f"bytes={len(DATA) - 100}-" in remote.ranges
+        assert "bytes=10-" in remote.ranges
+
+    def test_short_forward_seek_reuses_response(self, standin_server):
+        """Test that a short forward seek skips bytes on the open response instead of a new request."""
+        remote = RangedFile(DATA)
+        server = standin_server(routes=remote.routes)
+
+        raw = RemoteFile(served_file(server))
+        raw.read(10)
+        raw.seek(1000)
+
+        assert raw.read(10) == DATA[1000:1010]
+        assert remote.ranges == [None]
+        raw.close()
+
+    def test_resumes_after_dropped_connection(self, standin_server):
+        """Test that a dropped connection is resumed from the current position."""
+        remote = RangedFile(DATA, drops=[300_000])
+        server = standin_server(routes=remote.routes)
+
+        with served_file(server, client=EMDB(retry_policy=RetryPolicy(backoff_factor=0))).open() as f:
+            assert f.read() == DATA
+
+        assert remote.ranges[1] == "bytes=300000-"
+
+    def test_not_seekable_without_ranges(self, standin_server):
+        """Test that a server without range support gives a readable, non-seekable file."""
+        server = standin_server(routes=RangedFile(DATA, honor_ranges=False).routes)
+
+        with served_file(server).open() as f:
+            assert not f.seekable()
+            assert f.read(10) == DATA[:10]
+            with pytest.raises(io.UnsupportedOperation):
+                f.seek(0)
+
+    def test_changed_file_is_detected(self, standin_server):
+        """Test that a file replaced on the server between two ranges is not mixed up."""
+        remote = RangedFile(DATA)
+        server = standin_server(routes=remote.routes)
+
+        with served_file(server).open(buffer_size=4096) as f:
+            f.read(10)
+            remote.etag = '"v2"'
+            f.seek(len(DATA) // 2)
+            with pytest.raises(RemoteFileChangedError):
+                f.read(10)
+
+    def test_gzip_is_transparent(self, standin_server):
+        """Test that .gz files are gunzipped while they are read, and can be read raw."""
+        remote = RangedFile(gzip.compress(DATA))
+        server = standin_server(routes=remote.routes)
+        figure = served_file(server, "emd_1234.map.gz")
+
+        with figure.open() as f:
+            assert f.read(1024) == DATA[:1024]
+            f.seek(len(DATA) - 10)
+            assert f.read() == DATA[-10:]
+        with figure.open(decompress=False) as f:
+            assert gzip.decompress(f.read()) == DATA
+
+    def test_text_wrapper(self, standin_server):
+        """Test that a remote file can be read as text."""
+        server = standin_server(routes=RangedFile(b"<entry>\n  <id>EMD-1234</id>\n</entry>\n").routes)
+
+        with io.TextIOWrapper(served_file(server, "emd-1234.xml").open(), encoding="utf-8") as f:
+            assert [line.strip() for line in f] == ["<entry>", "<id>EMD-1234</id>", "</entry>"]
+
+    def test_missing_file(self, standin_server):
+        """Test that a missing file raises EMDBFileNotFoundError on the first read."""
+        server = standin_server()
+
+        f = served_file(server).open()
+        with pytest.raises(EMDBFileNotFoundError):
+            f.read(1)
+        f.close()
+
+    def test_closed_file(self, standin_server):
+        """Test that a closed remote file cannot be read."""
+        server = standin_server(routes=RangedFile(DATA).routes)
+
+        raw = RemoteFile(served_file(server))
+        raw.close()
+
+        with pytest.raises(ValueError):
+            raw.read(1)
+
+    def test_gives_up_after_retries(self, standin_server):
+        """Test that a file dropping every connection before any data raises EMDBNetworkError."""
+        server = standin_server(routes=RangedFile(DATA, drops=[10] + [0] * 10).routes)
+        figure = served_file(server)
+
+        with open_remote(figure, retry_policy=RetryPolicy(max_attempts=2, backoff_factor=0)) as f:
+            assert f.read(10) == DATA[:10]
+            with pytest.raises(EMDBNetworkError):
+                f.read()
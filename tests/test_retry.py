@@ -0,0 +1,61 @@
+"""Unit tests for the EMDB retry policy."""
+import time
+from email.utils import formatdate
+
+import pytest
+
+from emdb.retry import RetryPolicy
+
+
+class TestRetryPolicy:
+    """Tests for RetryPolicy."""
+
+    def test_invalid_max_attempts(self):
+        """Test that a policy needs at least one attempt."""
+        with pytest.raises(ValueError):
+            RetryPolicy(max_attempts=0)
+
+    def test_backoff_is_exponential_and_capped(self):
+        """Test the backoff sequence without jitter."""
+        policy = RetryPolicy(backoff_factor=0.5, max_backoff=3, jitter=False)
+
+        assert [policy.backoff(n) for n in range(1, 6)] == [0.5, 1.0, 2.0, 3, 3]
+
+    def test_backoff_jitter_stays_within_bounds(self):
+        """Test that jittered delays never exceed the computed backoff."""
+        policy = RetryPolicy(backoff_factor=1, jitter=True)
+
+        for _ in range(50):
+            assert 0 <= policy.backoff(3) <= 4
+
+    def test_retry_after_takes_precedence(self):
+        """Test that a Retry-After delay replaces the computed backoff."""
+        policy = RetryPolicy(backoff_factor=0.5, jitter=False)
+
+        assert policy.delay(1, retry_after=7) == 7
+        assert RetryPolicy(respect_retry_after=False, jitter=False).delay(1, retry_after=7) == 0.5
+
+    def test_parse_retry_after(self):
+        """Test parsing Retry-After as seconds and as an HTTP date."""
+        assert RetryPolicy.parse_retry_after("12") == 12.0
+        assert RetryPolicy.parse_retry_after(None) is None
+        assert RetryPolicy.parse_retry_after("soon") is None
+        in_ten = RetryPolicy.parse_retry_after(formatdate(time.time() + 10, usegmt=True))
+        assert 8 <= in_ten <= 10
+
+    def test_should_retry_limits(self):
+        """Test the attempt, elapsed time and idempotency limits."""
+        policy = RetryPolicy(max_attempts=3, max_elapsed=10)
+
+        assert policy.should_retry("GET", attempt=1, elapsed=0, delay=1)
+        assert not policy.should_retry("GET", attempt=3, elapsed=0, delay=1)
+        assert not policy.should_retry("GET", attempt=1, elapsed=9.5, delay=1)
+        assert not policy.should_retry("POST", attempt=1, elapsed=0, delay=1)
+
+    def test_retryable_statuses(self):
+        """Test the default retryable status codes."""
+        policy = RetryPolicy()
+
+        assert policy.is_retryable_status(429)
+        assert policy.is_retryable_status(503)
+        assert not policy.is_retryable_status(404)
@@ -0,0 +1,370 @@
+"""Unit tests for the download scheduler."""
+import gzip
+import hashlib
+import os
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+from emdb.client import EMDB
+from emdb.exceptions import EMDBChecksumError, EMDBFileNotFoundError, EMDBInsufficientSpaceError, EMDBNetworkError
+from emdb.models.entry import EMDBEntry
+from emdb.models.files import FigureFile, PrimaryMapFile
+from emdb.retry import RetryPolicy
+from emdb.scheduler import DownloadProgress, DownloadScheduler, required_space
+from tests.standin_server import RangedFile, served_file
+
+SIZE = 64 * 1024
+
+
+class ConcurrencyRoute:
+    """Stand-in route serving SIZE bytes per file after a delay, recording the peak concurrency per host."""
+
+    def __init__(self, delay=0.1, missing=()):
+        self.delay = delay
+        self.missing = set(missing)
+        self.lock = threading.Lock()
+        self.active = Counter()
+        self.peak = Counter()
+        self.order = []
+
+    def route(self, handler, match):
+        if match.group(1) in self.missing:
+            handler.send_body(404, b"not found", "text/plain")
+            return
+        host = handler.headers["Host"]
+        with self.lock:
+            self.order.append(match.group(1))
+            self.active[host] += 1
+            self.peak[host] = max(self.peak[host], self.active[host])
+        time.sleep(self.delay)
+        with self.lock:
+            self.active[host] -= 1
+        handler.send_body(200, bytes(SIZE), "application/octet-stream")
+
+    @property
+    def routes(self):
+        return {r"/files/(.+)": self.route}
+
+    @property
+    def total_peak(self):
+        return sum(self.peak.values())
+
+
+def make_figures(base_url, n, client=None):
+    figures = []
+    for i in range(n):
+        figure = FigureFile(filename=f"400_{1000 + i}.gif", size_kbytes=SIZE / 1024)
+        figure._emdb_id = f"EMD-{1000 + i}"
+        figure._client = client
+        figure._BASE_FIGURES_URL = f"{base_url}/files"
+        figures.append(figure)
+    return figures
+
+
+class TestDownloadScheduler:
+    """Tests for DownloadScheduler."""
+
+    def test_downloads_concurrently(self, standin_server, tmp_path):
+        """Test that files are downloaded in parallel, up to max_workers at a time."""
+        remote = ConcurrencyRoute(delay=0.2)
+        server = standin_server(routes=remote.routes)
+
+        start = time.monotonic()
+        with DownloadScheduler(max_workers=3) as scheduler:
+            results = scheduler.download(make_figures(server.url, 6, EMDB()), str(tmp_path))
+        elapsed = time.monotonic() - start
+
+        assert all(result.ok for result in results)
+        assert [result.index for result in results] == list(range(6))
+        assert remote.total_peak == 3
+        assert elapsed < 6 * 0.2
+        assert sorted(os.listdir(tmp_path)) == sorted(f"400_{1000 + i}.gif" for i in range(6))
+
+    def test_per_host_limit(self, standin_server, tmp_path):
+        """Test that a busy host does not hold back files for another host."""
+        remote = ConcurrencyRoute(delay=0.1)
+        server = standin_server(routes=remote.routes)
+        other_host = server.url.replace("127.0.0.1", "localhost")
+        figures = make_figures(server.url, 4) + make_figures(other_host, 4)
+        for i, figure in enumerate(figures):
+            figure.filename = f"{i}.gif"
+
+        with DownloadScheduler(max_workers=4, max_per_host=2) as scheduler:
+            results = scheduler.download(figures, str(tmp_path))
+
+        assert all(result.ok for result in results)
+        assert set(remote.peak.values()) == {2}
+        assert len(remote.peak) == 2
+
+    def test_aggregate_progress(self, standin_server, tmp_path):
+        """Test that progress is reported across files instead of printed."""
+        server = standin_server(routes=ConcurrencyRoute(delay=0).routes)
+        reports = []
+
+        with DownloadScheduler(max_workers=2, progress=reports.append) as scheduler:
+            scheduler.download(make_figures(server.url, 3), str(tmp_path))
+
+        assert isinstance(reports[-1], DownloadProgress)
+        assert reports[-1].files_done == 3
+        assert reports[-1].files_pending == 0
+        assert reports[-1].bytes_done == reports[-1].bytes_total == 3 * SIZE
+        assert scheduler.progress.files_done == 3
+
+    def test_errors_are_collected(self, standin_server, tmp_path):
+        """Test that a failing file is reported in its result without stopping the others."""
+        remote = ConcurrencyRoute(delay=0, missing={"EMD-1001/400_1001.gif"})
+        server = standin_server(routes=remote.routes)
+
+        with DownloadScheduler() as scheduler:
+            results = scheduler.download(make_figures(server.url, 3), str(tmp_path))
+
+        assert [result.ok for result in results] == [True, False, True]
+        assert isinstance(results[1].error, EMDBFileNotFoundError)
+        assert scheduler.progress.files_failed == 1
+
+    def test_bandwidth_cap(self, standin_server, tmp_path):
+        """Test that the combined download rate stays under the bandwidth cap."""
+        server = standin_server(routes=ConcurrencyRoute(delay=0).routes)
+
+        start = time.monotonic()
+        with DownloadScheduler(max_workers=4, bandwidth=4 * SIZE, chunk_size=SIZE // 4) as scheduler:
+            scheduler.download(make_figures(server.url, 4), str(tmp_path))
+        elapsed = time.monotonic() - start
+
+        # 4 * SIZE bytes at 4 * SIZE bytes per second, less the first chunk's burst
+        assert elapsed > 0.7
+
+    def test_segments_count_against_host_limit(self, standin_server, tmp_path):
+        """Test that segmented downloads never open more connections to a host than max_per_host."""
+        class SlowRangedFile(RangedFile):
+            active = peak = 0
+            lock = threading.Lock()
+
+            def route(self, handler, match):
+                with self.lock:
+                    self.active += 1
+                    self.peak = max(self.peak, self.active)
+                time.sleep(0.05)
+                super().route(handler, match)
+                with self.lock:
+                    self.active -= 1
+
+        remote = SlowRangedFile(bytes(range(256)) * 1024)
+        server = standin_server(routes=remote.routes)
+        # size_kbytes of 64 MiB asks for 8 segments each
+        figures = [served_file(server, f"{i}.gif", client=EMDB(), size_kbytes=64 * 1024) for i in range(2)]
+
+        with DownloadScheduler(max_workers=4, max_per_host=3, segmented=True, check_space=False,
+                               allocate=False) as scheduler:
+            results = scheduler.download(figures, str(tmp_path))
+
+        assert all(result.ok for result in results)
+        assert (tmp_path / "0.gif").read_bytes() == remote.data
+        assert remote.peak <= 3
+        # The first file takes the three free connections, the second the ones it frees
+        assert len(remote.ranges) == 6
+
+    def test_resumed_bytes_are_not_charged(self, standin_server, tmp_path):
+        """Test that the bandwidth cap and progress only count the bytes a resumed download receives."""
+        server = standin_server(routes=RangedFile(bytes(8 * SIZE), drops=[7 * SIZE]).routes)
+        figure = served_file(server, client=EMDB(retry_policy=RetryPolicy(max_attempts=1)))
+        with pytest.raises(EMDBNetworkError):
+            figure.download(f"{tmp_path}/")
+        figure.size_kbytes = 8 * SIZE / 1024
+
+        start = time.monotonic()
+        with DownloadScheduler(bandwidth=2 * SIZE, chunk_size=SIZE // 4) as scheduler:
+            results = scheduler.download([figure], str(tmp_path))
+        elapsed = time.monotonic() - start
+
+        assert results[0].ok and results[0].size == 8 * SIZE
+        # SIZE bytes at 2 * SIZE bytes per second; charging the 7 * SIZE on disk would take over 3 seconds
+        assert elapsed < 1.5
+        assert scheduler.progress.bytes_done == scheduler.progress.bytes_total == SIZE
+
+    def test_decompress(self, standin_server, tmp_path):
+        """Test that scheduled .gz files are saved decompressed without .gz and other files unchanged."""
+        payloads = {"400_1000.gif.gz": gzip.compress(b"map data"), "400_1001.gif": b"GIF89a figure"}
+
+        def route(handler, match):
+            handler.send_body(200, payloads[os.path.basename(match.group(1))], "application/octet-stream")
+        server = standin_server(routes={r"/files/(.+)": route})
+        figures = make_figures(server.url, 2)
+        figures[0].filename += ".gz"
+
+        with DownloadScheduler(decompress=True) as scheduler:
+            results = scheduler.download(figures, str(tmp_path))
+
+        assert all(result.ok for result in results)
+        assert [os.path.basename(result.output_path) for result in results] == ["400_1000.gif", "400_1001.gif"]
+        assert (tmp_path / "400_1000.gif").read_bytes() == b"map data"
+        assert (tmp_path / "400_1001.gif").read_bytes() == b"GIF89a figure"
+
+    def test_verify_skips_unlisted_files(self, standin_server, tmp_path):
+        """Test that verify checks the listed files and downloads those without a listing entry unchecked."""
+        payloads = {name: name.encode() for name in ("emd_1234.map.gz", "emd_1234_half_map_1.map.gz",
+                                                     "emd_1234_additional_1.map.gz", "400_1234.gif")}
+        listing = (f"{hashlib.md5(b'emd_1234.map.gz').hexdigest()}  map/emd_1234.map.gz\n"
+                   f"{'0' * 32}  other/emd_1234_additional_1.map.gz\n").encode()
+
+        def route(handler, match):
+            name = os.path.basename(match.group(1))
+            handler.send_body(200, listing if name == "md5sum.txt" else payloads[name], "application/octet-stream")
+        server = standin_server(routes={r"/files/(.+)": route})
+        files = [served_file(server, name) for name in payloads]
+        for file in files[:3]:
+            # Served from the entry's FTP directory, unlike the figure
+            file._BASE_FTP_URL = f"{server.url}/files"
+
+        with DownloadScheduler(verify=True) as scheduler:
+            results = scheduler.download(files, str(tmp_path))
+
+        assert [result.ok for result in results] == [True, True, False, True]
+        assert isinstance(results[2].error, EMDBChecksumError)
+        assert (tmp_path / "400_1234.gif").read_bytes() == b"400_1234.gif"
+
+    def test_invalid_limits(self):
+        """Test that non-positive limits are rejected."""
+        with pytest.raises(ValueError):
+            DownloadScheduler(max_workers=0)
+        with pytest.raises(ValueError):
+            DownloadScheduler(max_per_host=0)
+        with pytest.raises(ValueError):
+            DownloadScheduler(policy="random")
+
+
+class TestSchedulingPolicies:
+    """Tests for size-aware scheduling and the disk-space preflight."""
+
+    @staticmethod
+    def sized_figures(base_url, sizes_kbytes):
+        figures = make_figures(base_url, len(sizes_kbytes))
+        for figure, size_kbytes in zip(figures, sizes_kbytes):
+            figure.size_kbytes = size_kbytes
+        return figures
+
+    @pytest.mark.parametrize("policy, expected", [
+        ("fifo", [2, 8, 1, 4]),
+        ("largest_first", [8, 4, 2, 1]),
+        ("smallest_first", [1, 2, 4, 8]),
+    ])
+    def test_size_policies(self, standin_server, tmp_path, policy, expected):
+        """Test that files start in the order given by the policy and their size_kbytes."""
+        remote = ConcurrencyRoute(delay=0)
+        server = standin_server(routes=remote.routes)
+        figures = self.sized_figures(server.url, [2, 8, 1, 4])
+        size_of = {f"{figure._emdb_id}/{figure.filename}": figure.size_kbytes for figure in figures}
+
+        with DownloadScheduler(max_workers=1, policy=policy) as scheduler:
+            results = scheduler.download(figures, str(tmp_path))
+
+        assert [size_of[path] for path in remote.order] == expected
+        assert [result.file for result in results] == figures
+
+    def test_fair_policy_interleaves_entries(self, standin_server, tmp_path):
+        """Test that the fair policy starts files of every entry before a second file of any entry."""
+        remote = ConcurrencyRoute(delay=0.1)
+        server = standin_server(routes=remote.routes)
+        figures = make_figures(server.url, 5)
+        for i, figure in enumerate(figures):
+            figure._emdb_id = "EMD-1000" if i < 4 else "EMD-2000"
+            figure.filename = f"{i}.gif"
+
+        with DownloadScheduler(max_workers=2, policy="fair") as scheduler:
+            scheduler.download(figures, str(tmp_path))
+
+        assert sorted(remote.order[:2]) == ["EMD-1000/0.gif", "EMD-2000/4.gif"]
+
+    def test_preflight_rejects_batch_that_does_not_fit(self, standin_server, tmp_path):
+        """Test that a batch larger than the free disk space fails before anything is downloaded."""
+        remote = ConcurrencyRoute(delay=0)
+        server = standin_server(routes=remote.routes)
+        figures = self.sized_figures(server.url, [1, 2 ** 50])
+
+        with DownloadScheduler() as scheduler:
+            with pytest.raises(EMDBInsufficientSpaceError) as excinfo:
+                scheduler.download(figures, str(tmp_path))
+
+        assert excinfo.value.required == required_space(figures)
+        assert remote.order == []
+
+    def test_preflight_can_be_disabled(self, standin_server, tmp_path):
+        """Test that check_space=False downloads without comparing size_kbytes to the free space."""
+        server = standin_server(routes=ConcurrencyRoute(delay=0).routes)
+        figures = self.sized_figures(server.url, [2 ** 50])
+
+        with DownloadScheduler(check_space=False, allocate=False) as scheduler:
+            results = scheduler.download(figures, str(tmp_path))
+
+        assert results[0].ok and results[0].size == SIZE
+
+    def test_preflight_counts_decompressed_maps(self, standin_server, tmp_path):
+        """Test that with decompress a gzipped map counts its size from the dimensions, not size_kbytes."""
+        remote = ConcurrencyRoute(delay=0)
+        server = standin_server(routes=remote.routes)
+        volume = PrimaryMapFile.from_api({
+            "file": "emd_1000.map.gz", "size_kbytes": 1, "dimensions": {"col": 2 ** 14, "row": 2 ** 14, "sec": 2 ** 14},
+            "data_type": "IMAGE STORED AS FLOATING POINT NUMBER (4 BYTES)",
+        })
+        volume._emdb_id = "EMD-1000"
+        volume._BASE_FTP_URL = f"{server.url}/files"
+
+        assert required_space([volume]) == 1024
+        assert required_space([volume], decompress=True) == 1024 + 4 * 2 ** 42
+        with DownloadScheduler(decompress=True) as scheduler:
+            with pytest.raises(EMDBInsufficientSpaceError) as excinfo:
+                scheduler.download([volume], str(tmp_path))
+
+        assert excinfo.value.required == 1024 + 4 * 2 ** 42
+        assert remote.order == []
+
+    def test_required_space(self):
+        """Test that required_space sums size_kbytes in bytes and ignores unknown sizes."""
+        figures = make_figures("http://localhost", 3)
+        figures[0].size_kbytes, figures[1].size_kbytes, figures[2].size_kbytes = 1, 2.5, None
+
+        assert required_space(figures) == 3584
+
+
+class TestDownloadAllFiles:
+    """Tests for downloading every file of entries through the scheduler."""
+
+    @staticmethod
+    def make_entry(emdb_id, base_url, client):
+        entry = EMDBEntry.from_api({"emdb_id": emdb_id, "map": {"file": f"emd_{emdb_id[4:]}.map.gz"}}, client)
+        for file in entry.deposited_files:
+            file._BASE_FTP_URL = f"{base_url}/files"
+            file._BASE_FIGURES_URL = f"{base_url}/files"
+        return entry
+
+    def test_entry_download_all_files(self, standin_server, tmp_path, capsys):
+        """Test that an entry's files are downloaded concurrently without printing."""
+        remote = ConcurrencyRoute(delay=0.2)
+        server = standin_server(routes=remote.routes)
+        entry = self.make_entry("EMD-1234", server.url, EMDB())
+
+        results = entry.download_all_files(str(tmp_path))
+
+        assert [result.file for result in results] == entry.deposited_files
+        assert all(result.ok for result in results)
+        assert remote.total_peak == 2
+        assert sorted(os.listdir(tmp_path)) == ["400_1234.gif", "emd_1234.map.gz"]
+        assert capsys.readouterr().out == ""
+
+    def test_shared_scheduler_across_entries(self, standin_server, tmp_path):
+        """Test that files of many entries run as one batch on a shared scheduler."""
+        remote = ConcurrencyRoute(delay=0.1)
+        server = standin_server(routes=remote.routes)
+        client = EMDB()
+        entries = [self.make_entry(f"EMD-{1000 + i}", server.url, client) for i in range(3)]
+
+        with DownloadScheduler(max_workers=6, max_per_host=6) as scheduler:
+            results = scheduler.download_entries(entries, str(tmp_path))
+
+        assert len(results) == 6 and all(result.ok for result in results)
+        assert remote.total_peak == 6
+        assert sorted(os.listdir(tmp_path)) == ["EMD-1000", "EMD-1001", "EMD-1002"]
+        assert sorted(os.listdir(tmp_path / "EMD-1001")) == ["400_1001.gif", "emd_1001.map.gz"]
@@ -1,9 +1,15 @@
 """Unit tests for EMDB search and lazy_entry modules."""
+import threading
+import time
+
+import numpy as np
 import pytest
 from unittest.mock import MagicMock, Mock
 from emdb.models.search import EMDBSearchResults
 from emdb.models.lazy_entry import LazyEMDBEntry
 from emdb.models.entry import EMDBEntry
+from emdb.bulk import run_bulk
+from emdb.exceptions import EMDBNotFoundError
 
 
 class TestLazyEMDBEntry:
@@ -124,3 +130,377 @@ class TestEMDBSearchResults:
         results = EMDBSearchResults.from_api(csv_data, mock_client)
 
         assert len(results) == 4
+
+
+class FakeClient:
+    """Minimal client recording get_entry calls and the peak number in flight."""
+
+    def __init__(self, delay=0.01, missing=()):
+        self.delay = delay
+        self.missing = set(missing)
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def get_entry(self, emdb_id):
+        with self._lock:
+            self.calls.append(emdb_id)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        if emdb_id in self.missing:
+            raise EMDBNotFoundError("Entry not found", 404)
+        entry = MagicMock(spec=EMDBEntry)
+        entry.id = emdb_id
+        return entry
+
+    def get_entries(self, emdb_ids, max_workers=4):
+        return run_bulk(self.get_entry, emdb_ids, max_workers)
+
+
+def make_results(client, n):
+    csv_data = "emdb_id\n" + "\n".join(f"EMD-{1000 + i}" for i in range(n))
+    return EMDBSearchResults.from_api(csv_data, client)
+
+
+class TestSearchResultsReadAhead:
+    """Tests for prefetching and materializing search results."""
+
+    def test_prefetch_yields_entries_in_order(self):
+        """Test that prefetched entries come back in result order."""
+        client = FakeClient()
+        results = make_results(client, 20)
+
+        ids = [entry.id for entry in results.prefetch(window=4)]
+
+        assert ids == [f"EMD-{1000 + i}" for i in range(20)]
+        assert 1 < client.max_in_flight <= 4
+
+    def test_prefetch_window_bounds_read_ahead(self):
+        """Test that no more than `window` entries are fetched ahead of the caller."""
+        client = FakeClient(delay=0)
+        results = make_results(client, 50)
+
+        iterator = results.prefetch(window=3)
+        next(iterator)
+        time.sleep(0.05)
+
+        assert len(client.calls) <= 4
+        iterator.close()
+
+    def test_prefetch_does_not_retain_entries(self):
+        """Test that prefetching leaves the lazy entries unloaded."""
+        results = make_results(FakeClient(delay=0), 5)
+
+        list(results.prefetch(window=2))
+
+        assert all(lazy._entry is None for lazy in results.entries)
+
+    def test_prefetch_raises_failed_entry_in_position(self):
+        """Test that a failure is raised when the caller reaches that entry."""
+        results = make_results(FakeClient(delay=0, missing={"EMD-1002"}), 5)
+        seen = []
+
+        with pytest.raises(EMDBNotFoundError):
+            for entry in results.prefetch(window=2):
+                seen.append(entry.id)
+
+        assert seen == ["EMD-1000", "EMD-1001"]
+
+    def test_slice_returns_search_results(self):
+        """Test that slicing keeps the client and shares the lazy entries."""
+        client = FakeClient()
+        results = make_results(client, 10)
+
+        page = results[2:5]
+
+        assert isinstance(page, EMDBSearchResults)
+        assert [lazy._id for lazy in page] == ["EMD-1002", "EMD-1003", "EMD-1004"]
+        assert page.entries[0] is results.entries[2]
+        assert page._client is client
+
+    def test_materialize_loads_slice_concurrently(self):
+        """Test that materialize loads every entry of a slice in parallel and keeps them."""
+        # Long enough for all six calls to overlap even if a garbage collection pauses the threads
+        client = FakeClient(delay=0.2)
+        results = make_results(client, 10)
+
+        entries = results[:6].materialize(concurrency=6)
+
+        assert [entry.id for entry in entries] == [f"EMD-{1000 + i}" for i in range(6)]
+        assert client.max_in_flight == 6
+        assert results.entries[0]._entry is entries[0]
+        assert results.entries[6]._entry is None
+        # Already loaded entries are not fetched again
+        results[:6].materialize()
+        assert len(client.calls) == 6
+
+    def test_materialize_raises_after_loading_others(self):
+        """Test that failures are raised but successful entries stay loaded."""
+        results = make_results(FakeClient(delay=0, missing={"EMD-1001"}), 3)
+
+        with pytest.raises(EMDBNotFoundError):
+            results.materialize()
+
+        assert results.entries[0]._entry is not None
+        assert results.entries[2]._entry is not None
+
+
+class TestCompactSearchResults:
+    """Tests for the array-backed storage of search hits."""
+
+    def test_empty_results(self):
+        """Test that a response with only the header gives empty results."""
+        results = EMDBSearchResults.from_api("emdb_id\n", MagicMock())
+
+        assert len(results) == 0
+        assert list(results) == []
+        assert "EMD-1234" not in results
+
+    def test_hits_stored_as_accession_numbers(self):
+        """Test that hits are kept as an integer array, not as entry objects."""
+        results = make_results(FakeClient(), 5)
+
+        assert results.accessions.dtype == np.int32
+        assert results.accessions.tolist() == [1000, 1001, 1002, 1003, 1004]
+        assert len(results._views) == 0
+
+    def test_ids_are_zero_padded(self):
+        """Test that short and long accession numbers are formatted like EMDB IDs."""
+        results = EMDBSearchResults.from_ids(["EMD-0042", "EMD-51234"], MagicMock())
+
+        assert [lazy._id for lazy in results] == ["EMD-0042", "EMD-51234"]
+        assert results[-1]._id == "EMD-51234"
+
+    def test_views_are_reused_while_referenced(self):
+        """Test that indexing returns the same lazy entry while it is alive, and drops it after."""
+        results = make_results(FakeClient(), 5)
+
+        first = results[0]
+
+        assert results[0] is first
+        assert len(results._views) == 1
+        del first
+        assert len(results._views) == 0
+
+    def test_loaded_views_are_kept(self):
+        """Test that an entry loaded through a temporary view is fetched once, then kept by the results."""
+        client = FakeClient(delay=0)
+        results = make_results(client, 2)
+
+        _ = results[0].get_validation
+        _ = results[0].get_validation
+        for _ in range(2):
+            for lazy in results:
+                _ = lazy.get_validation
+
+        assert client.calls == ["EMD-1000", "EMD-1001"]
+        assert results[1:]._materialized.keys() == {"EMD-1000", "EMD-1001"}
+
+    def test_slice_shares_array(self):
+        """Test that slicing does not copy the accession numbers."""
+        results = make_results(FakeClient(), 100)
+
+        page = results[10:20]
+
+        assert len(page) == 10
+        assert np.shares_memory(page.accessions, results.accessions)
+
+    def test_membership(self):
+        """Test membership by EMDB ID, accession number and lazy entry."""
+        results = EMDBSearchResults.from_ids(["EMD-3000", "EMD-1000", "EMD-2000"], MagicMock())
+
+        assert "EMD-2000" in results
+        assert 1000 in results
+        assert results[0] in results
+        assert "EMD-2001" not in results
+        assert "not an id" not in results
+
+    def test_accessions_are_read_only(self):
+        """Test that callers cannot modify the hits through the accessions array."""
+        results = make_results(FakeClient(), 3)
+
+        with pytest.raises(ValueError):
+            results.accessions[0] = 1
+
+
+def results_of(client, *numbers):
+    return EMDBSearchResults.from_ids([f"EMD-{n}" for n in numbers], client)
+
+
+class TestSearchResultsSetAlgebra:
+    """Tests for combining search results with set operators."""
+
+    def test_intersection_keeps_left_order(self):
+        """Test that & keeps the hits of both results in the order of the left one."""
+        client = FakeClient()
+        combined = results_of(client, 1005, 1001, 1003, 1002) & results_of(client, 1002, 1003, 1009)
+
+        assert isinstance(combined, EMDBSearchResults)
+        assert combined.accessions.tolist() == [1003, 1002]
+        assert combined._client is client
+
+    def test_union_appends_new_hits(self):
+        """Test that | appends the hits only found on the right, without duplicates."""
+        client = FakeClient()
+        combined = results_of(client, 1003, 1001) | results_of(client, 1001, 1002, 1003, 1004)
+
+        assert combined.accessions.tolist() == [1003, 1001, 1002, 1004]
+
+    def test_difference(self):
+        """Test that - drops the hits found on the right."""
+        client = FakeClient()
+        combined = results_of(client, 1001, 1002, 1003) - results_of(client, 1002)
+
+        assert combined.accessions.tolist() == [1001, 1003]
+
+    def test_operations_with_empty_results(self):
+        """Test set operations when one side has no hits."""
+        client = FakeClient()
+        hits = results_of(client, 1001, 1002)
+        empty = EMDBSearchResults.from_api("emdb_id\n", client)
+
+        assert len(hits & empty) == 0
+        assert len(empty & hits) == 0
+        assert (hits | empty).accessions.tolist() == [1001, 1002]
+        assert (empty | hits).accessions.tolist() == [1001, 1002]
+        assert (hits - empty).accessions.tolist() == [1001, 1002]
+
+    def test_operations_do_not_load_entries(self):
+        """Test that combining large results never creates lazy entries or fetches anything."""
+        client = FakeClient()
+        rng = np.random.default_rng(0)
+        left_ids, right_ids = rng.choice(200000, 100000, replace=False), rng.choice(200000, 100000, replace=False)
+        left = EMDBSearchResults.from_ids(left_ids.tolist(), client)
+        right = EMDBSearchResults.from_ids(right_ids.tolist(), client)
+
+        both = left & right
+        either = left | right
+        only_left = left - right
+
+        assert set(both.accessions.tolist()) == set(left_ids.tolist()) & set(right_ids.tolist())
+        assert set(either.accessions.tolist()) == set(left_ids.tolist()) | set(right_ids.tolist())
+        assert set(only_left.accessions.tolist()) == set(left_ids.tolist()) - set(right_ids.tolist())
+        assert len(left._views) == 0
+        assert client.calls == []
+
+    def test_operators_reject_other_types(self):
+        """Test that only search results can be combined with operators."""
+        with pytest.raises(TypeError):
+            _ = results_of(FakeClient(), 1001) & ["EMD-1001"]
+
+    def test_isin_returns_mask(self):
+        """Test isin against IDs, accession numbers and other results, and selecting with the mask."""
+        client = FakeClient()
+        results = results_of(client, 1001, 1002, 1003)
+
+        mask = results.isin(["EMD-1003", "EMD-1001", "EMD-4242"])
+
+        assert mask.dtype == bool
+        assert mask.tolist() == [True, False, True]
+        assert results.isin(np.array([1002])).tolist() == [False, True, False]
+        assert results.isin(results_of(client, 1002)).tolist() == [False, True, False]
+        assert [lazy._id for lazy in results[mask]] == ["EMD-1001", "EMD-1003"]
+
+    def test_isin_with_sparse_ids(self):
+        """Test isin when the IDs are too spread out for a bitmap."""
+        results = EMDBSearchResults.from_ids(["EMD-1", "EMD-500000000", "EMD-7"], FakeClient())
+
+        assert results.isin([7, 500000000, 2000000000]).tolist() == [False, True, True]
+        assert 500000000 in results
+        assert 8 not in results
+        assert 2 ** 40 not in results
+
+
+PROJECTED_CSV = (
+    "emdb_id,structure_determination_method,resolution,title\n"
+    "EMD-1001,singleParticle,3.2,Spike\n"
+    "EMD-1002,,,\"Capsid, open\"\n"
+    "EMD-1003,helical,4.5,Filament\n"
+)
+
+
+class TestProjectedSearchFields:
+    """Tests for search fields stored with the hits."""
+
+    def test_fields_are_typed_columns(self):
+        """Test that known fields get compact types and the others stay strings."""
+        results = EMDBSearchResults.from_api(PROJECTED_CSV, FakeClient())
+
+        assert results.fields == ("structure_determination_method", "resolution", "title")
+        assert results.column("resolution").dtype == np.float32
+        assert list(results.column("structure_determination_method").categories) == ["helical", "singleParticle"]
+        assert results.column("title").tolist() == ["Spike", "Capsid, open", "Filament"]
+
+    def test_projected_attributes_do_not_load(self):
+        """Test that projected fields are read from the search, under their entry attribute names."""
+        client = FakeClient()
+        results = EMDBSearchResults.from_api(PROJECTED_CSV, client)
+
+        assert [(lazy.method, lazy.resolution) for lazy in results] == [
+            ("singleParticle", 3.2), (None, None), ("helical", 4.5)
+        ]
+        assert results[1].title == "Capsid, open"
+        assert client.calls == []
+
+    def test_other_attributes_load_entry(self):
+        """Test that attributes outside the projection fetch the full entry."""
+        client = FakeClient(delay=0)
+        lazy = EMDBSearchResults.from_api(PROJECTED_CSV, client)[0]
+
+        assert lazy.get_validation is not None
+        assert client.calls == ["EMD-1001"]
+
+    def test_id_does_not_load(self):
+        """Test that the EMDB ID of a hit is known without fetching the entry."""
+        client = FakeClient(delay=0)
+
+        assert [(lazy.id, lazy.resolution) for lazy in EMDBSearchResults.from_api(PROJECTED_CSV, client)] == [
+            ("EMD-1001", 3.2), ("EMD-1002", None), ("EMD-1003", 4.5)
+        ]
+        assert client.calls == []
+
+    def test_projected_attributes_after_load(self):
+        """Test that projected fields missing from EMDBEntry are still answered once the entry is loaded."""
+        client = FakeClient(delay=0)
+        lazy = EMDBSearchResults.from_api(PROJECTED_CSV, client)[0]
+
+        assert lazy.title == "Spike"
+        _ = lazy.get_validation
+        assert lazy.title == "Spike"
+        assert client.calls == ["EMD-1001"]
+        with pytest.raises(AttributeError):
+            _ = lazy.no_such_field
+
+    def test_from_rows(self):
+        """Test building results with fields from iter_search rows."""
+        rows = [{"emdb_id": "EMD-1001", "resolution": "2.5"}, {"emdb_id": "EMD-1002", "resolution": ""}]
+
+        results = EMDBSearchResults.from_rows(rows, FakeClient())
+
+        assert [lazy.resolution for lazy in results] == [2.5, None]
+        assert len(EMDBSearchResults.from_rows([], FakeClient())) == 0
+
+    def test_fields_follow_slices_and_set_operations(self):
+        """Test that columns are sliced, masked and combined with the hits."""
+        client = FakeClient()
+        results = EMDBSearchResults.from_api(PROJECTED_CSV, client)
+        others = EMDBSearchResults.from_rows([{"emdb_id": "EMD-2001", "resolution": "1.9", "title": "X"}], client)
+
+        assert results[1:].column("resolution")[1] == np.float32(4.5)
+        assert [lazy._id for lazy in results[results.column("resolution") < 4]] == ["EMD-1001"]
+        combined = results | others
+        assert combined.fields == ("resolution", "title")
+        assert combined[3].resolution == 1.9
+        assert (results - others).fields == results.fields
+
+    def test_search_fields(self):
+        """Test building the fl parameter from a list or a string."""
+        from emdb.models.search import search_fields
+
+        assert search_fields(None) == "emdb_id"
+        assert search_fields(["resolution", "emdb_id", "title"]) == "emdb_id,resolution,title"
+        assert search_fields("resolution, title") == "emdb_id,resolution,title"
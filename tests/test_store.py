@@ -0,0 +1,203 @@
+"""Unit tests for the content-addressed file store."""
+import gzip
+import hashlib
+import os
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+from emdb.scheduler import DownloadScheduler
+from emdb.store import BlobStore, file_digest
+from tests.standin_server import served_file
+
+
+class CountingFiles:
+    """Stand-in route serving fixed files after a delay, counting the GET requests per file."""
+
+    def __init__(self, files, delay=0.0):
+        self.files = files
+        self.delay = delay
+        self.gets = Counter()
+
+    def route(self, handler, match):
+        if match.group(1) not in self.files:
+            handler.send_body(404, b"not found", "text/plain")
+            return
+        if handler.command == "GET":
+            self.gets[match.group(1)] += 1
+        time.sleep(self.delay)
+        handler.send_body(200, self.files[match.group(1)], "application/octet-stream")
+
+    @property
+    def routes(self):
+        return {r"/files/(.+)": self.route}
+
+
+class TestBlobStore:
+    """Tests for BlobStore."""
+
+    def test_downloads_once_and_hardlinks(self, standin_server, tmp_path):
+        """Test that a file fetched into two directories is downloaded once and shares the stored copy."""
+        remote = CountingFiles({"EMD-1234/a.map": b"map data"})
+        server = standin_server(routes=remote.routes)
+        store = BlobStore(str(tmp_path / "store"))
+        figure = served_file(server, "a.map")
+
+        first = store.fetch(figure, f"{tmp_path}/run1/")
+        second = store.fetch(figure, f"{tmp_path}/run2/")
+
+        assert remote.gets["EMD-1234/a.map"] == 1
+        assert open(first, "rb").read() == open(second, "rb").read() == b"map data"
+        digest = hashlib.sha256(b"map data").hexdigest()
+        assert os.path.samefile(second, store.blob_path(digest))
+        assert store.stats.hits == 1 and store.stats.misses == 1
+        assert store.stats.entries == 1 and store.stats.bytes == 8
+
+    def test_identical_content_is_stored_once(self, standin_server, tmp_path):
+        """Test that the same content from two URLs is deduplicated into one blob."""
+        remote = CountingFiles({"EMD-1/a.map": b"same", "EMD-2/b.map": b"same"})
+        server = standin_server(routes=remote.routes)
+        store = BlobStore(str(tmp_path / "store"))
+
+        a = store.fetch(served_file(server, "a.map", emdb_id="EMD-1"), f"{tmp_path}/out/")
+        b = store.fetch(served_file(server, "b.map", emdb_id="EMD-2"), f"{tmp_path}/out/")
+
+        assert os.path.samefile(a, b)
+        assert store.stats.entries == 1
+
+    @pytest.mark.parametrize("link", ["symlink", "copy"])
+    def test_link_modes(self, standin_server, tmp_path, link):
+        """Test that files can be exposed as symlinks or independent copies."""
+        server = standin_server(routes=CountingFiles({"EMD-1234/a.map": b"map data"}).routes)
+        store = BlobStore(str(tmp_path / "store"), link=link)
+
+        path = store.fetch(served_file(server, "a.map"), str(tmp_path / "a.map"))
+
+        assert open(path, "rb").read() == b"map data"
+        assert os.path.islink(path) == (link == "symlink")
+        assert os.path.samefile(path, store.blob_path(file_digest(path))) == (link == "symlink")
+
+    def test_blobs_are_read_only(self, standin_server, tmp_path):
+        """Test that stored blobs cannot be written through a hardlink by accident."""
+        server = standin_server(routes=CountingFiles({"EMD-1234/a.map": b"map data"}).routes)
+        store = BlobStore(str(tmp_path / "store"))
+
+        path = store.fetch(served_file(server, "a.map"), str(tmp_path / "a.map"))
+
+        assert os.stat(path).st_mode & 0o222 == 0
+
+    def test_decompressed_files_are_stored_apart(self, standin_server, tmp_path):
+        """Test that the gunzipped and the compressed copies of a file are separate blobs."""
+        remote = CountingFiles({"EMD-1234/a.map.gz": gzip.compress(b"map data")})
+        server = standin_server(routes=remote.routes)
+        store = BlobStore(str(tmp_path / "store"))
+        figure = served_file(server, "a.map.gz")
+
+        raw = store.fetch(figure, f"{tmp_path}/raw/")
+        plain = store.fetch(figure, f"{tmp_path}/plain/", decompress=True)
+
+        assert os.path.basename(plain) == "a.map"
+        assert open(plain, "rb").read() == b"map data"
+        assert open(raw, "rb").read() == gzip.compress(b"map data")
+        assert remote.gets["EMD-1234/a.map.gz"] == 2
+
+    def test_lru_eviction_under_budget(self, standin_server, tmp_path):
+        """Test that the least recently used blobs are evicted when a new one exceeds the budget."""
+        remote = CountingFiles({f"EMD-1234/{name}.map": bytes([i]) * 100 for i, name in enumerate("abc")})
+        server = standin_server(routes=remote.routes)
+        store = BlobStore(str(tmp_path / "store"), max_bytes=250)
+
+        store.fetch(served_file(server, "a.map"), f"{tmp_path}/out/")
+        store.fetch(served_file(server, "b.map"), f"{tmp_path}/out/")
+        store.fetch(served_file(server, "a.map"), f"{tmp_path}/out/")
+        store.fetch(served_file(server, "c.map"), f"{tmp_path}/out/")
+
+        assert store.stats.entries == 2 and store.stats.bytes == 200
+        assert store.stats.evictions == 1
+        assert store.lookup(BlobStore.source_key(served_file(server, "b.map"))) is None
+        assert store.lookup(BlobStore.source_key(served_file(server, "a.map"))) is not None
+        # The hardlink made before eviction still holds the data
+        assert open(tmp_path / "out" / "b.map", "rb").read() == bytes([1]) * 100
+
+    def test_concurrent_stores_download_once(self, standin_server, tmp_path):
+        """Test that two stores on the same root, as in two processes, wait for each other's download."""
+        remote = CountingFiles({"EMD-1234/a.map": b"map data"}, delay=0.2)
+        server = standin_server(routes=remote.routes)
+        stores = [BlobStore(str(tmp_path / "store")) for _ in range(2)]
+        paths = []
+
+        threads = [threading.Thread(target=lambda store=store, i=i: paths.append(
+            store.fetch(served_file(server, "a.map"), f"{tmp_path}/out{i}/"))) for i, store in enumerate(stores)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert remote.gets["EMD-1234/a.map"] == 1
+        assert len(paths) == 2 and os.path.samefile(*paths)
+
+    def test_index_persists(self, standin_server, tmp_path):
+        """Test that a store reopened on the same root finds the files stored before."""
+        remote = CountingFiles({"EMD-1234/a.map": b"map data"})
+        server = standin_server(routes=remote.routes)
+        BlobStore(str(tmp_path / "store")).fetch(served_file(server, "a.map"), f"{tmp_path}/run1/")
+
+        store = BlobStore(str(tmp_path / "store"))
+        store.fetch(served_file(server, "a.map"), f"{tmp_path}/run2/")
+
+        assert remote.gets["EMD-1234/a.map"] == 1
+        assert store.stats.hits == 1
+
+    def test_clear(self, standin_server, tmp_path):
+        """Test that clear empties the store but keeps the files exposed as hardlinks."""
+        server = standin_server(routes=CountingFiles({"EMD-1234/a.map": b"map data"}).routes)
+        store = BlobStore(str(tmp_path / "store"))
+        path = store.fetch(served_file(server, "a.map"), f"{tmp_path}/out/")
+
+        store.clear()
+
+        assert store.stats.entries == 0
+        assert open(path, "rb").read() == b"map data"
+
+    def test_invalid_options(self, tmp_path):
+        """Test that unknown link modes and negative budgets are rejected."""
+        with pytest.raises(ValueError):
+            BlobStore(str(tmp_path), link="reflink")
+        with pytest.raises(ValueError):
+            BlobStore(str(tmp_path), max_bytes=-1)
+
+
+class TestStoreDownloads:
+    """Tests for downloads going through a BlobStore."""
+
+    def test_base_file_download(self, standin_server, tmp_path, capsys):
+        """Test that BaseFile.download(store=...) links the stored copy at the output path."""
+        remote = CountingFiles({"EMD-1234/a.map": b"map data"})
+        server = standin_server(routes=remote.routes)
+        store = BlobStore(str(tmp_path / "store"))
+
+        for run in ("run1", "run2"):
+            path = served_file(server, "a.map").download(f"{tmp_path}/{run}/", store=store)
+            assert open(path, "rb").read() == b"map data"
+
+        assert remote.gets["EMD-1234/a.map"] == 1
+        assert "Downloaded a.map" in capsys.readouterr().out
+
+    def test_scheduler_with_store(self, standin_server, tmp_path):
+        """Test that a scheduler with a store downloads each file once and does not count stored files as traffic."""
+        remote = CountingFiles({"EMD-1234/a.map": b"a" * 10, "EMD-1234/b.map": b"b" * 20})
+        server = standin_server(routes=remote.routes)
+        store = BlobStore(str(tmp_path / "store"))
+        files = [served_file(server, name) for name in ("a.map", "b.map", "a.map")]
+
+        with DownloadScheduler(max_workers=3, store=store) as scheduler:
+            first = scheduler.download(files[:2], str(tmp_path / "run1"))
+            second = scheduler.download(files, str(tmp_path / "run2"))
+
+        assert all(result.ok for result in first + second)
+        assert [result.size for result in second] == [10, 20, 10]
+        assert sum(remote.gets.values()) == 2
+        # Files linked from the store are not downloaded, so only the first two count
+        assert scheduler.progress.bytes_done == scheduler.progress.bytes_total == 30
@@ -1,9 +1,13 @@
 """Unit tests for EMDB utils module."""
+import threading
 import time
 import pytest
 import responses
 from unittest.mock import patch, MagicMock
-from emdb.utils import fixed_sleep_rate_limit, make_request
+import requests
+from emdb.utils import fixed_sleep_rate_limit, make_request, create_session, send_with_retry, SingleFlight
+from emdb.ratelimit import TokenBucketRateLimiter
+from emdb.retry import RetryPolicy
 from emdb.exceptions import (
     EMDBNotFoundError,
     EMDBRateLimitError,
@@ -53,6 +57,84 @@ class TestFixedSleepRateLimit:
         assert get_value() == 42
 
 
+class TestSingleFlight:
+    """Tests for the SingleFlight call coalescer."""
+
+    def _run_concurrently(self, flights, func, n=5):
+        started = threading.Event()
+        outcomes = []
+
+        def slow():
+            started.set()
+            time.sleep(0.1)
+            return func()
+
+        def worker():
+            try:
+                outcomes.append(flights.do("key", slow))
+            except Exception as e:
+                outcomes.append(e)
+
+        leader = threading.Thread(target=worker)
+        leader.start()
+        started.wait()
+        followers = [threading.Thread(target=worker) for _ in range(n - 1)]
+        for t in followers:
+            t.start()
+        for t in [leader] + followers:
+            t.join()
+        return outcomes
+
+    def test_concurrent_calls_share_result(self):
+        """Test that calls made while one is in flight reuse its result."""
+        flights = SingleFlight()
+        calls = []
+
+        outcomes = self._run_concurrently(flights, lambda: calls.append(1) or object())
+
+        assert len(calls) == 1
+        assert all(o is outcomes[0] for o in outcomes)
+        assert flights.shared == 4
+
+    def test_concurrent_calls_share_exception(self):
+        """Test that an exception raised by the call is raised in every waiting caller."""
+        flights = SingleFlight()
+
+        def fail():
+            raise EMDBNetworkError("down")
+
+        outcomes = self._run_concurrently(flights, fail, n=3)
+
+        assert len(outcomes) == 3
+        assert all(isinstance(o, EMDBNetworkError) for o in outcomes)
+
+    def test_completed_calls_are_not_reused(self):
+        """Test that a finished call does not serve later callers."""
+        flights = SingleFlight()
+
+        assert flights.do("key", lambda: 1) == 1
+        assert flights.do("key", lambda: 2) == 2
+
+
+class TestCreateSession:
+    """Tests for the create_session helper."""
+
+    def test_session_mounts_pooled_adapter(self):
+        """Test that both schemes share an adapter with the requested pool sizes."""
+        session = create_session(pool_connections=3, pool_maxsize=7, pool_block=True)
+
+        adapter = session.get_adapter("https://www.ebi.ac.uk/emdb/api")
+        assert adapter is session.get_adapter("http://localhost/")
+        assert adapter._pool_connections == 3
+        assert adapter._pool_maxsize == 7
+        assert adapter._pool_block is True
+
+    def test_session_keep_alive_disabled(self):
+        """Test that disabling keep-alive asks the server to close connections."""
+        assert create_session().headers["Connection"] == "keep-alive"
+        assert create_session(keep_alive=False).headers["Connection"] == "close"
+
+
 class TestMakeRequest:
     """Tests for the make_request function."""
 
@@ -169,3 +251,113 @@ class TestMakeRequest:
                 make_request("/test")
 
             assert "Network error" in str(excinfo.value)
+
+    @responses.activate
+    def test_make_request_uses_given_session(self):
+        """Test that requests go through the supplied session and base URL."""
+        responses.add(
+            responses.GET,
+            "http://localhost:8000/api/test",
+            json={"key": "value"},
+            status=200,
+        )
+        session = requests.Session()
+
+        with patch.object(session, "get", wraps=session.get) as mock_get:
+            result = make_request("/test", session=session, timeout=3, base_url="http://localhost:8000/api")
+
+        assert result == {"key": "value"}
+        mock_get.assert_called_once()
+        assert mock_get.call_args.kwargs["timeout"] == 3
+
+    @responses.activate
+    def test_make_request_acquires_rate_limiter_per_attempt(self):
+        """Test that every attempt, including retries, takes a rate limiter token."""
+        limiter = MagicMock()
+        with patch("requests.get") as mock_get:
+            mock_get.side_effect = requests.Timeout("Connection timeout")
+
+            with pytest.raises(EMDBNetworkError):
+                make_request("/test", retries=2, rate_limiter=limiter)
+
+        assert limiter.acquire.call_count == 2
+
+
+FAST_RETRIES = RetryPolicy(max_attempts=3, backoff_factor=0, jitter=False)
+
+
+class TestSendWithRetry:
+    """Tests for retries on transient failures."""
+
+    @responses.activate
+    def test_server_error_is_retried(self):
+        """Test that a 503 followed by a 200 succeeds."""
+        url = "https://www.ebi.ac.uk/emdb/api/test"
+        responses.add(responses.GET, url, status=503)
+        responses.add(responses.GET, url, json={"key": "value"}, status=200)
+
+        result = make_request("/test", retry_policy=FAST_RETRIES)
+
+        assert result == {"key": "value"}
+        assert len(responses.calls) == 2
+
+    @responses.activate
+    def test_not_found_is_not_retried(self):
+        """Test that client errors fail immediately."""
+        responses.add(responses.GET, "https://www.ebi.ac.uk/emdb/api/entry/EMD-9999", status=404)
+
+        with pytest.raises(EMDBNotFoundError):
+            make_request("/entry/EMD-9999", retry_policy=FAST_RETRIES)
+        assert len(responses.calls) == 1
+
+    @responses.activate
+    def test_persistent_server_error_raises_after_max_attempts(self):
+        """Test that the last server error is raised once the policy gives up."""
+        responses.add(responses.GET, "https://www.ebi.ac.uk/emdb/api/test", status=502)
+
+        with pytest.raises(EMDBAPIError) as excinfo:
+            make_request("/test", retry_policy=FAST_RETRIES)
+        assert excinfo.value.status_code == 502
+        assert len(responses.calls) == 3
+
+    @responses.activate
+    def test_rate_limited_response_pauses_shared_limiter(self):
+        """Test that a 429 with Retry-After pauses every caller of the limiter."""
+        url = "https://www.ebi.ac.uk/emdb/api/test"
+        responses.add(responses.GET, url, status=429, headers={"Retry-After": "1"})
+        responses.add(responses.GET, url, json={}, status=200)
+        limiter = TokenBucketRateLimiter(rate=100, burst=5)
+
+        with patch.object(limiter, "penalize", wraps=limiter.penalize) as mock_penalize:
+            start = time.monotonic()
+            make_request("/test", retry_policy=FAST_RETRIES, rate_limiter=limiter)
+            elapsed = time.monotonic() - start
+
+        mock_penalize.assert_called_once_with(1.0)
+        assert elapsed >= 0.95
+        assert limiter.stats.penalties == 1
+        # The next caller sharing the limiter is not held back any further
+        assert limiter.acquire() < 0.05
+
+    @responses.activate
+    def test_non_idempotent_method_is_not_retried(self):
+        """Test that only idempotent methods are retried."""
+        url = "https://www.ebi.ac.uk/emdb/api/test"
+        responses.add(responses.POST, url, status=503)
+
+        response = send_with_retry(requests, url, method="POST", retry_policy=FAST_RETRIES)
+
+        assert response.status_code == 503
+        assert len(responses.calls) == 1
+
+    def test_max_elapsed_stops_retrying(self):
+        """Test that no retry is scheduled past the maximum elapsed time."""
+        policy = RetryPolicy(max_attempts=10, backoff_factor=1, jitter=False, max_elapsed=0.5)
+        with patch("requests.get") as mock_get:
+            mock_get.side_effect = requests.exceptions.ConnectionError("down")
+
+            with pytest.raises(EMDBNetworkError):
+                send_with_retry(requests, "https://www.ebi.ac.uk/emdb/api/test", retry_policy=policy)
+
+        # The first 1 s backoff would already run past max_elapsed
+        assert mock_get.call_count == 1